@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+
+'''Micro-benchmarks for the hot paths of the stampr module.
+
+Run these via::
+
+    $ python benchmarks/run.py                  # Compare against benchmarks/baseline.json
+    $ python benchmarks/run.py --save           # Record a new baseline
+    $ python benchmarks/run.py --large          # Include the 1M record browse benchmarks
+    $ python benchmarks/run.py -k browse        # Only benchmarks with "browse" in the name
+
+Each benchmark is run several times and the fastest time kept. Any benchmark
+that is slower than the baseline by more than the threshold fails the run
+(exit status 1).
+'''
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import stampr
+import stampr.client
+import stampr.config
+import stampr.batch
+import stampr.mailing
+import stampr.testing
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+START = datetime.datetime(2000, 1, 1, 0, 0, 0)
+FINISH = datetime.datetime(2100, 1, 1, 0, 0, 0)
+
+BENCHMARKS = []
+
+
+def benchmark(name, large=False):
+    '''Register a benchmark, which is a function returning (seconds, number of operations).'''
+
+    def register(func):
+        BENCHMARKS.append((name, large, func))
+        return func
+
+    return register
+
+
+class PagedClient(object):
+    '''Stand-in for stampr.client.Client that serves browse pages from memory, without any HTTP.'''
+
+    page_window = 1
+
+    def __init__(self, record, count, page_size=100):
+        self.record, self.count, self.page_size = record, count, page_size
+
+    def get(self, path):
+        page = path[-1]
+        first = page * self.page_size
+        last = min(self.count, first + self.page_size)
+
+        # Records are modified as they are turned into objects, so each page must be new.
+        records = []
+        for id in range(first + 1, last + 1):
+            record = dict(self.record)
+            record[self.id_key] = id
+            records.append(record)
+
+        return records
+
+    @property
+    def id_key(self):
+        return [k for k in self.record if k.endswith("_id") and k != "user_id"][-1]
+
+
+def time_it(func, number):
+    '''Seconds taken to call func() number times.'''
+
+    started = time.time()
+    for _ in range(number):
+        func()
+    return time.time() - started
+
+
+def prepare(data, number):
+    def run():
+        mailing = stampr.mailing.Mailing(batch_id=1, address="to", return_address="from", data=data)
+        mailing._mail_params()
+
+    return time_it(run, number), number
+
+
+def browse(func, client, number=1):
+    previous, stampr.client.Client._current = stampr.client.Client._current, client
+    try:
+        return time_it(func, number), client.count * number
+    finally:
+        stampr.client.Client._current = previous
+
+
+MAILING = { "mailing_id": 1, "batch_id": 2, "address": "to", "returnaddress": "from", "format": "none", "status": "received" }
+BATCH = { "config_id": 1, "template": None, "status": "processing", "batch_id": 2 }
+CONFIG = { "size": "standard", "turnaround": "threeday", "style": "color", "output": "single", "returnenvelope": False,
+           "user_id": 1, "config_id": 1 }
+
+HTML_1K = "<html><body>%s</body></html>" % ("x" * 1000)
+HTML_100K = "<html><body>%s</body></html>" % ("x" * 100000)
+PDF_100K = b"%PDF-1.4\n" + os.urandom(100000)
+PDF_5M = b"%PDF-1.4\n" + os.urandom(5000000)
+MERGE_10 = dict(("key%d" % i, "value %d" % i) for i in range(10))
+MERGE_1000 = dict(("key%d" % i, "value %d" % i) for i in range(1000))
+
+
+@benchmark("mail_prepare_html_1k")
+def _():
+    return prepare(HTML_1K, 2000)
+
+@benchmark("mail_prepare_html_100k")
+def _():
+    return prepare(HTML_100K, 200)
+
+@benchmark("mail_prepare_pdf_100k")
+def _():
+    return prepare(PDF_100K, 200)
+
+@benchmark("mail_prepare_pdf_5m")
+def _():
+    return prepare(PDF_5M, 5)
+
+@benchmark("mail_prepare_merge_10")
+def _():
+    return prepare(MERGE_10, 2000)
+
+@benchmark("mail_prepare_merge_1000")
+def _():
+    return prepare(MERGE_1000, 200)
+
+
+@benchmark("mailing_browse_10k")
+def _():
+    return browse(lambda: stampr.mailing.Mailing.browse(START, FINISH), PagedClient(MAILING, 10000))
+
+@benchmark("mailing_browse_100k")
+def _():
+    return browse(lambda: stampr.mailing.Mailing.browse(START, FINISH), PagedClient(MAILING, 100000))
+
+@benchmark("mailing_browse_1m", large=True)
+def _():
+    return browse(lambda: stampr.mailing.Mailing.browse(START, FINISH), PagedClient(MAILING, 1000000))
+
+@benchmark("batch_browse_10k")
+def _():
+    return browse(lambda: stampr.batch.Batch.browse(START, FINISH), PagedClient(BATCH, 10000))
+
+@benchmark("batch_browse_100k")
+def _():
+    return browse(lambda: stampr.batch.Batch.browse(START, FINISH), PagedClient(BATCH, 100000))
+
+@benchmark("batch_browse_1m", large=True)
+def _():
+    return browse(lambda: stampr.batch.Batch.browse(START, FINISH), PagedClient(BATCH, 1000000))
+
+@benchmark("config_all_10k")
+def _():
+    return browse(stampr.config.Config.all, PagedClient(CONFIG, 10000))
+
+@benchmark("config_all_100k")
+def _():
+    return browse(stampr.config.Config.all, PagedClient(CONFIG, 100000))
+
+
+@benchmark("client_api_get")
+def _():
+    with stampr.testing.FakeServer() as server:
+        with server.client() as client:
+            return time_it(lambda: client.get(("test", "ping")), 500), 500
+
+@benchmark("client_api_post")
+def _():
+    with stampr.testing.FakeServer() as server:
+        with server.client() as client:
+            return time_it(lambda: client.post(("configs", ), size="standard", turnaround="threeday", style="color",
+                                               output="single", returnenvelope=False), 500), 500
+
+
+def browse_latency(window):
+    '''Browse 20 pages from a fake server with 10ms latency, requesting window pages at a time.'''
+
+    with stampr.testing.FakeServer(page_size=10, latency=0.01) as server:
+        # Made the current client, so it is the one Mailing.browse uses.
+        with server.client(page_window=window):
+            batch = stampr.batch.Batch(config=stampr.config.Config())
+            batch.create()
+            for i in range(200):
+                stampr.mailing.Mailing(batch=batch, address="to", return_address="from", data="%d" % i).mail()
+
+            return time_it(lambda: stampr.mailing.Mailing.browse(START, FINISH), 1), 200
+
+
+@benchmark("mailing_browse_latency_window_1")
+def _():
+    return browse_latency(1)
+
+@benchmark("mailing_browse_latency_window_8")
+def _():
+    return browse_latency(8)
+
+
+def import_time(module, number):
+    '''Seconds to import module (including everything it imports), as measured by python -X importtime.'''
+
+    root = os.path.join(os.path.dirname(__file__), "..")
+    total = 0
+
+    for _ in range(number):
+        output = subprocess.check_output([sys.executable, "-X", "importtime", "-c", "import %s" % module],
+                                         cwd=root, stderr=subprocess.STDOUT).decode("utf-8")
+
+        for line in output.splitlines():
+            fields = [field.strip() for field in line.split("|")]
+            if len(fields) == 3 and fields[2] == module:
+                total += int(fields[1]) / 1000000
+
+    return total, number
+
+
+@benchmark("import_stampr")
+def _():
+    return import_time("stampr", 10)
+
+@benchmark("import_stampr_mailing")
+def _():
+    return import_time("stampr.mailing", 10)
+
+
+def run(names, repeat):
+    '''Run benchmarks, returning {name: seconds per operation}.'''
+
+    results = {}
+
+    for name, large, func in BENCHMARKS:
+        if name not in names:
+            continue
+
+        times = []
+        for _ in range(repeat):
+            seconds, operations = func()
+            times.append(seconds / operations)
+
+        results[name] = min(times)
+        print("%-28s %12.3f us/op" % (name, results[name] * 1000000))
+        sys.stdout.flush()
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    '''Print changes relative to the baseline, returning the names of benchmarks that have regressed.'''
+
+    regressions = []
+
+    print()
+    print("%-28s %12s %12s %8s" % ("benchmark", "baseline", "current", "change"))
+
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+
+        change = results[name] / baseline[name] - 1
+        regressed = change > threshold
+        if regressed:
+            regressions.append(name)
+
+        print("%-28s %12.3f %12.3f %+7.1f%%%s" % (name, baseline[name] * 1000000, results[name] * 1000000, change * 100,
+                                                  "  REGRESSION" if regressed else ""))
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run stampr micro-benchmarks.")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline file [%(default)s]")
+    parser.add_argument("--save", action="store_true", help="save results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="fail if slower than the baseline by more than this fraction [%(default)s]")
+    parser.add_argument("--repeat", type=int, default=3, help="times to run each benchmark [%(default)s]")
+    parser.add_argument("--large", action="store_true", help="include benchmarks with 1M records")
+    parser.add_argument("-k", dest="match", default="", help="only run benchmarks with names containing this")
+    args = parser.parse_args(argv)
+
+    names = [name for name, large, _ in BENCHMARKS if args.match in name and (args.large or not large)]
+    results = run(names, args.repeat)
+
+    if args.save:
+        baseline = { "python": platform.python_version(), "machine": platform.platform(), "results": {} }
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+
+        baseline["python"], baseline["machine"] = platform.python_version(), platform.platform()
+        baseline["results"].update(results)
+
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+
+        print()
+        print("Baseline saved: %s" % args.baseline)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print()
+        print("No baseline to compare with (create one with --save)")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline["results"], args.threshold)
+
+    if regressions:
+        print()
+        print("%d benchmark(s) regressed by more than %d%%" % (len(regressions), args.threshold * 100))
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
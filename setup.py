@@ -19,8 +19,15 @@ setup(
         "requests>=1.2.0",
         "certifi>=0.0.8",
         "python-dateutil>=2.1",
+        "futures>=3.0; python_version < '3'",
     ],
+    extras_require = {
+        "async": ["aiohttp>=3.0"],
+    },
     packages = find_packages(exclude=['tests']),
+    entry_points = {
+        "console_scripts": ["stampr = stampr.cli:main"],
+    },
     #include_package_data=True,
     zip_safe=True,
     classifiers=[
@@ -21,6 +21,7 @@ Run these tasks via::
 
     $ shovel docs
     $ shovel release
+    $ shovel benchmark
 '''
 
 @task
@@ -33,6 +34,16 @@ def docs():
     print("HTML documentation generated: build/sphinx/html/index.html")
 
 
+@task
+def benchmark(save=False):
+    '''Run micro-benchmarks, comparing against (or saving) benchmarks/baseline.json'''
+
+    result = os.system("python benchmarks/run.py%s" % (" --save" if save else ""))
+
+    if result != 0:
+        exit(1)
+
+
 @task
 def release():
     '''Create source distribution.'''
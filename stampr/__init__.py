@@ -1,5 +1,29 @@
 from __future__ import absolute_import, unicode_literals, print_function, division
 
+import sys
+import importlib
+
 __all__ = ["authenticate", "mail"]
 
-from .functions import authenticate, mail
\ No newline at end of file
+from .functions import authenticate, mail
+
+# Other submodules (and the third-party modules they use) are only imported when first used.
+_SUBMODULES = ["aio", "autobatch", "batch", "bulk", "cache", "cli", "client", "config", "dedup", "encoder",
+               "exceptions", "export", "hooks", "journal", "mailing", "pagination", "ratelimit", "recordset",
+               "registry", "retry", "sharding", "testing", "utilities", "watcher", "watermark"]
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module("." + name, __name__)
+    else:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_SUBMODULES))
+
+
+if sys.version_info < (3, 7):
+    # No module __getattr__, so import the main submodules up front.
+    from . import client, config, batch, mailing, exceptions
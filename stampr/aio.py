@@ -0,0 +1,475 @@
+'''Asynchronous (asyncio) access to the Stampr API.
+
+Requires Python 3.6+ and aiohttp (pip install stampr[async]).
+
+Example::
+
+    import asyncio
+    import stampr
+    from stampr.aio import AsyncClient
+
+    async def main(recipients):
+        async with AsyncClient("user", "pass", concurrency=200) as client:
+            config = stampr.config.Config(config_id=1)
+            batch = stampr.batch.Batch(config=config)
+            await client.create_batch(batch)
+
+            mailings = [stampr.mailing.Mailing(batch=batch, address=address,
+                                               return_address=my_address, data=body)
+                        for address in recipients]
+
+            await asyncio.gather(*[client.mail(m) for m in mailings])
+
+    asyncio.run(main(recipients))
+
+Objects passed to the AsyncClient must not need to create anything on the
+server implicitly (for example, a Batch needs a created Config, and a Mailing
+needs a created Batch), since that would block on stampr.client.Client.current.
+'''
+
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import asyncio
+import datetime
+import json
+import threading
+import time
+import uuid
+
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    from urllib import urlencode
+
+from .client import Client, _endpoint
+from .config import Config
+from .batch import Batch
+from .mailing import Mailing
+from .utilities import string
+from .exceptions import APIError, HTTPError
+from .retry import RetryPolicy
+from .ratelimit import RateLimiter
+from .hooks import Hooks, RequestEvent
+
+
+class AsyncClient(Hooks):
+    '''Client that handles the actual RESTful actions, without blocking.
+
+    Args:
+        username: [string]
+        password: [string]
+        concurrency (int):
+            Maximum number of requests in flight at once [100].
+        limit_per_host (int):
+            Maximum number of connections to each host (0 for no limit beyond concurrency) [0].
+        keep_alive (bool):
+            Reuse connections between requests [True].
+        retry (stampr.retry.RetryPolicy):
+            How to retry failed requests [stampr.retry.RetryPolicy()].
+        timeout (float):
+            Seconds to wait for the server to respond before giving up (or retrying) [None, meaning wait forever].
+        rate_limit (stampr.ratelimit.RateLimiter):
+            Limits the rate of requests, including retries [None, meaning no limit].
+        base_uri (str):
+            URI of the API [BASE_URI].
+    '''
+
+    BASE_URI = Client.BASE_URI
+    IDEMPOTENT_POSTS = Client.IDEMPOTENT_POSTS
+
+    def __init__(self, username, password, concurrency=100, limit_per_host=0, keep_alive=True,
+                 retry=None, timeout=None, rate_limit=None, base_uri=None):
+        if not isinstance(username, string):
+            raise TypeError("username must be a string")
+        if not isinstance(password, string):
+            raise TypeError("password must be a string")
+
+        if not isinstance(concurrency, int) or concurrency <= 0:
+            raise ValueError("concurrency must be a positive int")
+        if not isinstance(limit_per_host, int) or limit_per_host < 0:
+            raise ValueError("limit_per_host must be a non-negative int")
+        if retry is not None and not isinstance(retry, RetryPolicy):
+            raise TypeError("retry must be a stampr.retry.RetryPolicy")
+        if rate_limit is not None and not isinstance(rate_limit, RateLimiter):
+            raise TypeError("rate_limit must be a stampr.ratelimit.RateLimiter")
+
+        self._username, self._password = username, password
+        self._concurrency = concurrency
+        self._limit_per_host = limit_per_host
+        self._keep_alive = keep_alive
+        self._retry = retry if retry is not None else RetryPolicy()
+        self._timeout = timeout
+        self._rate_limit = rate_limit
+        self._base_uri = base_uri or self.BASE_URI
+        self._retry_counts = {}
+        self._retry_counts_lock = threading.Lock()
+
+        # Created lazily, inside the running event loop.
+        self._session = None
+        self._semaphore = None
+
+
+    @property
+    def username(self):
+        return self._username
+
+    @property
+    def password(self):
+        return self._password
+
+    @property
+    def concurrency(self):
+        '''Maximum number of requests in flight at once [int]'''
+        return self._concurrency
+
+    @property
+    def retry(self):
+        '''Policy used to retry failed requests [stampr.retry.RetryPolicy]'''
+        return self._retry
+
+    @property
+    def base_uri(self):
+        '''URI of the API [str]'''
+        return self._base_uri
+
+    @property
+    def rate_limit(self):
+        '''Limiter applied to every request [stampr.ratelimit.RateLimiter, None]'''
+        return self._rate_limit
+
+    @property
+    def retry_counts(self):
+        '''Number of retries made, per endpoint, e.g. {"POST mailings": 2} [dict]'''
+
+        with self._retry_counts_lock:
+            return dict(self._retry_counts)
+
+
+    async def close(self):
+        '''Close all pooled connections.'''
+
+        if self._session is not None:
+            session, self._session = self._session, None
+            await session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+
+    async def server_time(self):
+        '''Time on the server [datetime.datetime]'''
+
+        import dateutil.parser
+
+        result = await self.get(("test", "ping"))
+        return dateutil.parser.parse(result["pong"])
+
+
+    async def ping(self):
+        '''Number of seconds to/from server [float]'''
+
+        sent = datetime.datetime.now()
+        await self.get(("test", "ping"))
+        delta = datetime.datetime.now() - sent
+        duration = delta.seconds + delta.microseconds / 1000000
+        return duration / 2
+
+
+    async def get(self, path):
+        '''Send a HTTP GET request.'''
+
+        return await self._api("get", path)
+
+
+    async def post(self, path, **params):
+        '''Send a HTTP POST request.'''
+
+        return await self._api("post", path, **params)
+
+
+    async def delete(self, path):
+        '''Send a HTTP DELETE request.'''
+
+        return await self._api("delete", path)
+
+
+    async def mail(self, mailing):
+        '''Mail the mailing on the server (awaitable stampr.mailing.Mailing.mail).
+
+        Args:
+            mailing (stampr.mailing.Mailing):
+                Mailing to send.
+
+        Returns:
+            [stampr.mailing.Mailing] The mailing that was sent.
+        '''
+
+        if not isinstance(mailing, Mailing):
+            raise TypeError("mailing must be a stampr.mailing.Mailing")
+
+        result = await self.post(("mailings", ), **mailing._mail_params())
+        mailing._mailed(result)
+
+        return mailing
+
+
+    async def sync(self, mailing):
+        '''Update the status of the mailing from the server (awaitable stampr.mailing.Mailing.sync).
+
+        Args:
+            mailing (stampr.mailing.Mailing):
+                Mailing to update.
+
+        Returns:
+            [stampr.mailing.Mailing] The mailing that was updated.
+        '''
+
+        if not isinstance(mailing, Mailing):
+            raise TypeError("mailing must be a stampr.mailing.Mailing")
+        if not mailing.is_created():
+            raise APIError("can't sync() before create()")
+
+        result = await self.get(("mailings", mailing.id))
+        mailing._synced(result)
+
+        return mailing
+
+
+    async def create_batch(self, batch):
+        '''Create the batch on the server (awaitable stampr.batch.Batch.create).
+
+        Args:
+            batch (stampr.batch.Batch):
+                Batch to create.
+
+        Returns:
+            [stampr.batch.Batch] The batch that was created.
+        '''
+
+        if not isinstance(batch, Batch):
+            raise TypeError("batch must be a stampr.batch.Batch")
+
+        if not batch.is_created():
+            result = await self.post(("batches", ), **batch._create_params())
+            batch._created(result)
+
+        return batch
+
+
+    async def create_config(self, config):
+        '''Create the config on the server (awaitable stampr.config.Config.create).
+
+        Args:
+            config (stampr.config.Config):
+                Config to create.
+
+        Returns:
+            [stampr.config.Config] The config that was created.
+        '''
+
+        if not isinstance(config, Config):
+            raise TypeError("config must be a stampr.config.Config")
+
+        if not config.is_created():
+            result = await self.post(("configs", ), **config._create_params())
+            config._created(result)
+
+        return config
+
+
+    async def browse_mailings(self, start, finish, status=None, batch=None):
+        '''Browse mailings (asynchronous iterator version of stampr.mailing.Mailing.browse).
+
+        Example::
+
+            async for mailing in client.browse_mailings(start, end, status="processing"):
+                print(mailing.id)
+
+        Yields:
+            stampr.mailing.Mailing
+        '''
+
+        search = Mailing._browse_path(start, finish, status, batch)
+
+        async for record in self._browse(search):
+            yield Mailing._from_record(record)
+
+
+    async def browse_batches(self, start, finish, status=None):
+        '''Browse batches (asynchronous iterator version of stampr.batch.Batch.browse).
+
+        Yields:
+            stampr.batch.Batch
+        '''
+
+        search = Batch._browse_path(start, finish, status)
+
+        async for record in self._browse(search):
+            yield Batch(**record)
+
+
+    async def all_configs(self):
+        '''All configs in the account (asynchronous iterator version of stampr.config.Config.all).
+
+        Yields:
+            stampr.config.Config
+        '''
+
+        async for record in self._browse(("configs", "browse", "all")):
+            yield Config._from_record(record)
+
+
+    async def _browse(self, search):
+        '''Yield records from each page of search until an empty page is returned.'''
+
+        i = 0
+
+        while True:
+            records = await self.get(search + (i, ))
+
+            if not records:
+                break
+
+            for record in records:
+                yield record
+
+            i += 1
+
+
+    def _connect(self):
+        '''Session shared by all requests (created in the running event loop).'''
+
+        if self._session is None:
+            try:
+                import aiohttp
+            except ImportError:
+                raise APIError("AsyncClient requires aiohttp. Install it with: pip install aiohttp")
+
+            connector = aiohttp.TCPConnector(limit=self._concurrency,
+                                             limit_per_host=self._limit_per_host,
+                                             force_close=not self._keep_alive)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  auth=aiohttp.BasicAuth(self.username, self.password))
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+
+        return self._session
+
+
+    async def _api(self, action, path, **params):
+        '''Actually send a RESTful action to path, retrying if that fails.'''
+
+        import aiohttp
+
+        if not isinstance(path, tuple):
+            raise TypeError("Expected path to be a tuple")
+
+        url = self.base_uri + "/".join(str(dir) for dir in path)
+
+        headers = {}
+        if action == "post" and path in self.IDEMPOTENT_POSTS:
+            headers["Idempotency-Key"] = uuid.uuid4().hex
+
+        can_retry = self._retry.can_retry(action, idempotent="Idempotency-Key" in headers)
+        hooks = self._hooks
+        started = time.time()
+        attempt = 0
+
+        if hooks:
+            request_bytes = len(urlencode(_form_data(params)))
+
+        while True:
+            if self._rate_limit is not None:
+                delay = self._rate_limit.reserve()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            if hooks:
+                event = RequestEvent(action.upper(), path, request_bytes, attempt)
+                self._fire("before_request", event)
+                sent = time.time()
+
+            try:
+                status_code, result, retry_after, response_bytes = await self._send(action, url, params, headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+                if not can_retry or attempt >= self._retry.total:
+                    error = HTTPError(None, "%s [%s %s]" % (ex or type(ex).__name__, action.upper(), url))
+                    raise self._failed(error, action, path, params, attempt, started)
+
+                delay = self._retry.delay(attempt)
+            else:
+                if hooks:
+                    event.status_code = status_code
+                    event.response_bytes = response_bytes
+                    event.duration = time.time() - sent
+                    self._fire("after_response", event)
+
+                if self._rate_limit is not None:
+                    self._rate_limit.on_response(status_code)
+
+                if status_code == 200:
+                    return result
+
+                if not can_retry or attempt >= self._retry.total or not self._retry.is_retryable_status(status_code):
+                    error = HTTPError(status_code, "%s [%s %s]" % (status_code, action.upper(), url))
+                    raise self._failed(error, action, path, params, attempt, started, status_code, response_bytes)
+
+                delay = self._retry.delay(attempt, retry_after)
+
+            endpoint = "%s %s" % (action.upper(), _endpoint(path))
+            with self._retry_counts_lock:
+                self._retry_counts[endpoint] = self._retry_counts.get(endpoint, 0) + 1
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+    def _failed(self, error, action, path, params, attempt, started, status_code=None, response_bytes=None):
+        '''Fire the on_error hook for a request that is about to fail, returning the error to raise.'''
+
+        if self._hooks:
+            event = RequestEvent(action.upper(), path, len(urlencode(_form_data(params))), attempt)
+            event.error = error
+            event.duration = time.time() - started
+            event.status_code = status_code
+            event.response_bytes = response_bytes
+
+            self._fire("on_error", event)
+
+        return error
+
+
+    async def _send(self, action, url, params, headers):
+        '''Send a single request, returning the status code, decoded JSON, Retry-After header and size of the response.'''
+
+        import aiohttp
+
+        session = self._connect()
+
+        data = _form_data(params)
+        timeout = aiohttp.ClientTimeout(total=self._timeout)
+
+        async with self._semaphore:
+            async with session.request(action.upper(), url, data=data or None, headers=headers, timeout=timeout) as response:
+                body = await response.read()
+
+                if response.status != 200:
+                    return response.status, None, response.headers.get("Retry-After"), len(body)
+
+                return response.status, json.loads(body.decode("utf-8")), None, len(body)
+
+
+def _form_data(params):
+    '''Form data for params, encoded the same way requests does for stampr.client.Client.'''
+
+    data = {}
+
+    for key, value in params.items():
+        if isinstance(value, bytes):
+            data[key] = value.decode("ascii")
+        elif value is not None:
+            data[key] = str(value)
+
+    return data
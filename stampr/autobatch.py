@@ -0,0 +1,82 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import threading
+import time
+
+
+class AutoBatcher(object):
+    '''Shares batches between mailings sent with stampr.mail() (or Client.mail()) without a batch.
+
+    Mailings with the same config go into the same batch, until it holds
+    size mailings or is window seconds old, when a new batch is started.
+    Each batch is created on the server when its first mailing is sent, and
+    only once, however many threads are sending.
+
+    Example::
+
+        stampr.authenticate("user", "pass", auto_batch=stampr.autobatch.AutoBatcher(size=500, window=3600))
+
+    Args:
+        size (int):
+            Most mailings to put in one batch [1000].
+        window (float):
+            Seconds after a batch is created to keep adding mailings to it [300].
+    '''
+
+    def __init__(self, size=1000, window=300):
+        if not isinstance(size, int) or size <= 0:
+            raise ValueError("size must be a positive int")
+        if not isinstance(window, (int, float)) or window <= 0:
+            raise ValueError("window must be a positive number")
+
+        self._size = size
+        self._window = window
+        self._open = {} # {config_id: [batch, mailings, created]}
+        self._lock = threading.Lock()
+
+
+    @property
+    def size(self):
+        '''Most mailings to put in one batch [int]'''
+        return self._size
+
+    @property
+    def window(self):
+        '''Seconds after a batch is created to keep adding mailings to it [float]'''
+        return self._window
+
+
+    def batch(self, config):
+        '''Get the batch the next mailing with this config should go in, creating one if necessary.
+
+        Args:
+            config (stampr.config.Config):
+                Config of the mailing.
+
+        Returns:
+            stampr.batch.Batch
+        '''
+
+        from .batch import Batch
+
+        config_id = config.id
+
+        # Held while creating a batch, so only one is created, however many threads want it.
+        with self._lock:
+            entry = self._open.get(config_id)
+
+            if entry is None or entry[1] >= self._size or time.time() - entry[2] >= self._window:
+                batch = Batch(config_id=config_id)
+                batch.create()
+                entry = self._open[config_id] = [batch, 0, time.time()]
+
+            entry[1] += 1
+
+            return entry[0]
+
+
+    def close(self):
+        '''Start new batches for all later mailings.'''
+
+        with self._lock:
+            self._open.clear()
@@ -5,6 +5,8 @@ import datetime
 from .utilities import _bad_attribute, string
 from .client import Client
 from .config import Config
+from .pagination import iter_records
+from .sharding import iter_sharded_records
 from .exceptions import APIError, ReadOnlyError, RequestError
 
 class BatchMeta(type):
@@ -63,7 +65,7 @@ class Batch(BatchMeta(str('BatchParent'), (object, ), {})):
     STATUSES = ["processing", "hold", "archive"]  
 
     @classmethod
-    def browse(cls, start, finish, status=None):
+    def browse(cls, start, finish, status=None, concurrency=1, ordered=True):
         '''Get the batches between two times.
             
         Example::
@@ -79,11 +81,68 @@ class Batch(BatchMeta(str('BatchParent'), (object, ), {})):
                 End of time period to get batches for.
             status (str):
                 ["processing", "hold", "archive"] Status of batch to find.
+            concurrency (int):
+                Number of parts of the period to browse at once (see stampr.sharding.iter_sharded_records) [1].
+            ordered (bool):
+                With a concurrency above 1, keep the batches in time order (by part of the period), rather than in
+                the order the parts arrive [True].
         
         Returns:
             list of stampr.batch.Batch
         '''
         
+        return list(cls.iter_browse(start, finish, status, concurrency, ordered))
+
+
+    @classmethod
+    def iter_browse(cls, start, finish, status=None, concurrency=1, ordered=True):
+        '''Get the batches between two times, one page at a time
+
+        Takes the same arguments as browse(), but yields each batch as soon as
+        its page arrives, so only one page is held in memory at a time (with a
+        concurrency above 1, a few pages per part of the period being browsed;
+        see stampr.sharding.iter_sharded_records).
+
+        Example::
+
+            for batch in stampr.batch.Batch.iter_browse(start, finish):
+                print(batch.id)
+
+        Returns:
+            generator of stampr.batch.Batch
+        '''
+
+        search = cls._browse_path(start, finish, status)
+
+        if concurrency == 1:
+            records = iter_records(search)
+        else:
+            records = iter_sharded_records(search[:-2], start, finish, "batch_id", concurrency=concurrency,
+                                           ordered=ordered)
+
+        return (Batch(**b) for b in records)
+
+
+    @classmethod
+    def browse_records(cls, start, finish, status=None):
+        '''Get the batches between two times, into a stampr.recordset.BatchRecordSet
+
+        Takes the same arguments as browse(), but stores the batches a column
+        at a time, rather than as Batch objects.
+
+        Returns:
+            stampr.recordset.BatchRecordSet
+        '''
+
+        from .recordset import BatchRecordSet
+
+        return BatchRecordSet.from_pages(cls._browse_path(start, finish, status))
+
+
+    @classmethod
+    def _browse_path(cls, start, finish, status=None):
+        '''Path to browse batches, without the page number.'''
+
         if not isinstance(start, datetime.datetime):
             raise TypeError("start should be a datetime.datetime")
 
@@ -100,20 +159,7 @@ class Batch(BatchMeta(str('BatchParent'), (object, ), {})):
         else:
             search = ("browse", )
 
-        all_batches = []
-        i = 0
-
-        while True:
-            batches = Client.current.get(("batches", ) + search + (start.isoformat(), finish.isoformat(), i))
-
-            if not batches:
-                break
-
-            all_batches.extend(batches)
-
-            i += 1
-
-        return [Batch(**b) for b in all_batches]
+        return ("batches", ) + search + (start.isoformat(), finish.isoformat())
 
 
     # Has the Batch been created already?
@@ -203,7 +249,7 @@ class Batch(BatchMeta(str('BatchParent'), (object, ), {})):
         '''
 
         if not self.is_created():
-            self.create
+            self.create()
 
         return self._id
 
@@ -219,6 +265,14 @@ class Batch(BatchMeta(str('BatchParent'), (object, ), {})):
         if self.is_created(): # Don't re-create if it already exists.
             return
 
+        result = Client.current.post(("batches", ), **self._create_params())
+
+        self._created(result)
+
+
+    def _create_params(self):
+        '''Parameters to POST to create the batch on the server.'''
+
         params = {
                 "config_id": self.config_id,
                 "status": self.status,
@@ -227,8 +281,12 @@ class Batch(BatchMeta(str('BatchParent'), (object, ), {})):
         if self.template is not None:
             params["template"] = self.template 
 
-        result = Client.current.post(("batches", ), **params)
-                                                                
+        return params
+
+
+    def _created(self, result):
+        '''Record the result of creating the batch on the server.'''
+
         self._id = result["batch_id"]
 
     
@@ -255,6 +313,51 @@ class Batch(BatchMeta(str('BatchParent'), (object, ), {})):
         return Mailing(batch=self)
 
 
+    def mail_many(self, items, concurrency=8, cancel=None, journal=None, dedup=None, duplicates="skip", encoder=None):
+        '''Send a mailing for each item, several at once.
+
+        Items are read from the iterable as they are needed, so it can be a
+        generator over any number of recipients. Items that fail don't stop
+        the others; their errors are collected in the result.
+
+        Example::
+
+            def recipients():
+                for row in csv.reader(open("recipients.csv")):
+                    yield (row[0], "Return address", "<html>Dear %s</html>" % row[1])
+
+            result = batch.mail_many(recipients(), concurrency=16)
+            print(result.succeeded, result.errors)
+
+        Args:
+            items (iterable):
+                (address, return_address, data) tuples, or dicts with those keys. An exception in place of an
+                item (e.g. for a row that couldn't be read) is recorded as that item's error.
+            concurrency (int):
+                Number of mailings to send at once [8]. Should be no more than the client's pool_maxsize.
+            cancel (threading.Event):
+                Set to stop sending more mailings (those already being sent are finished) [None].
+            journal (stampr.journal.Journal):
+                Records what has been sent, so that sending the same items again resumes where this left off [None].
+                While sending with a journal, SIGTERM cancels sending, as if cancel had been set.
+            dedup (stampr.dedup.DuplicateIndex):
+                Letters already sent; items found in it, or earlier in the items, are duplicates [None].
+            duplicates (str):
+                ["skip", "flag"] Whether to skip duplicates, or send them anyway (either way, they are listed in the
+                result) ["skip"].
+            encoder (stampr.encoder.Encoder):
+                Encodes each mailing's data as it is read, ahead of sending it (see stampr.encoder); mailings are
+                sent in the order they finish encoding [None, meaning encode it in the thread sending it].
+
+        Returns:
+            stampr.bulk.BulkResult
+        '''
+
+        from .bulk import mail_many
+
+        return mail_many(self, items, concurrency, cancel, journal, dedup, duplicates, encoder)
+
+
     def __enter__(self):
         return self
 
@@ -0,0 +1,345 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import array
+import contextlib
+import signal
+import threading
+import time
+
+from .utilities import string
+
+
+class BulkResult(object):
+    '''Outcome of sending many mailings with stampr.batch.Batch.mail_many().
+
+    Only the ids of the mailings (and the errors for any that failed) are
+    kept, not the mailings themselves.
+
+    Attributes:
+        ids (array.array):
+            Id of the mailing created for each item, in the order they were given (0 if it failed). Items not read
+            before sending was cancelled are left out.
+        errors (dict):
+            Exception raised by each item that failed, by its index.
+        count (int):
+            Number of items sent (or that failed, or were skipped).
+        skipped (int):
+            Number of items skipped because the journal shows they were already sent.
+        duplicates (array.array):
+            Indexes of the items found to be duplicates (see stampr.dedup.DuplicateIndex).
+        cancelled (bool):
+            True if sending was cancelled before the last item.
+        duration (float):
+            Seconds taken to send all the items.
+        latency (float):
+            Mean seconds taken to send each item.
+    '''
+
+    def __init__(self):
+        self.ids = array.array(str("l"))
+        self.errors = {}
+        self.count = 0
+        self.skipped = 0
+        self.duplicates = array.array(str("l"))
+        self.cancelled = False
+        self.duration = 0.0
+        self.latency = 0.0
+        self._total_latency = 0.0
+        self._unsent = 0
+
+
+    @property
+    def succeeded(self):
+        '''Number of mailings sent successfully (or already sent, according to the journal) [int]'''
+        return self.count - len(self.errors) - self._unsent
+
+    @property
+    def failed(self):
+        '''Number of items that failed [int]'''
+        return len(self.errors)
+
+    @property
+    def rate(self):
+        '''Mailings sent per second [float]'''
+        return self.count / self.duration if self.duration else 0.0
+
+
+    def __repr__(self):
+        return "<BulkResult count=%d failed=%d cancelled=%s duration=%.3fs>" % (self.count, self.failed, self.cancelled,
+                                                                               self.duration)
+
+
+    def _record(self, index, mailing_id=0, error=None, latency=0.0):
+        if index >= len(self.ids):
+            self.ids.extend([0] * (index + 1 - len(self.ids)))
+
+        if error is None:
+            self.ids[index] = mailing_id
+        else:
+            self.errors[index] = error
+
+        self.count += 1
+        self._total_latency += latency
+        self.latency = self._total_latency / self.count
+
+
+def mail_many(batch, items, concurrency=8, cancel=None, journal=None, dedup=None, duplicates="skip", encoder=None):
+    '''Send a mailing for each item, several at once (see stampr.batch.Batch.mail_many).'''
+
+    if not isinstance(concurrency, int) or concurrency <= 0:
+        raise ValueError("concurrency must be a positive int")
+    if duplicates not in _Sender.DUPLICATES:
+        raise ValueError("duplicates must be one of %s" % ", ".join(repr(d) for d in _Sender.DUPLICATES))
+
+    if journal is not None and cancel is None:
+        cancel = threading.Event()
+
+    sender = _Sender(batch.id, concurrency, journal, dedup, duplicates, encoder)
+
+    with _cancel_on_sigterm(cancel if journal is not None else None):
+        return sender.run(items, cancel)
+
+
+class _Sender(object):
+    '''Sends mailings for mail_many().'''
+
+    DUPLICATES = ["skip", "flag"]
+
+    def __init__(self, batch_id, concurrency, journal, dedup, duplicates, encoder):
+        from .client import Client
+
+        self.client = Client.current
+        self.batch_id = batch_id
+        self.concurrency = concurrency
+        self.journal = journal
+        self.dedup = dedup
+        self.skip_duplicates = duplicates == "skip"
+        self.encoder = encoder
+
+        self.result = BulkResult()
+        self.in_flight = {} # {future: (index, dedup key)}
+        self.pending = [] # [(index, mailing, params, payload, idempotency key, dedup key)] read, but not yet sent.
+        self.encoding = {} # {payload future: pending item} waiting for the encoder before being sent.
+        self.sending = set() # Dedup keys of mailings being sent.
+
+
+    def run(self, items, cancel):
+        import concurrent.futures
+
+        started = time.time()
+
+        if self.journal is not None:
+            self.journal.begin(self.batch_id)
+
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency)
+
+        try:
+            for index, item in enumerate(items):
+                if cancel is not None and cancel.is_set():
+                    self.result.cancelled = True
+                    break
+
+                self.read(index, item)
+
+                # With a journal, intents are written to disk a group at a time.
+                if self.journal is None or len(self.pending) >= self.concurrency:
+                    self.send_pending()
+
+            if not self.result.cancelled:
+                self.send_pending()
+
+            self.collect(concurrent.futures.ALL_COMPLETED)
+
+        finally:
+            for future in list(self.in_flight) + list(self.encoding):
+                future.cancel()
+            self.executor.shutdown(wait=True)
+
+            if self.journal is not None:
+                self.journal.sync()
+            if self.dedup is not None:
+                self.dedup.flush() # So the letters sent are known to later runs, even if this one dies.
+
+        self.result.duration = time.time() - started
+
+        return self.result
+
+
+    def read(self, index, item):
+        '''Prepare to send an item, unless it has already been sent, is a duplicate or is invalid.'''
+
+        result = self.result
+
+        if self.journal is not None:
+            entry = self.journal.entry(index)
+            if entry is not None and entry[1] is not None:
+                result._record(index, entry[1])
+                result.skipped += 1
+                return
+
+        if isinstance(item, Exception):
+            result._record(index, error=item) # Given in place of an item that couldn't be read.
+            return
+
+        try:
+            mailing = _mailing(self.batch_id, item)
+            # With an encoder, the payload starts being encoded as soon as it is read.
+            payload = self.encoder.submit(mailing.data) if self.encoder is not None else None
+            # With a dedup index, the payload must be encoded here, to get its md5.
+            params = mailing._mail_params(_result(payload)) if self.dedup is not None else None
+        except (TypeError, ValueError) as ex:
+            result._record(index, error=ex)
+            return
+
+        dedup_key = None
+        if self.dedup is not None:
+            dedup_key = self.dedup.key(self.batch_id, mailing.address, params.get("md5"))
+
+            if dedup_key in self.sending or dedup_key in self.dedup:
+                result.duplicates.append(index)
+
+                if self.skip_duplicates:
+                    result._record(index)
+                    result._unsent += 1
+                    return
+
+                dedup_key = None # Sent anyway, but the first is the one recorded.
+            else:
+                self.sending.add(dedup_key)
+
+        key = self.journal.intend(index) if self.journal is not None else None
+        self.pending.append((index, mailing, params, payload, key, dedup_key))
+
+
+    def send_pending(self):
+        import concurrent.futures
+
+        if self.journal is not None:
+            self.journal.sync() # The intents must be on disk before the mailings are sent.
+
+        for item in self.pending:
+            # Only a few items are read ahead of those being sent, so the input can be as long as you like.
+            if len(self.in_flight) + len(self.encoding) >= self.concurrency * 2:
+                self.collect(concurrent.futures.FIRST_COMPLETED)
+
+            payload = item[3]
+            if payload is not None and not payload.done():
+                # Only sent once encoded, so the sending threads never wait for the encoder.
+                self.encoding[payload] = item
+            else:
+                self.submit(item)
+
+        del self.pending[:]
+
+
+    def submit(self, item):
+        index, mailing, params, payload, key, dedup_key = item
+
+        future = self.executor.submit(_send, self.client, mailing, params, payload, key)
+        self.in_flight[future] = (index, dedup_key)
+
+
+    def collect(self, return_when):
+        '''Wait until a mailing has been sent (or, with ALL_COMPLETED, every one), sending any that are encoded.'''
+
+        import concurrent.futures
+
+        while self.in_flight or self.encoding:
+            done, _ = concurrent.futures.wait(list(self.in_flight) + list(self.encoding),
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            sent = False
+
+            for future in done:
+                if future in self.encoding:
+                    self.submit(self.encoding.pop(future))
+                    continue
+
+                sent = True
+                index, dedup_key = self.in_flight.pop(future)
+                self.sending.discard(dedup_key)
+
+                try:
+                    mailing_id, latency, md5 = future.result()
+                except Exception as ex:
+                    self.result._record(index, error=ex)
+                    continue
+
+                self.result._record(index, mailing_id, latency=latency)
+
+                if self.journal is not None:
+                    self.journal.confirm(index, mailing_id, md5)
+                if dedup_key is not None:
+                    self.dedup.add(dedup_key)
+
+            if sent and return_when == concurrent.futures.FIRST_COMPLETED:
+                break
+
+
+def _mailing(batch_id, item):
+    '''Mailing for an (address, return_address, data) tuple, or a dict with those keys.'''
+
+    from .mailing import Mailing
+
+    if isinstance(item, dict):
+        unknown = set(item) - set(["address", "return_address", "data"])
+        if unknown:
+            raise ValueError("unknown keys: %s" % ", ".join(sorted(unknown)))
+
+        address, return_address, data = item.get("address"), item.get("return_address"), item.get("data")
+
+    elif isinstance(item, (tuple, list)) and len(item) == 3:
+        address, return_address, data = item
+
+    else:
+        raise TypeError("item must be an (address, return_address, data) tuple or a dict")
+
+    if not isinstance(address, string) or not address:
+        raise TypeError("address must be a non-empty string")
+    if not isinstance(return_address, string) or not return_address:
+        raise TypeError("return_address must be a non-empty string")
+
+    return Mailing(batch_id=batch_id, address=address, return_address=return_address, data=data)
+
+
+def _send(client, mailing, params, payload, key):
+    started = time.time()
+
+    if params is None:
+        params = mailing._mail_params(_result(payload))
+
+    if key is not None:
+        with client.idempotency_key(key):
+            response = client.post(("mailings", ), **params)
+    else:
+        response = client.post(("mailings", ), **params)
+
+    mailing._mailed(response)
+
+    return mailing.id, time.time() - started, params.get("md5")
+
+
+def _result(payload):
+    '''Encoded payload from an encoder's future (None, to encode it now, if there is no future).'''
+
+    return payload.result() if payload is not None else None
+
+
+@contextlib.contextmanager
+def _cancel_on_sigterm(cancel):
+    '''Set cancel if the process is sent SIGTERM, so that mailings being sent are finished before it exits.'''
+
+    if cancel is None:
+        yield
+        return
+
+    try:
+        previous = signal.signal(signal.SIGTERM, lambda signum, frame: cancel.set())
+    except ValueError:
+        # Signal handlers can only be set in the main thread.
+        yield
+        return
+
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGTERM, previous if previous is not None else signal.SIG_DFL)
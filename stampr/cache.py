@@ -0,0 +1,338 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import collections
+import json
+import os
+import threading
+import time
+
+from .registry import _account
+from .utilities import string
+
+
+class ResponseCache(object):
+    '''Responses to GET requests, kept for a time that depends on the route, so repeated requests needn't be sent.
+
+    Configs can't be changed once created, so they are kept until evicted;
+    batches and mailings change as they are processed, so they are only kept
+    for a short time. Each route (the path, with ids, times and page numbers
+    as "*") is given the time to live of the longest pattern in ttls that it
+    starts with; routes that match no pattern are given default_ttl. A time
+    to live of None means forever, and 0 means don't cache.
+
+    The least recently used responses are evicted to keep within max_entries
+    and max_bytes (measured as JSON). With a path, responses are also kept
+    in an SQLite database, so they are shared between runs and processes;
+    responses found there are moved back into memory when they are used.
+
+    When the client using the cache POSTs or DELETEs a resource, responses
+    for that resource, and listings that might include it, are dropped.
+    Changes made by anyone else are only seen once responses expire.
+
+    A cache can be shared by several clients (even for different accounts)
+    and threads.
+
+    Example::
+
+        cache = stampr.cache.ResponseCache(path="~/.stampr/cache.sqlite", ttls={ "mailings/*": 30 })
+        stampr.authenticate("user", "pass", cache=cache)
+
+    Args:
+        max_entries (int):
+            Most responses to keep in memory [1024].
+        max_bytes (int):
+            Most bytes of responses to keep in memory [16MB].
+        path (str):
+            SQLite database to also keep responses in [None, meaning only keep them in memory].
+        ttls (dict):
+            Seconds to keep responses for each route pattern, e.g. { "batches/*": 10 }, added to DEFAULT_TTLS [None].
+        default_ttl (float):
+            Seconds to keep responses for routes not in ttls [0, meaning don't cache them].
+    '''
+
+    # Seconds to keep responses for, by route pattern ("*" is an id, time or page number).
+    DEFAULT_TTLS = {
+        "configs/*": None, # Configs never change.
+        "configs/browse": 300,
+        "batches/*": 60,
+        "batches/*/browse": 10,
+        "batches/*/with": 10,
+        "batches/browse": 10,
+        "batches/with": 10,
+        "mailings/*": 10,
+        "mailings/browse": 10,
+        "mailings/with": 10,
+        "test": 0,
+    }
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, path=None, ttls=None, default_ttl=0):
+        if not isinstance(max_entries, int) or max_entries <= 0:
+            raise ValueError("max_entries must be a positive int")
+        if not isinstance(max_bytes, int) or max_bytes <= 0:
+            raise ValueError("max_bytes must be a positive int")
+        if ttls is not None and not isinstance(ttls, dict):
+            raise TypeError("ttls must be a dict")
+
+        self._ttls = dict(self.DEFAULT_TTLS)
+        self._ttls.update(ttls or {})
+        self._ttls[""] = default_ttl
+
+        for pattern, ttl in self._ttls.items():
+            if ttl is not None and (not isinstance(ttl, (int, float)) or ttl < 0):
+                raise ValueError("time to live for %r must be None or a number, at least 0" % pattern)
+
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._path = os.path.expanduser(path) if path is not None else None
+        self._entries = collections.OrderedDict() # {(account, path): (expires, json)}, least recently used first.
+        self._bytes = 0
+        self._generation = 0 # Incremented by every invalidation.
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.RLock()
+        self._db = None
+
+        if self._path is not None:
+            self._open()
+
+
+    @property
+    def path(self):
+        '''SQLite database responses are also kept in [str, None]'''
+        return self._path
+
+    @property
+    def hits(self):
+        '''Number of responses found in the cache [int]'''
+        return self._hits
+
+    @property
+    def misses(self):
+        '''Number of cacheable requests that had to be sent [int]'''
+        return self._misses
+
+    @property
+    def size(self):
+        '''Bytes of responses kept in memory [int]'''
+        return self._bytes
+
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+    def ttl(self, path):
+        '''Seconds to keep the response to a path [float, None meaning forever]'''
+
+        route = _route(path)
+        patterns = [p for p in self._ttls if route == p or route.startswith(p + "/") or not p]
+
+        return self._ttls[max(patterns, key=len)]
+
+
+    def fetch(self, client, path, send):
+        '''Get the response to a GET request, from the cache if it is there, otherwise by sending it.
+
+        Args:
+            client (stampr.client.Client):
+                Client making the request.
+            path (tuple):
+                Path requested.
+            send (callable):
+                Called with no arguments to send the request, returning the response.
+
+        Returns:
+            The response, which the caller may change without affecting the cache
+        '''
+
+        ttl = self.ttl(path)
+        if ttl == 0:
+            return send()
+
+        key = (_account(client), _query(path))
+
+        with self._lock:
+            data = self._get(key)
+
+            if data is not None:
+                self._hits += 1
+                return json.loads(data)
+
+            self._misses += 1
+            generation = self._generation
+
+        response = send()
+        data = json.dumps(response)
+
+        with self._lock:
+            # If the resource was changed while the request was being sent, the response may be out of date.
+            if self._generation == generation:
+                expires = self._now() + ttl if ttl is not None else None
+                self._put(key, expires, data)
+                self._store(key, expires, data)
+
+        return response
+
+
+    def invalidate(self, client, path):
+        '''Drop responses that POSTing or DELETEing path could have made out of date.
+
+        That is, responses for the resource and anything under it, and listings
+        of its kind (or, for mailings, listings of the mailings in a batch, with or without a status).
+        '''
+
+        account = _account(client)
+
+        with self._lock:
+            self._generation += 1
+
+            for key in [k for k in self._entries if k[0] == account and _invalidated(k[1], path)]:
+                self._remove(key)
+
+            if self._db is not None:
+                rows = self._db.execute("SELECT query FROM responses WHERE base_uri = ? AND username = ?",
+                                       account).fetchall()
+                stale = [(account[0], account[1], row[0]) for row in rows if _invalidated(row[0], path)]
+                with self._db:
+                    self._db.executemany("DELETE FROM responses WHERE base_uri = ? AND username = ? AND query = ?",
+                                         stale)
+
+
+    def clear(self):
+        '''Drop every response (including those on disk).'''
+
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._bytes = 0
+
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("DELETE FROM responses")
+
+
+    def close(self):
+        '''Close the database, if there is one (responses in memory are still used).'''
+
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+    def _now(self):
+        return time.time()
+
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._load(key)
+            if entry is None:
+                return None
+
+        expires, data = entry
+        if expires is not None and expires <= self._now():
+            self._remove(key)
+            return None
+
+        self._put(key, expires, data) # Now the most recently used.
+
+        return data
+
+
+    def _put(self, key, expires, data):
+        if len(data) > self._max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = (expires, data)
+        self._bytes += len(data)
+
+        while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+            oldest = next(iter(self._entries))
+            self._bytes -= len(self._entries.pop(oldest)[1])
+
+
+    def _remove(self, key):
+        if key in self._entries:
+            self._bytes -= len(self._entries.pop(key)[1])
+
+        if self._db is not None:
+            with self._db:
+                self._db.execute("DELETE FROM responses WHERE base_uri = ? AND username = ? AND query = ?",
+                                 key[0] + (key[1], ))
+
+
+    def _open(self):
+        import sqlite3
+
+        directory = os.path.dirname(self._path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # Only used while holding the lock, so it can be shared between threads.
+        self._db = sqlite3.connect(self._path, check_same_thread=False)
+
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses (base_uri TEXT, username TEXT, query TEXT, "
+                             "expires REAL, data TEXT, PRIMARY KEY (base_uri, username, query))")
+            self._db.execute("DELETE FROM responses WHERE expires <= ?", (self._now(), ))
+
+
+    def _load(self, key):
+        if self._db is None:
+            return None
+
+        row = self._db.execute("SELECT expires, data FROM responses WHERE base_uri = ? AND username = ? AND query = ?",
+                               key[0] + (key[1], )).fetchone()
+
+        return tuple(row) if row is not None else None
+
+
+    def _store(self, key, expires, data):
+        if self._db is None:
+            return
+
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                             key[0] + (key[1], expires, data))
+
+
+def _query(path):
+    return "/".join(str(part) for part in path)
+
+
+def _is_id(part):
+    '''Whether part of a path is an id, time or page number, rather than a name.'''
+
+    return not isinstance(part, string) or part[:1].isdigit()
+
+
+def _route(path):
+    '''Route of a path, e.g. ("batches", 12, "browse", "2013-05-01T00:00:00", ...) => "batches/*/browse/*/..."'''
+
+    return "/".join("*" if _is_id(part) else part for part in path)
+
+
+def _invalidated(query, path):
+    '''Whether the response for a query (a cached path, as a str) may be out of date once path is POSTed or DELETEd.'''
+
+    parts = query.split("/")
+    path = [str(part) for part in path]
+
+    if len(path) > 1 and parts[:len(path)] == path:
+        return True # The resource itself, or something under it.
+
+    if len(parts) == 2 and _is_id(parts[1]):
+        return False # Another resource.
+
+    if parts[0] == path[0]:
+        return True # A listing of the same kind.
+
+    # Listings of the mailings in a batch (with any status).
+    route = _route(parts)
+    return path[0] == "mailings" and (route.startswith("batches/*/browse/") or route.startswith("batches/*/with/"))
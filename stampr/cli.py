@@ -0,0 +1,403 @@
+'''The stampr command line application.
+
+Send a letter to each recipient in a CSV or JSON Lines file::
+
+    $ export STAMPR_USERNAME=user STAMPR_PASSWORD=pass
+    $ stampr send recipients.csv --body letter.pdf --return-address "1 Main St..." --concurrency 16
+
+Each row needs an "address" (and a "return_address", unless --return-address
+is given). The letter can be the same for everyone (--body), named in a
+column of each row (--body-column), or a mail-merge template filled in with
+the rest of each row (--template).
+
+Export the mailings (or batches) from a period to a CSV or JSON Lines file,
+resuming if the same export was interrupted (see stampr.export)::
+
+    $ stampr export mailings may.csv.gz --start 2013-05-01 --finish 2013-06-01 --status error
+'''
+
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import argparse
+import collections
+import csv
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+
+def main(argv=None):
+    '''Run the command line application.
+
+    Args:
+        argv (list of str):
+            Arguments, not including the program name [sys.argv[1:]].
+
+    Returns:
+        Exit status [int]
+    '''
+
+    parser = _parser()
+    args = parser.parse_args(argv)
+
+    if args.command is None:
+        parser.print_help()
+        return 2
+
+    return args.command(args, parser)
+
+
+def _parser():
+    parser = argparse.ArgumentParser(prog="stampr", description="Access the Stampr API.")
+    parser.set_defaults(command=None)
+
+    parser.add_argument("--username", default=os.environ.get("STAMPR_USERNAME"),
+                        help="account username [$STAMPR_USERNAME]")
+    parser.add_argument("--password", default=os.environ.get("STAMPR_PASSWORD"),
+                        help="account password [$STAMPR_PASSWORD]")
+    parser.add_argument("--base-uri", help="URI of the API")
+
+    commands = parser.add_subparsers(title="commands")
+
+    send = commands.add_parser("send", help="send a letter to each recipient in a CSV or JSON Lines file",
+                               description="Send a letter to each recipient in a CSV or JSON Lines file.")
+    send.set_defaults(command=_send)
+    send.add_argument("input", help="file of recipients, one per row ('-' for stdin)")
+    send.add_argument("--format", choices=["csv", "jsonl"],
+                      help="format of the input [from its extension, otherwise csv]")
+
+    letters = send.add_mutually_exclusive_group(required=True)
+    letters.add_argument("--body", metavar="PATH", help="HTML or PDF file to send to everyone")
+    letters.add_argument("--body-column", metavar="COLUMN", help="column with the path of each row's HTML or PDF file")
+    letters.add_argument("--template", metavar="PATH", help="mail-merge template, filled in with each row's columns")
+
+    send.add_argument("--return-address", help="return address for rows without a return_address")
+    send.add_argument("--batch", type=int, metavar="ID", help="existing batch to send to [a new batch]")
+    send.add_argument("--config", type=int, metavar="ID", help="existing config for the new batch [the default config]")
+    send.add_argument("--concurrency", type=int, default=8, help="mailings to send at once [8]")
+    send.add_argument("--rate-limit", type=float, metavar="RATE", help="most requests per second [no limit]")
+    send.add_argument("--journal", metavar="PATH",
+                      help="journal to record what has been sent in, so that running again resumes")
+    send.add_argument("--quiet", action="store_true", help="don't show progress")
+
+    export = commands.add_parser("export", help="write the mailings or batches from a period to a file",
+                                 description="Write the mailings or batches from a period to a CSV or JSON Lines "
+                                             "file, resuming if the same export was interrupted.")
+    export.set_defaults(command=_export)
+    export.add_argument("kind", choices=["mailings", "batches"], help="what to export")
+    export.add_argument("output", help="file to write (.csv or .jsonl, with .gz to gzip it)")
+    export.add_argument("--start", required=True, type=_time, help="start of the period (e.g. 2013-05-01)")
+    export.add_argument("--finish", required=True, type=_time, help="end of the period (e.g. 2013-06-01T12:00)")
+    export.add_argument("--status", help="only export mailings or batches with this status")
+    export.add_argument("--batch", type=int, metavar="ID", help="only export mailings in this batch")
+    export.add_argument("--format", choices=["csv", "jsonl"],
+                        help="format to write [from the output's extension, otherwise jsonl]")
+    export.add_argument("--gzip", action="store_true", default=None,
+                        help="gzip the file [if the output ends in .gz]")
+    export.add_argument("--restart", action="store_true",
+                        help="start again, rather than resuming an interrupted export to the same file")
+    export.add_argument("--window", type=int, default=1, help="pages to request at once [1]")
+
+    return parser
+
+
+def _send(args, parser):
+    import stampr
+    from .batch import Batch
+    from .config import Config
+    from .journal import Journal
+    from .ratelimit import RateLimiter
+
+    if args.concurrency <= 0:
+        parser.error("--concurrency must be positive")
+    if args.rate_limit is not None and args.rate_limit <= 0:
+        parser.error("--rate-limit must be positive")
+    if args.batch is not None and (args.config is not None or args.template is not None):
+        parser.error("--config and --template can't be used with --batch")
+
+    client = _authenticate(args, parser, pool_maxsize=max(10, args.concurrency),
+                           rate_limit=RateLimiter(rate=args.rate_limit) if args.rate_limit else None)
+
+    format = args.format or _guess_format(args.input)
+    total = _count_rows(args.input, format) if args.input != "-" else None
+
+    journal = Journal(args.journal) if args.journal is not None else None
+
+    try:
+        if args.batch is not None:
+            batch = Batch[args.batch]
+        elif journal is not None and journal.batch_id is not None:
+            batch = Batch[journal.batch_id]
+        else:
+            template = _read(args.template).decode("utf-8") if args.template is not None else None
+            config = Config[args.config] if args.config is not None else Config()
+            batch = Batch(config=config, template=template)
+            batch.create()
+
+        progress = _Progress(total, None if args.quiet else sys.stderr)
+        client.add_hook("after_response", progress.response)
+
+        with _open(args.input) as f:
+            result = batch.mail_many(_items(_rows(f, format), args), concurrency=args.concurrency, journal=journal)
+
+        progress.finish()
+
+    except (IOError, OSError, ValueError, stampr.exceptions.Error) as ex:
+        print("stampr: error: %s" % ex, file=sys.stderr)
+        return 2
+
+    finally:
+        if journal is not None:
+            journal.close()
+
+    print("Sent %d of %d mailings to batch %d in %s (%.1f/s)%s" %
+          (result.succeeded, result.count, batch.id, _duration(result.duration), result.rate,
+           "; %d failed" % result.failed if result.failed else ""))
+
+    for index, error in sorted(result.errors.items())[:_ERRORS_SHOWN]:
+        print("row %d: %s" % (index + 1, error), file=sys.stderr)
+    if result.failed > _ERRORS_SHOWN:
+        print("...and %d more" % (result.failed - _ERRORS_SHOWN), file=sys.stderr)
+
+    return 1 if result.failed or result.cancelled else 0
+
+
+_ERRORS_SHOWN = 20
+
+
+def _export(args, parser):
+    import stampr
+    from .batch import Batch
+    from .export import export_batches, export_mailings
+
+    if args.window <= 0:
+        parser.error("--window must be positive")
+    if args.kind == "batches" and args.batch is not None:
+        parser.error("--batch can only be used when exporting mailings")
+
+    _authenticate(args, parser, pool_maxsize=max(10, args.window))
+
+    options = dict(format=args.format, compress=args.gzip, resume=not args.restart, window=args.window)
+
+    try:
+        if args.kind == "mailings":
+            batch = Batch[args.batch] if args.batch is not None else None
+            count = export_mailings(args.output, args.start, args.finish, args.status, batch, **options)
+        else:
+            count = export_batches(args.output, args.start, args.finish, args.status, **options)
+
+    except (IOError, OSError, TypeError, ValueError, stampr.exceptions.Error) as ex:
+        print("stampr: error: %s" % ex, file=sys.stderr)
+        return 2
+
+    print("Exported %d %s to %s" % (count, args.kind, args.output))
+
+    return 0
+
+
+def _authenticate(args, parser, **options):
+    import stampr
+
+    if args.username is None or args.password is None:
+        parser.error("--username and --password (or $STAMPR_USERNAME and $STAMPR_PASSWORD) are required")
+
+    return stampr.authenticate(args.username, args.password, base_uri=args.base_uri, **options)
+
+
+def _time(value):
+    '''Parse a time given on the command line.'''
+
+    import dateutil.parser
+
+    try:
+        return dateutil.parser.parse(value)
+    except (ValueError, OverflowError):
+        raise argparse.ArgumentTypeError("not a time: %r" % value)
+
+
+def _guess_format(path):
+    return "jsonl" if os.path.splitext(path)[1].lower() in (".jsonl", ".json", ".ndjson") else "csv"
+
+
+def _open(path):
+    '''Open the input (stdin for "-") as text.'''
+
+    if path == "-":
+        return _NotClosed(sys.stdin)
+    elif sys.version_info[0] < 3:
+        return open(path, "rb") # Python 2's csv module only reads bytes.
+    else:
+        return io.open(path, encoding="utf-8", newline="")
+
+
+class _NotClosed(object):
+    def __init__(self, f):
+        self.f = f
+
+    def __enter__(self):
+        return self.f
+
+    def __exit__(self, *args):
+        pass
+
+
+def _rows(f, format):
+    '''Each row of the input, as a dict (or, for a line that isn't valid JSON, the ValueError).'''
+
+    if format == "jsonl":
+        for line in f:
+            if line.strip():
+                try:
+                    row = json.loads(line)
+                except ValueError as ex:
+                    row = ValueError("not valid JSON: %s" % ex)
+                yield row
+    else:
+        for row in csv.DictReader(f):
+            yield row
+
+
+def _count_rows(path, format):
+    '''Number of rows in the input (read through once, without keeping them).'''
+
+    with _open(path) as f:
+        if format == "jsonl":
+            return sum(1 for line in f if line.strip())
+        else:
+            return max(0, sum(1 for _ in csv.reader(f)) - 1)
+
+
+def _items(rows, args):
+    '''Item to pass to mail_many for each row.
+
+    A row that can't be sent (e.g. it isn't valid JSON, or its body file is
+    missing) is passed as its error, which mail_many records as that row
+    failing, so the rest of the rows are still sent.
+    '''
+
+    body = _read(args.body) if args.body is not None else None
+
+    for row in rows:
+        if isinstance(row, Exception):
+            item = row
+        else:
+            try:
+                item = _item(row, args, body)
+            except (IOError, OSError, TypeError, ValueError) as ex:
+                item = ex
+
+        yield item
+
+
+def _item(row, args, body):
+    row = dict(row)
+    address = row.pop("address", None)
+    return_address = row.pop("return_address", None) or args.return_address
+
+    if args.template is not None:
+        data = row
+    elif args.body_column is not None:
+        if not row.get(args.body_column):
+            raise ValueError("row has no %s: %r" % (args.body_column, address))
+        data = _read(row[args.body_column])
+    else:
+        data = body
+
+    return { "address": address, "return_address": return_address, "data": data }
+
+
+def _read(path):
+    '''Contents of a file, as bytes (sent as PDF or HTML, depending on its header).'''
+
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class _Progress(object):
+    '''Shows the rate, latency and ETA of mailings being sent (from the client's after_response hook).
+
+    Args:
+        total (int):
+            Number of mailings to send [None if not known].
+        stream (file):
+            Where to show progress [None, meaning don't].
+        interval (float):
+            Seconds between updates [1].
+    '''
+
+    def __init__(self, total, stream, interval=1):
+        self.total = total
+        self.stream = stream
+        self.interval = interval
+        self.sent = 0
+        self.started = time.time()
+        self.shown = 0
+        self.latencies = collections.deque(maxlen=1000) # Only the most recent, for the percentiles.
+        self.lock = threading.Lock()
+
+
+    def response(self, event):
+        if event.method != "POST" or event.path != ("mailings", ) or not 200 <= event.status_code < 300:
+            return
+
+        with self.lock:
+            self.sent += 1
+            self.latencies.append(event.duration)
+
+            now = time.time()
+            if now - self.shown >= self.interval:
+                self.shown = now
+                self.show(now)
+
+
+    def finish(self):
+        with self.lock:
+            self.show(time.time())
+
+        if self.stream is not None:
+            self.stream.write("\n")
+
+
+    def show(self, now):
+        if self.stream is None:
+            return
+
+        elapsed = now - self.started
+        rate = self.sent / elapsed if elapsed else 0.0
+
+        line = "%d%s sent  %.1f/s" % (self.sent, "/%d" % self.total if self.total is not None else "", rate)
+
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            line += "  latency p50 %s p90 %s p99 %s" % tuple(_milliseconds(_percentile(latencies, p))
+                                                             for p in (50, 90, 99))
+
+        if self.total is not None and rate:
+            line += "  ETA %s" % _duration(max(0, self.total - self.sent) / rate)
+
+        self.stream.write("\r%-100s" % line)
+        self.stream.flush()
+
+
+def _percentile(values, percent):
+    '''Value that percent of the (sorted) values are no more than.'''
+
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def _milliseconds(seconds):
+    return "%dms" % round(seconds * 1000)
+
+
+def _duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+
+    return "%d:%02d:%02d" % (hours, minutes, seconds)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,19 @@
 from __future__ import absolute_import, unicode_literals, print_function, division
 
-import os
+import contextlib
 import json
 import datetime
-
-import requests
-import dateutil.parser
-import certifi
+import threading
+import time
+import uuid
 
 from .utilities import _bad_attribute, string
 from .exceptions import APIError, HTTPError
+from .retry import RetryPolicy
+from .ratelimit import RateLimiter
+from .hooks import Hooks, RequestEvent
 
-os.environ['REQUESTS_CA_BUNDLE'] = certifi.where()
+# requests, dateutil and certifi are slow to import, so they are only imported when they are first needed.
 
 class NullClient(object):
     '''Client when there is no client specified (that is, the user hasn't authenticated)'''
@@ -29,24 +31,138 @@ class ClientMeta(type):
         return self._current
 
 
-class Client((ClientMeta(str('ClientParent'), (object, ), {}))):
+class Client((ClientMeta(str('ClientParent'), (object, ), {})), Hooks):
     '''Client that handles the actual RESTful actions.
 
+    Connections are pooled and kept alive between requests. A single Client
+    can be shared between threads; each thread gets its own session, but all
+    sessions draw on the same connection pool.
+
+    Every request can be observed with hooks (see stampr.hooks.Hooks).
+
     Args:
         username: [string]
         password: [string]
+        pool_connections (int):
+            Number of host pools to cache [10].
+        pool_maxsize (int):
+            Maximum number of connections kept open to each host [10].
+        pool_block (bool):
+            Block when all connections to a host are in use, rather than opening extra, unpooled, connections [False].
+        keep_alive (bool):
+            Reuse connections between requests [True].
+        retry (stampr.retry.RetryPolicy):
+            How to retry failed requests [stampr.retry.RetryPolicy()].
+        timeout (float):
+            Seconds to wait for the server to respond before giving up (or retrying) [None, meaning wait forever].
+        rate_limit (stampr.ratelimit.RateLimiter):
+            Limits the rate of requests, including retries [None, meaning no limit].
+        base_uri (str):
+            URI of the API [BASE_URI].
+        check_credentials (str):
+            When to check the username and password with the server ["eager"]:
+            "eager" pings the server before returning;
+            "lazy" doesn't check (bad credentials make the first request fail);
+            "background" pings the server in another thread (if the credentials are rejected, the next request raises
+            the error).
+        page_window (int):
+            Number of pages of a browse to request concurrently [1, meaning one after another].
+        config_registry (stampr.registry.ConfigRegistry):
+            Used to reuse existing configs rather than creating identical ones [None, meaning a new registry, kept in
+            memory; False to always create new configs].
+        auto_batch (stampr.autobatch.AutoBatcher):
+            Shares batches between mailings sent with mail() without a batch [None, meaning a new AutoBatcher with the
+            default size and window; False to give each mailing its own batch].
+        watermarks (stampr.watermark.WatermarkStore):
+            How far each search has been browsed, for stampr.mailing.Mailing.browse_new [None, meaning a new store,
+            kept in memory].
+        cache (stampr.cache.ResponseCache):
+            Responses to GET requests, kept so they needn't be requested again [None, meaning don't cache].
     '''
 
+    CHECK_CREDENTIALS = ["eager", "lazy", "background"]
+
+    # Paths that are POSTed with an idempotency key, so they can be safely retried.
+    IDEMPOTENT_POSTS = [("mailings", )]
+
     BASE_URI = "https://testing.dev.stam.pr/api/"
     
-    def __init__(self, username, password):
+    def __init__(self, username, password, pool_connections=10, pool_maxsize=10, pool_block=False, keep_alive=True,
+                 retry=None, timeout=None, rate_limit=None, base_uri=None, check_credentials="eager",
+                 page_window=1, config_registry=None, auto_batch=None, watermarks=None, cache=None):
         if not isinstance(username, string):
             raise TypeError("username must be a string")
         if not isinstance(password, string):
             raise TypeError("password must be a string")
 
+        if not isinstance(pool_connections, int) or pool_connections <= 0:
+            raise ValueError("pool_connections must be a positive int")
+        if not isinstance(pool_maxsize, int) or pool_maxsize <= 0:
+            raise ValueError("pool_maxsize must be a positive int")
+        if retry is not None and not isinstance(retry, RetryPolicy):
+            raise TypeError("retry must be a stampr.retry.RetryPolicy")
+        if rate_limit is not None and not isinstance(rate_limit, RateLimiter):
+            raise TypeError("rate_limit must be a stampr.ratelimit.RateLimiter")
+        if check_credentials not in self.CHECK_CREDENTIALS:
+            raise ValueError(_bad_attribute("check_credentials", self.CHECK_CREDENTIALS))
+        if not isinstance(page_window, int) or page_window <= 0:
+            raise ValueError("page_window must be a positive int")
+
+        import requests.adapters
+        from .registry import ConfigRegistry
+        from .autobatch import AutoBatcher
+        from .watermark import WatermarkStore
+        from .cache import ResponseCache
+
+        if config_registry is not None and config_registry is not False and \
+                not isinstance(config_registry, ConfigRegistry):
+            raise TypeError("config_registry must be a stampr.registry.ConfigRegistry")
+        if auto_batch is not None and auto_batch is not False and not isinstance(auto_batch, AutoBatcher):
+            raise TypeError("auto_batch must be a stampr.autobatch.AutoBatcher")
+        if watermarks is not None and not isinstance(watermarks, WatermarkStore):
+            raise TypeError("watermarks must be a stampr.watermark.WatermarkStore")
+        if cache is not None and not isinstance(cache, ResponseCache):
+            raise TypeError("cache must be a stampr.cache.ResponseCache")
+
         self._username, self._password = username, password
-        self.ping()
+
+        self._keep_alive = keep_alive
+        self._adapter = requests.adapters.HTTPAdapter(pool_connections=pool_connections,
+                                                      pool_maxsize=pool_maxsize,
+                                                      pool_block=pool_block)
+        self._local = threading.local()
+
+        self._retry = retry if retry is not None else RetryPolicy()
+        self._timeout = timeout
+        self._rate_limit = rate_limit
+        self._base_uri = base_uri or self.BASE_URI
+        self._page_window = page_window
+        if config_registry is None:
+            self._config_registry = ConfigRegistry()
+        elif config_registry is False:
+            self._config_registry = None
+        else:
+            self._config_registry = config_registry
+
+        if auto_batch is None:
+            self._auto_batch = AutoBatcher()
+        elif auto_batch is False:
+            self._auto_batch = None
+        else:
+            self._auto_batch = auto_batch
+
+        self._watermarks = watermarks if watermarks is not None else WatermarkStore()
+        self._cache = cache
+        self._retry_counts = {}
+        self._retry_counts_lock = threading.Lock()
+        self._credentials_error = None
+
+        if check_credentials == "eager":
+            self.ping()
+        elif check_credentials == "background":
+            thread = threading.Thread(target=self._check_credentials)
+            thread.daemon = True
+            thread.start()
 
         Client._current = self
 
@@ -59,9 +175,96 @@ class Client((ClientMeta(str('ClientParent'), (object, ), {}))):
     def password(self):
         return self._password
 
+    @property
+    def retry(self):
+        '''Policy used to retry failed requests [stampr.retry.RetryPolicy]'''
+        return self._retry
+
+    @property
+    def base_uri(self):
+        '''URI of the API [str]'''
+        return self._base_uri
+
+    @property
+    def rate_limit(self):
+        '''Limiter applied to every request [stampr.ratelimit.RateLimiter, None]'''
+        return self._rate_limit
+
+    @property
+    def page_window(self):
+        '''Number of pages of a browse requested concurrently [int]'''
+        return self._page_window
+
+    @property
+    def config_registry(self):
+        '''Registry of existing configs [stampr.registry.ConfigRegistry, None if disabled]'''
+        return self._config_registry
+
+    @property
+    def auto_batch(self):
+        '''Batcher used by mail() [stampr.autobatch.AutoBatcher, None if disabled]'''
+        return self._auto_batch
+
+    @property
+    def watermarks(self):
+        '''How far each search has been browsed [stampr.watermark.WatermarkStore]'''
+        return self._watermarks
+
+    @property
+    def cache(self):
+        '''Cache of responses to GET requests [stampr.cache.ResponseCache, None if not caching]'''
+        return self._cache
+
+    @property
+    def retry_counts(self):
+        '''Number of retries made, per endpoint, e.g. {"POST mailings": 2, "GET mailings/browse": 1} [dict]'''
+
+        with self._retry_counts_lock:
+            return dict(self._retry_counts)
+
+    @property
+    def session(self):
+        '''HTTP session for the current thread [requests.Session]'''
+
+        session = getattr(self._local, "session", None)
+
+        if session is None:
+            import requests
+            import certifi
+
+            session = requests.Session()
+            session.verify = certifi.where() # Unless overridden by REQUESTS_CA_BUNDLE.
+            # Every thread's session shares the same adapter, and hence the same connection pool.
+            session.mount("https://", self._adapter)
+            session.mount("http://", self._adapter)
+            session.auth = (self.username, self.password)
+
+            if not self._keep_alive:
+                session.headers["Connection"] = "close"
+
+            self._local.session = session
+
+        return session
+
+
+    def close(self):
+        '''Close all pooled connections.'''
+
+        self._adapter.close()
+
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
     def mail(self, return_address, address, body, config=None, batch=None):
-        '''Send a simple HTML or PDF email, in its own batch and default config (unless :batch and/or :config options are used).
-        
+        '''Send a simple HTML or PDF email, with the default config (unless :config is used).
+
+        Unless :batch is used, mailings with the same config share a batch (see
+        auto_batch), so each usually costs a single request.
+
         Example::
 
             client = stampr.client.Client("user", "pass")
@@ -86,6 +289,7 @@ class Client((ClientMeta(str('ClientParent'), (object, ), {}))):
 
         from .config import Config
         from .batch import Batch
+        from .mailing import Mailing
 
         if not isinstance(return_address, string) or not return_address:
             raise TypeError("from must be a non-empty string")
@@ -100,7 +304,10 @@ class Client((ClientMeta(str('ClientParent'), (object, ), {}))):
             raise TypeError("config must be a stampr.config.Config")
 
         if batch is None:
-            batch = Batch(config=config)
+            if self._auto_batch is not None:
+                batch = self._auto_batch.batch(config)
+            else:
+                batch = Batch(config=config)
         elif not isinstance(batch, Batch):
             raise TypeError("batch must be a stampr.batch.Batch")
 
@@ -112,9 +319,45 @@ class Client((ClientMeta(str('ClientParent'), (object, ), {}))):
         return m
 
 
+    @contextlib.contextmanager
+    def idempotency_key(self, key):
+        '''Send key as the Idempotency-Key of mailings posted by this thread, within the with block.
+
+        Sending a mailing again with the same key as an earlier attempt, even
+        from another process, means it is only printed once.
+
+        Example::
+
+            with client.idempotency_key(key):
+                mailing.mail()
+        '''
+
+        previous = getattr(self._local, "idempotency_key", None)
+        self._local.idempotency_key = key
+
+        try:
+            yield
+        finally:
+            self._local.idempotency_key = previous
+
+
+    def _check_credentials(self):
+        '''Ping the server, recording a rejection of the credentials to raise on the next request.'''
+
+        try:
+            self.ping()
+        except HTTPError as ex:
+            # Other failures (connection errors, 5xx, 429) say nothing about the credentials, and may well have passed
+            # by the next request, which will report them itself if not.
+            if ex.status_code in (401, 403):
+                self._credentials_error = ex
+
+
     def server_time(self):
         '''Time on the server [datetime.datetime]'''
 
+        import dateutil.parser
+
         result = self.get(("test", "ping"))
         date = dateutil.parser.parse(result["pong"])
         return date
@@ -131,40 +374,140 @@ class Client((ClientMeta(str('ClientParent'), (object, ), {}))):
 
 
     def get(self, path):
-        '''Send a HTTP GET request.'''
+        '''Send a HTTP GET request (unless the response is in the cache).'''
 
-        return self._api("get", path)
+        if self._cache is None:
+            return self._api("get", path)
+
+        return self._cache.fetch(self, path, lambda: self._api("get", path))
 
 
     def post(self, path, **params):
         '''Send a HTTP POST request.'''
 
-        return self._api("post", path, **params)
+        try:
+            return self._api("post", path, **params)
+        finally:
+            # Even if the request failed, it may have changed the resource.
+            if self._cache is not None and isinstance(path, tuple):
+                self._cache.invalidate(self, path)
 
 
     def delete(self, path):
         '''Send a HTTP DELETE request.'''
 
-        return self._api("delete", path)
+        try:
+            return self._api("delete", path)
+        finally:
+            if self._cache is not None and isinstance(path, tuple):
+                self._cache.invalidate(self, path)
 
     
     def _api(self, action, path, **params):
-        '''Actually send a RESTful action to path.'''
+        '''Actually send a RESTful action to path, retrying if that fails.'''
+
+        import requests
 
         if not isinstance(path, tuple):
             raise TypeError("Expected path to be a tuple")
 
-        path = "/".join(str(dir) for dir in path)
+        if self._credentials_error is not None:
+            error, self._credentials_error = self._credentials_error, None
+            raise error
+
+        url = self.base_uri + "/".join(str(dir) for dir in path)
+
+        headers = {}
+        if action == "post" and path in self.IDEMPOTENT_POSTS:
+            # The same key is sent with every retry, so the server only acts on the first to arrive.
+            headers["Idempotency-Key"] = getattr(self._local, "idempotency_key", None) or uuid.uuid4().hex
+
+        session = self.session
+        request = session.prepare_request(requests.Request(action.upper(), url, data=params, headers=headers))
+        settings = session.merge_environment_settings(request.url, {}, None, None, None)
 
-        action_method = getattr(requests, action)
-        response = action_method(self.BASE_URI + path, data=params, auth=(self.username, self.password))
+        can_retry = self._retry.can_retry(action, idempotent="Idempotency-Key" in headers)
+        hooks = self._hooks
+        started = time.time()
+        attempt = 0
+
+        while True:
+            if self._rate_limit is not None:
+                self._rate_limit.acquire()
+
+            if hooks:
+                event = RequestEvent(action.upper(), path, len(request.body or b""), attempt)
+                self._fire("before_request", event)
+                sent = time.time()
 
-        if response.status_code != requests.codes.ok:
-            # Wrap the error in one of our own.
             try:
-                response.raise_for_status()
-            except Exception as ex:
-                raise HTTPError(response.status_code, "%s [%s %s]" % (ex, action.upper(), response.url))
+                response = session.send(request, timeout=self._timeout, **settings)
+            except (requests.ConnectionError, requests.Timeout) as ex:
+                if not can_retry or attempt >= self._retry.total:
+                    raise self._failed(HTTPError(None, "%s [%s %s]" % (ex, action.upper(), url)), action, path, request, attempt, started)
+
+                delay = self._retry.delay(attempt)
+            else:
+                if hooks:
+                    event.status_code = response.status_code
+                    event.response_bytes = len(response.content)
+                    event.duration = time.time() - sent
+                    self._fire("after_response", event)
+
+                if self._rate_limit is not None:
+                    self._rate_limit.on_response(response.status_code)
+
+                if response.status_code == requests.codes.ok:
+                    return response.json()
+
+                if not can_retry or attempt >= self._retry.total or not self._retry.is_retryable_status(response.status_code):
+                    # Wrap the error in one of our own.
+                    try:
+                        response.raise_for_status()
+                    except Exception as ex:
+                        error = HTTPError(response.status_code, "%s [%s %s]" % (ex, action.upper(), response.url))
+                        raise self._failed(error, action, path, request, attempt, started, response)
+
+                delay = self._retry.delay(attempt, response.headers.get("Retry-After"))
+
+            self._count_retry(action, path)
+            time.sleep(delay)
+            attempt += 1
+
+
+    def _failed(self, error, action, path, request, attempt, started, response=None):
+        '''Fire the on_error hook for a request that is about to fail, returning the error to raise.'''
+
+        if self._hooks:
+            event = RequestEvent(action.upper(), path, len(request.body or b""), attempt)
+            event.error = error
+            event.duration = time.time() - started
+
+            if response is not None:
+                event.status_code = response.status_code
+                event.response_bytes = len(response.content)
+
+            self._fire("on_error", event)
+
+        return error
+
+
+    def _count_retry(self, action, path):
+        '''Record a retry against the endpoint (the path without ids, times or page numbers).'''
+
+        endpoint = "%s %s" % (action.upper(), _endpoint(path))
+
+        with self._retry_counts_lock:
+            self._retry_counts[endpoint] = self._retry_counts.get(endpoint, 0) + 1
+
+
+def _endpoint(path):
+    '''Name of the endpoint for a path, e.g. ("batches", 12, "browse", ...) => "batches"'''
 
+    parts = []
+    for dir in path:
+        if not isinstance(dir, string) or dir[:1].isdigit():
+            break
+        parts.append(dir)
 
-        return response.json()
\ No newline at end of file
+    return "/".join(parts)
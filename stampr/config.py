@@ -2,6 +2,7 @@ from __future__ import absolute_import, unicode_literals, print_function, divisi
 
 from .utilities import _bad_attribute, string
 from .client import Client
+from .pagination import iter_records
 from .exceptions import ReadOnlyError, RequestError
 
 class ConfigMeta(type):
@@ -24,13 +25,7 @@ class ConfigMeta(type):
         configs = Client.current.get(("configs", id))
 
         if configs:
-            config = configs[0]
-
-            # Rename returnenvelope as return_envelope
-            config["return_envelope"] = config["returnenvelope"]
-            del config["returnenvelope"]
-
-            return self(**config)
+            return self._from_record(configs[0])
         else:
             raise RequestError("No such config: %d" % id)
 
@@ -76,24 +71,47 @@ class Config(ConfigMeta(str('ConfigParent'), (object, ), {})):
             list of stampr.config.Config
         '''
 
-        all_configs = []
-        i = 0
+        return list(cls.iter_all())
+
+
+    @classmethod
+    def iter_all(cls):
+        '''Get all configs defined in your Stampr account, one page at a time.
+
+        Example::
+
+            for config in stampr.config.Config.iter_all():
+                print(config.id)
+
+        Returns:
+            generator of stampr.config.Config
+        '''
+
+        return (cls._from_record(c) for c in iter_records(("configs", "browse", "all")))
+
+
+    @classmethod
+    def all_records(cls):
+        '''Get all configs defined in your Stampr account, into a stampr.recordset.ConfigRecordSet
+
+        Returns:
+            stampr.recordset.ConfigRecordSet
+        '''
 
-        while True:
-            configs = Client.current.get(("configs", "browse", "all", i))
-            if not configs:
-                break
+        from .recordset import ConfigRecordSet
 
-            all_configs.extend(configs)
+        return ConfigRecordSet.from_pages(("configs", "browse", "all"))
 
-            i += 1
+
+    @classmethod
+    def _from_record(cls, config):
+        '''Create a Config from a record returned by the server.'''
 
         # Rename returnenvelope as return_envelope
-        for config in all_configs:
-            config["return_envelope"] = config["returnenvelope"]
-            del config["returnenvelope"]
+        config["return_envelope"] = config["returnenvelope"]
+        del config["returnenvelope"]
 
-        return [Config(**c) for c in all_configs]
+        return cls(**config)
 
     def is_created(self):
         '''Has the Config been created already?'''
@@ -219,16 +237,45 @@ class Config(ConfigMeta(str('ConfigParent'), (object, ), {})):
 
 
     def create(self):
-        '''Create the config on the server.'''
+        '''Create the config on the server.
+
+        If the client has a config registry (see stampr.registry.ConfigRegistry),
+        an existing config with the same settings is used instead, if there is one.
+        '''
 
         if self.is_created():
             return # Don't re-create if it already exists.
 
-        result = Client.current.post(("configs",),
-                                    size=self.size,
-                                    turnaround=self.turnaround,
-                                    style=self.style,
-                                    output=self.output,
-                                    returnenvelope=self.return_envelope)
+        client = Client.current
+        registry = client.config_registry
+
+        if registry is not None:
+            self._id = registry.get_id(self, client, lambda: self._post(client))
+        else:
+            self._post(client)
+
+
+    def _post(self, client):
+        '''Create a new config on the server, returning its id.'''
+
+        result = client.post(("configs",), **self._create_params())
+
+        self._created(result)
+
+        return self._id
+
+
+    def _create_params(self):
+        '''Parameters to POST to create the config on the server.'''
+
+        return dict(size=self.size,
+                    turnaround=self.turnaround,
+                    style=self.style,
+                    output=self.output,
+                    returnenvelope=self.return_envelope)
+
+
+    def _created(self, result):
+        '''Record the result of creating the config on the server.'''
 
         self._id = result["config_id"]
\ No newline at end of file
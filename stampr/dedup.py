@@ -0,0 +1,205 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import hashlib
+import math
+import os
+import re
+import struct
+import threading
+
+
+class DuplicateIndex(object):
+    '''Letters already sent, keyed on (batch_id, normalized address, payload md5), to catch duplicates.
+
+    Each letter is kept as a 16-byte digest of its key, in a set. For very
+    large runs, give a capacity to use a Bloom filter instead, which takes
+    about 1.2 bytes per letter (at the default error_rate), but wrongly
+    reports a small fraction (error_rate) of new letters as duplicates.
+
+    If a path is given, digests are appended to that file as they are
+    added, and read back when the index is next created, so duplicates are
+    caught between runs.
+
+    Example::
+
+        index = stampr.dedup.DuplicateIndex(path="sent.dedup")
+        result = batch.mail_many(recipients(), dedup=index)
+        print(result.duplicates)
+
+    Args:
+        path (str):
+            File to keep the index in [None, meaning only keep it in memory].
+        capacity (int):
+            Number of letters to size a Bloom filter for [None, meaning use a set].
+        error_rate (float):
+            Fraction of new letters the Bloom filter may report as duplicates [0.001].
+    '''
+
+    DIGEST_SIZE = 16
+
+    def __init__(self, path=None, capacity=None, error_rate=0.001):
+        if capacity is not None and (not isinstance(capacity, int) or capacity <= 0):
+            raise ValueError("capacity must be a positive int")
+        if not isinstance(error_rate, float) or not 0 < error_rate < 1:
+            raise ValueError("error_rate must be a float between 0 and 1")
+
+        self._path = path
+        self._digests = BloomFilter(capacity, error_rate) if capacity is not None else set()
+        self._count = 0
+        self._lock = threading.Lock()
+        self._file = None
+
+        if path is not None:
+            if os.path.exists(path):
+                self._load()
+            self._file = open(path, "ab")
+
+
+    @property
+    def path(self):
+        '''File the index is kept in [str, None]'''
+        return self._path
+
+
+    def __len__(self):
+        '''Number of letters added.'''
+        return self._count
+
+
+    def __contains__(self, key):
+        '''Has a letter with this key (from key()) been added?'''
+
+        return _digest(*key) in self._digests
+
+
+    def add(self, key):
+        '''Record a letter as sent, returning True if it was already there (that is, it is a duplicate).'''
+
+        digest = _digest(*key)
+
+        with self._lock:
+            if digest in self._digests:
+                return True
+
+            self._digests.add(digest)
+            self._count += 1
+
+            if self._file is not None:
+                self._file.write(digest)
+
+        return False
+
+
+    def flush(self):
+        '''Write any added letters to disk.'''
+
+        if self._file is not None:
+            with self._lock:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+
+    def close(self):
+        '''Write any added letters to disk and close the file.'''
+
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    @classmethod
+    def key(cls, batch_id, address, md5):
+        '''Key for a letter.
+
+        Args:
+            batch_id (int):
+                Batch the letter is sent in.
+            address (str):
+                Address it is sent to (normalized with normalize_address()).
+            md5 (str):
+                md5 of the payload, as sent to the server (see stampr.mailing.Mailing).
+
+        Returns:
+            tuple
+        '''
+
+        return (batch_id, normalize_address(address), md5)
+
+
+    def _load(self):
+        with open(self._path, "rb") as f:
+            while True:
+                digest = f.read(self.DIGEST_SIZE)
+                if len(digest) < self.DIGEST_SIZE:
+                    break # Ignore anything half-written when a previous run died.
+
+                if digest not in self._digests:
+                    self._digests.add(digest)
+                    self._count += 1
+
+
+class BloomFilter(object):
+    '''Set of digests that uses a fixed amount of memory, but may report digests it doesn't contain as being in it.
+
+    Args:
+        capacity (int):
+            Number of digests it should hold.
+        error_rate (float):
+            Fraction of digests not in it that may be reported as being in it, once it holds capacity digests.
+    '''
+
+    def __init__(self, capacity, error_rate):
+        self._size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self._hashes = max(1, int(round(self._size / capacity * math.log(2))))
+        self._bits = bytearray((self._size + 7) // 8)
+
+
+    def add(self, digest):
+        for bit in self._positions(digest):
+            self._bits[bit >> 3] |= 1 << (bit & 7)
+
+
+    def __contains__(self, digest):
+        return all(self._bits[bit >> 3] & (1 << (bit & 7)) for bit in self._positions(digest))
+
+
+    def _positions(self, digest):
+        # Double hashing: the digest is already a good hash, so its halves are used as two independent ones.
+        first, second = struct.unpack(str("<QQ"), digest)
+        return [(first + i * second) % self._size for i in range(self._hashes)]
+
+
+def normalize_address(address):
+    '''Address with case, punctuation and spacing that don't change where it goes removed, e.g. for comparison.
+
+    Example::
+
+        normalize_address(" 1 Main St.,\\n  Springfield ") # => "1 MAIN ST\\nSPRINGFIELD"
+    '''
+
+    if isinstance(address, bytes):
+        address = address.decode("utf-8")
+
+    lines = []
+    for line in address.splitlines():
+        line = _PUNCTUATION_RE.sub(" ", line.upper())
+        line = " ".join(line.split())
+        if line:
+            lines.append(line)
+
+    return "\n".join(lines)
+
+
+_PUNCTUATION_RE = re.compile(r"[.,;]")
+
+
+def _digest(batch_id, address, md5):
+    return hashlib.md5(("%s\0%s\0%s" % (batch_id, address, md5)).encode("utf-8")).digest()
@@ -0,0 +1,181 @@
+'''Preparing mailings' data to be sent (base64 and md5), away from the threads sending them.
+
+For large PDFs, encoding the data takes longer than sending it. An encoder
+can be given to stampr.batch.Batch.mail_many, so that each mailing's data is
+encoded while earlier mailings are being sent::
+
+    with stampr.encoder.ProcessPoolEncoder() as encoder:
+        result = batch.mail_many(recipients(), encoder=encoder)
+
+Encoders have a submit(data) method, returning a concurrent.futures.Future
+for the (data, md5, format) of the payload (see encode_payload), so any
+object with that method can be used.
+'''
+
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import hashlib
+import json
+import re
+import sys
+
+from .utilities import _encode_base64, string
+
+
+PDF_HEADER_RE = re.compile(b"\\A%PDF")
+
+# base64 is written in lines encoding this many bytes, so chunks of a multiple of it encode to the same lines.
+LINE_BYTES = 57
+
+
+def payload_format(data):
+    '''Format to send data in ["json", "pdf", "html" or "none"]'''
+
+    if isinstance(data, dict):
+        return "json"
+    elif isinstance(data, bytes) and PDF_HEADER_RE.match(data):
+        return "pdf"
+    elif isinstance(data, string):
+        return "html"
+    elif data is None:
+        return "none"
+    else:
+        raise TypeError("bad format for data")
+
+
+def encode_payload(data, chunk_size=None):
+    '''Encode a mailing's data to be sent.
+
+    Args:
+        data (str, bytes, dict):
+            Data, as given to stampr.mailing.Mailing.
+        chunk_size (int):
+            Bytes to encode at a time, so that md5 (which lets other threads run while it works) starts on each chunk
+            as it is encoded [None, meaning all at once].
+
+    Returns:
+        (data, md5, format); data and md5 are None if there is no data
+    '''
+
+    format = payload_format(data)
+
+    if format == "json":
+        data = json.dumps(data)
+    elif format == "none":
+        return None, None, format
+
+    if not isinstance(data, bytes):
+        if sys.version_info[0] < 3:
+            data = bytes(data)
+        else:
+            data = bytes(data, "ascii")
+
+    md5 = hashlib.md5()
+
+    if chunk_size is None:
+        data = _encode_base64(data)
+        md5.update(data)
+    else:
+        step = max(LINE_BYTES, chunk_size - chunk_size % LINE_BYTES)
+        chunks = []
+        for i in range(0, len(data), step):
+            chunk = _encode_base64(data[i:i + step])
+            md5.update(chunk)
+            chunks.append(chunk)
+        data = b"".join(chunks)
+
+    return data, md5.hexdigest(), format
+
+
+class Encoder(object):
+    '''Encodes data as soon as it is submitted, on the calling thread (as happens without an encoder).'''
+
+    def submit(self, data):
+        '''Start encoding data (see encode_payload).
+
+        Returns:
+            concurrent.futures.Future, for (data, md5, format)
+        '''
+
+        import concurrent.futures
+
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(encode_payload(data))
+        except Exception as ex:
+            future.set_exception(ex)
+
+        return future
+
+
+    def close(self):
+        '''Stop the encoder, once everything submitted has been encoded.'''
+
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ProcessPoolEncoder(Encoder):
+    '''Encodes data in other processes, so encoding isn't held up by (and doesn't hold up) the threads sending it.
+
+    Data is copied to and from the processes, which is only worthwhile when it
+    is large (such as PDFs).
+
+    Args:
+        workers (int):
+            Number of processes [None, meaning one per CPU].
+    '''
+
+    def __init__(self, workers=None):
+        import concurrent.futures
+
+        if workers is not None and (not isinstance(workers, int) or workers <= 0):
+            raise ValueError("workers must be a positive int")
+
+        self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+
+
+    def submit(self, data):
+        return self._executor.submit(encode_payload, data)
+
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+class ChunkedEncoder(Encoder):
+    '''Encodes data in other threads, a chunk at a time.
+
+    The md5 of each chunk is worked out while other threads run, so several
+    payloads are partly encoded at once. base64 doesn't let other threads run
+    while it works, so for the most CPU time, use ProcessPoolEncoder.
+
+    Args:
+        workers (int):
+            Number of threads [2].
+        chunk_size (int):
+            Bytes to encode at a time (rounded down to a multiple of 57) [912K].
+    '''
+
+    def __init__(self, workers=2, chunk_size=LINE_BYTES * 16384):
+        import concurrent.futures
+
+        if not isinstance(workers, int) or workers <= 0:
+            raise ValueError("workers must be a positive int")
+        if not isinstance(chunk_size, int) or chunk_size <= 0:
+            raise ValueError("chunk_size must be a positive int")
+
+        self._chunk_size = chunk_size
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+
+    def submit(self, data):
+        return self._executor.submit(encode_payload, data, self._chunk_size)
+
+
+    def close(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,228 @@
+'''Writing browse results to a file, a page at a time, so an export of any size can be resumed if it is interrupted.
+
+Example::
+
+    count = stampr.export.export_mailings("may.csv.gz", datetime.datetime(2013, 5, 1), datetime.datetime(2013, 6, 1))
+
+Records are written in JSON Lines (one JSON object per line) or CSV, optionally
+gzipped. After each page is written, the position in the file is recorded in
+a checkpoint file (the path with ".checkpoint" added). Exporting to the same
+path again carries on from the last page written, rather than starting over
+(or does nothing, if the export finished). Gzipped files are written as one
+gzip member per page, which gzip and Python's gzip module read as one file.
+
+The mailings' data isn't exported.
+'''
+
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+
+from .pagination import iter_pages
+from .recordset import BatchRecordSet, MailingRecordSet
+from .registry import _replace
+from .utilities import string
+
+
+FORMATS = ["jsonl", "csv"]
+
+MAILING_COLUMNS = [key for _, key, _ in MailingRecordSet.COLUMNS]
+BATCH_COLUMNS = [key for _, key, _ in BatchRecordSet.COLUMNS]
+
+
+def export(search, path, columns, format=None, compress=None, resume=True, client=None, window=None):
+    '''Write every record from a paged search to a file, a page at a time.
+
+    Args:
+        search (tuple):
+            Path to search, without the page number (see stampr.pagination.iter_pages).
+        path (str):
+            File to write.
+        columns (list of str):
+            Keys of the records to write (in order, for CSV).
+        format (str):
+            ["jsonl", "csv"] Format to write [from the path's extension, otherwise "jsonl"].
+        compress (bool):
+            Gzip the file [True if the path ends in ".gz"].
+        resume (bool):
+            Carry on from the checkpoint of an earlier export to the same path, if there is one [True].
+        client (stampr.client.Client):
+            Client to use [stampr.client.Client.current].
+        window (int):
+            Number of pages to request concurrently [client.page_window].
+
+    Returns:
+        Number of records in the file [int]
+    '''
+
+    if not isinstance(search, tuple):
+        raise TypeError("search must be a tuple")
+
+    if compress is None:
+        compress = path.endswith(".gz")
+    if format is None:
+        format = _guess_format(path[:-3] if path.endswith(".gz") else path)
+    if format not in FORMATS:
+        raise ValueError("format must be one of %s" % ", ".join(repr(f) for f in FORMATS))
+
+    query = "/".join(str(part) for part in search)
+    checkpoint = _Checkpoint(path + ".checkpoint")
+
+    if resume and checkpoint.load() and (checkpoint.page == 0 or os.path.exists(path)):
+        if (checkpoint.query, checkpoint.format, checkpoint.compress) != (query, format, compress):
+            raise ValueError("%s is from a different export; export with resume=False to start again" %
+                             checkpoint.path)
+        if checkpoint.complete:
+            return checkpoint.count
+    else:
+        checkpoint.start(query, format, compress)
+
+    # Anything after the last page recorded was written by an export that was interrupted.
+    f = io.open(path, "r+b" if checkpoint.page else "wb")
+
+    try:
+        f.seek(checkpoint.offset)
+        f.truncate()
+
+        for page in iter_pages(search, client, window, start=checkpoint.page):
+            data = _serialize(page, columns, format, header=checkpoint.page == 0)
+            f.write(_gzip(data) if compress else data)
+            f.flush()
+            os.fsync(f.fileno())
+
+            checkpoint.page += 1
+            checkpoint.count += len(page)
+            checkpoint.offset = f.tell()
+            checkpoint.save()
+
+        if checkpoint.page == 0 and format == "csv":
+            # Nothing found, but the file should still have its header.
+            data = _serialize([], columns, format, header=True)
+            f.write(_gzip(data) if compress else data)
+            checkpoint.offset = f.tell()
+
+    finally:
+        f.close()
+
+    checkpoint.complete = True
+    checkpoint.save()
+
+    return checkpoint.count
+
+
+def export_mailings(path, start, finish, status=None, batch=None, **options):
+    '''Write the mailings between two times to a file (see export()).
+
+    Args:
+        path (str):
+            File to write.
+        start (datetime.datetime):
+            Start of time period to get mailings for.
+        finish (datetime.datetime):
+            End of time period to get mailings for.
+        status (str):
+            Status of mailings to export [None, meaning all].
+        batch (stampr.batch.Batch):
+            Batch to export mailings from [None, meaning all].
+        options:
+            Passed to export().
+
+    Returns:
+        Number of mailings in the file [int]
+    '''
+
+    from .mailing import Mailing
+
+    return export(Mailing._browse_path(start, finish, status, batch), path, MAILING_COLUMNS, **options)
+
+
+def export_batches(path, start, finish, status=None, **options):
+    '''Write the batches between two times to a file (see export()).
+
+    Returns:
+        Number of batches in the file [int]
+    '''
+
+    from .batch import Batch
+
+    return export(Batch._browse_path(start, finish, status), path, BATCH_COLUMNS, **options)
+
+
+class _Checkpoint(object):
+    '''How far an export has got, kept in a file.'''
+
+    def __init__(self, path):
+        self.path = path
+        self.start(None, None, None)
+
+
+    def start(self, query, format, compress):
+        self.query, self.format, self.compress = query, format, compress
+        self.page = 0
+        self.count = 0
+        self.offset = 0
+        self.complete = False
+
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+
+        with open(self.path) as f:
+            self.__dict__.update(json.load(f))
+
+        return True
+
+
+    def save(self):
+        data = dict((k, v) for k, v in self.__dict__.items() if k != "path")
+
+        # Written to a temporary file and renamed, so the file is never left half-written.
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(data, f)
+        _replace(temporary, self.path)
+
+
+def _guess_format(path):
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def _serialize(records, columns, format, header):
+    '''Records as bytes, in a format.'''
+
+    if format == "jsonl":
+        lines = [json.dumps(dict((key, record.get(key)) for key in columns), sort_keys=True) for record in records]
+        return "".join(line + "\n" for line in lines).encode("utf-8")
+
+    rows = [[record.get(key) for key in columns] for record in records]
+    if header:
+        rows.insert(0, columns)
+
+    if sys.version_info[0] < 3:
+        # Python 2's csv module only writes bytes.
+        buffer = io.BytesIO()
+        writer = csv.writer(buffer, lineterminator=str("\n"))
+        for row in rows:
+            writer.writerow([v.encode("utf-8") if isinstance(v, string) else v for v in row])
+        return buffer.getvalue()
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def _gzip(data):
+    '''data as a gzip member (members can be concatenated to make a gzip file).'''
+
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb") as f:
+        f.write(data)
+
+    return buffer.getvalue()
@@ -1,28 +1,34 @@
 from __future__ import absolute_import, unicode_literals, print_function, division
 
-from .client import Client
-from .mailing import Mailing
-from .exceptions import APIError
 
-
-def authenticate(username, password):
+def authenticate(username, password, **options):
     '''Authenticate your Stampr account with username and password.
 
+    Example::
+
+        stampr.authenticate("user", "pass", pool_maxsize=50)
+
     Args:
         username (str):
             Account username.
         password (str):
             Account password.
+        options:
+            Connection options passed to stampr.client.Client.
 
     Returns:
         [stampr.client.Client]
     '''
 
-    Client(username, password)
+    from .client import Client
+
+    return Client(username, password, **options)
 
 
 def mail(return_address, address, body, config=None, batch=None):
-    '''Send a simple HTML or PDF email, in its own batch and default config (unless :batch and/or :config options are used).
+    '''Send a simple HTML or PDF email, with the default config (unless :config is used).
+
+    Unless :batch is used, mailings with the same config share a batch (see stampr.autobatch.AutoBatcher).
 
     Example::
 
@@ -40,11 +46,13 @@ def mail(return_address, address, body, config=None, batch=None):
         config (stampr.config.Config):
             Config to use (default config will be created if not specified)
         batch (stampr.batch.Batch):
-            Batch to add the mailing to (new batch will be created if not specified)
+            Batch to add the mailing to (a shared batch will be used if not specified)
 
     Returns:
         [stampr.mailing.Mailing] The mailing object representing the mail sent.
     '''
 
+    from .client import Client
+
     return Client.current.mail(return_address, address, body, config, batch)
 
@@ -0,0 +1,110 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import threading
+
+
+class RequestEvent(object):
+    '''Details of a request, passed to hooks registered on a client.
+
+    Attributes:
+        method (str):
+            HTTP method, e.g. "GET".
+        path (tuple):
+            Path requested, e.g. ("mailings", 12).
+        request_bytes (int):
+            Size of the request body.
+        response_bytes (int):
+            Size of the response body (None before a response).
+        status_code (int):
+            HTTP status of the response (None before a response, or if there was none).
+        duration (float):
+            Seconds taken by the attempt (after_response), or by all attempts (on_error).
+        retries (int):
+            Number of earlier attempts at this request.
+        error (stampr.exceptions.HTTPError):
+            Error about to be raised (on_error only).
+    '''
+
+    __slots__ = ["method", "path", "request_bytes", "response_bytes", "status_code", "duration", "retries", "error"]
+
+    def __init__(self, method, path, request_bytes, retries=0):
+        self.method = method
+        self.path = path
+        self.request_bytes = request_bytes
+        self.response_bytes = None
+        self.status_code = None
+        self.duration = None
+        self.retries = retries
+        self.error = None
+
+    def __repr__(self):
+        return "<RequestEvent %s %s status=%s retries=%d>" % (self.method, "/".join(str(d) for d in self.path),
+                                                             self.status_code, self.retries)
+
+
+class Hooks(object):
+    '''Mixin that lets callbacks be registered to observe every request a client makes.
+
+    Events:
+        before_request:
+            Before each attempt to send a request (including retries).
+        after_response:
+            After each response is received, whatever its status.
+        on_error:
+            Just before a request fails with stampr.exceptions.HTTPError (after any retries).
+
+    Each callback is called with a stampr.hooks.RequestEvent. Exceptions raised by callbacks are not caught.
+    '''
+
+    EVENTS = ["before_request", "after_response", "on_error"]
+
+    _hooks = {}
+    _hooks_lock = threading.Lock()
+
+    def add_hook(self, event, callback):
+        '''Register a callback for an event.
+
+        Example::
+
+            def record(event):
+                metrics.timing("stampr.%s" % event.method, event.duration)
+
+            client.add_hook("after_response", record)
+
+        Args:
+            event (str):
+                "before_request", "after_response" or "on_error"
+            callback (callable):
+                Called with a stampr.hooks.RequestEvent.
+        '''
+
+        if event not in self.EVENTS:
+            raise ValueError("event must be one of %s" % ", ".join(repr(e) for e in self.EVENTS))
+        if not callable(callback):
+            raise TypeError("callback must be callable")
+
+        with self._hooks_lock:
+            # Replaced, not modified, so requests in progress can safely iterate over the old ones.
+            hooks = dict(self._hooks)
+            hooks[event] = hooks.get(event, []) + [callback]
+            self._hooks = hooks
+
+
+    def remove_hook(self, event, callback):
+        '''Remove a callback registered with add_hook().'''
+
+        with self._hooks_lock:
+            hooks = dict(self._hooks)
+            callbacks = [c for c in hooks.get(event, []) if c != callback]
+
+            if callbacks:
+                hooks[event] = callbacks
+            else:
+                hooks.pop(event, None)
+
+            self._hooks = hooks
+
+
+    def _fire(self, event, details):
+        for callback in self._hooks.get(event, ()):
+            callback(details)
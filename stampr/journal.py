@@ -0,0 +1,161 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import sqlite3
+import time
+import uuid
+
+
+class Journal(object):
+    '''Local record of the mailings sent by stampr.batch.Batch.mail_many(), so an interrupted send can be resumed.
+
+    Before each mailing is sent, the intent to send it is recorded, with the
+    idempotency key it will be sent with. Once the server has accepted it,
+    its mailing id and the md5 of its data are recorded. When the same items
+    are sent again with the same journal, those already accepted are
+    skipped, and any that were being sent when the process died are sent
+    again with their original idempotency key, so the server doesn't print
+    them twice.
+
+    Items are identified by their position in the input, so it must be the
+    same input, in the same order, when resuming.
+
+    The journal is a SQLite database. Intents are written to disk before the
+    mailings are sent, a group at a time; acceptances are written every
+    sync_every mailings or sync_interval seconds, whichever is sooner
+    (losing some of those only means sending the mailings again, with the
+    same keys).
+
+    Example::
+
+        with stampr.journal.Journal("campaign.journal") as journal:
+            batch = stampr.batch.Batch[journal.batch_id] if journal.batch_id else stampr.batch.Batch()
+            result = batch.mail_many(recipients(), journal=journal)
+
+    Args:
+        path (str):
+            File to keep the journal in (created if it doesn't exist).
+        sync_every (int):
+            Most accepted mailings to record before writing them to disk [100].
+        sync_interval (float):
+            Most seconds to wait before writing accepted mailings to disk [1].
+    '''
+
+    def __init__(self, path, sync_every=100, sync_interval=1):
+        if not isinstance(sync_every, int) or sync_every <= 0:
+            raise ValueError("sync_every must be a positive int")
+        if not isinstance(sync_interval, (int, float)) or sync_interval < 0:
+            raise ValueError("sync_interval must be a number, at least 0")
+
+        self._path = path
+        self._sync_every = sync_every
+        self._sync_interval = sync_interval
+        self._unsynced = 0
+        self._synced_at = time.time()
+
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS submissions ("
+                         "item INTEGER PRIMARY KEY, idempotency_key TEXT NOT NULL, mailing_id INTEGER, md5 TEXT)")
+        self._db.execute("BEGIN")
+
+
+    @property
+    def path(self):
+        '''File the journal is kept in [str]'''
+        return self._path
+
+
+    @property
+    def batch_id(self):
+        '''Batch that the journalled mailings were sent to [int, None if nothing has been sent]'''
+
+        row = self._db.execute("SELECT value FROM meta WHERE name = 'batch_id'").fetchone()
+        return row[0] if row else None
+
+
+    @property
+    def confirmed(self):
+        '''Number of mailings that the server has accepted [int]'''
+
+        return self._db.execute("SELECT COUNT(*) FROM submissions WHERE mailing_id IS NOT NULL").fetchone()[0]
+
+
+    def entry(self, item):
+        '''What is known about sending an item.
+
+        Args:
+            item (int):
+                Position of the item in the input.
+
+        Returns:
+            (idempotency_key, mailing_id, md5), or None if it hasn't been sent. mailing_id and md5 are None
+            unless the server accepted it.
+        '''
+
+        return self._db.execute("SELECT idempotency_key, mailing_id, md5 FROM submissions WHERE item = ?",
+                                (item, )).fetchone()
+
+
+    def begin(self, batch_id):
+        '''Check that mailings are being sent to the same batch as before (or record the batch, if none were).'''
+
+        previous = self.batch_id
+
+        if previous is None:
+            self._db.execute("INSERT INTO meta (name, value) VALUES ('batch_id', ?)", (batch_id, ))
+        elif previous != batch_id:
+            raise ValueError("journal is for batch %d, not %d" % (previous, batch_id))
+
+
+    def intend(self, item):
+        '''Record the intention to send an item (not written to disk until sync()).
+
+        Returns:
+            Idempotency key to send it with [str]
+        '''
+
+        entry = self.entry(item)
+        if entry is not None:
+            return entry[0]
+
+        key = uuid.uuid4().hex
+        self._db.execute("INSERT INTO submissions (item, idempotency_key) VALUES (?, ?)", (item, key))
+
+        return key
+
+
+    def confirm(self, item, mailing_id, md5):
+        '''Record that the server accepted an item (written to disk every sync_every items or sync_interval seconds).'''
+
+        self._db.execute("UPDATE submissions SET mailing_id = ?, md5 = ? WHERE item = ?", (mailing_id, md5, item))
+        self._unsynced += 1
+
+        if self._unsynced >= self._sync_every or time.time() - self._synced_at >= self._sync_interval:
+            self.sync()
+
+
+    def sync(self):
+        '''Write everything recorded so far to disk.'''
+
+        self._db.execute("COMMIT")
+        self._db.execute("BEGIN")
+        self._unsynced = 0
+        self._synced_at = time.time()
+
+
+    def close(self):
+        '''Write everything to disk and close the journal.'''
+
+        if self._db is not None:
+            self._db.execute("COMMIT")
+            self._db.close()
+            self._db = None
+
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
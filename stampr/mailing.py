@@ -1,15 +1,15 @@
 from __future__ import absolute_import, unicode_literals, print_function, division
 
-import base64
 import hashlib
 import datetime
-import re
 import sys
-import json
 
-from .utilities import _bad_attribute, string
+from .utilities import _bad_attribute, _decode_base64, string
 from .client import Client
 from .batch import Batch
+from .pagination import iter_pages, iter_records
+from .sharding import iter_sharded_records
+from .encoder import PDF_HEADER_RE, encode_payload, payload_format
 from .exceptions import APIError, ReadOnlyError, RequestError
 
 
@@ -37,14 +37,7 @@ class MailingMeta(type):
         mailings = Client.current.get(("mailings", id))
 
         if mailings:
-            mailing = mailings[0]
-            mailing["return_address"] = mailing["returnaddress"]
-            del mailing["returnaddress"]
-
-            if "pdf" in mailing:
-                del mailing["pdf"]
-       
-            return Mailing(**mailing)
+            return Mailing._from_record(mailings[0])
         else:
             raise RequestError("No such Mailing: %d" % id)
 
@@ -75,12 +68,12 @@ class Mailing(MailingMeta(str('MailingParent'), (object, ), {})):
             Internal use only!
     '''
 
-    PDF_HEADER_RE = re.compile(b"\\A%PDF")
+    PDF_HEADER_RE = PDF_HEADER_RE
 
     STATUSES = ["received", "render", "error", "queued", "assigned", "processing", "printed", "shipped"]
             
     @classmethod
-    def browse(cls, start, finish, status=None, batch=None):
+    def browse(cls, start, finish, status=None, batch=None, concurrency=1, ordered=True):
         '''Browse mailings
 
         Get the mailing between two times, optionally only with a specific
@@ -97,6 +90,9 @@ class Mailing(MailingMeta(str('MailingParent'), (object, ), {})):
             mailings = stampr.mailing.Mailing.browse(start, end, status="processing")
             mailings = stampr.mailing.Mailing.browse(start, end, batch=my_batch)
             mailings = stampr.mailing.Mailing.browse(start, end, status="processing", batch"my_batch)
+
+            # A busy year, in parallel.
+            mailings = stampr.mailing.Mailing.browse(start, end, concurrency=16)
         
         Args:
             start (datetime.datetime):
@@ -107,11 +103,123 @@ class Mailing(MailingMeta(str('MailingParent'), (object, ), {})):
                 ["received", "render", "error", "queued", "assigned", "processing", "printed", "shipped"] Status of mailings to find.
             batch (stampr.batch.Batch):
                 Batch to retrieve mailings from.
+            concurrency (int):
+                Number of parts of the period to browse at once (see stampr.sharding.iter_sharded_records) [1].
+            ordered (bool):
+                With a concurrency above 1, keep the mailings in time order (by part of the period), rather than in
+                the order the parts arrive [True].
         
         Returns:
             list of stampr.mailing.Mailing
         '''
 
+        return list(cls.iter_browse(start, finish, status, batch, concurrency, ordered))
+
+
+    @classmethod
+    def iter_browse(cls, start, finish, status=None, batch=None, concurrency=1, ordered=True):
+        '''Browse mailings, one page at a time
+
+        Takes the same arguments as browse(), but yields each mailing as soon
+        as its page arrives, rather than waiting for every page, so only one
+        page is held in memory at a time (with a concurrency above 1, a few
+        pages per part of the period being browsed; see
+        stampr.sharding.iter_sharded_records).
+
+        Example::
+
+            for mailing in stampr.mailing.Mailing.iter_browse(start, end, status="error"):
+                print(mailing.id)
+
+        Returns:
+            generator of stampr.mailing.Mailing
+        '''
+
+        search = cls._browse_path(start, finish, status, batch)
+
+        if concurrency == 1:
+            records = iter_records(search)
+        else:
+            records = iter_sharded_records(search[:-2], start, finish, "mailing_id", concurrency=concurrency,
+                                           ordered=ordered)
+
+        return (cls._from_record(m) for m in records)
+
+
+    @classmethod
+    def browse_records(cls, start, finish, status=None, batch=None):
+        '''Browse mailings, into a stampr.recordset.MailingRecordSet
+
+        Takes the same arguments as browse(), but stores the mailings a column
+        at a time, which takes much less memory than a list of Mailing
+        objects when there are many of them (the mailings' data isn't kept).
+
+        Example::
+
+            mailings = stampr.mailing.Mailing.browse_records(start, end)
+            print(mailings.count_by_status())
+
+            for mailing in mailings.filter(status="error"):
+                print(mailing.id)
+
+        Returns:
+            stampr.recordset.MailingRecordSet
+        '''
+
+        from .recordset import MailingRecordSet
+
+        return MailingRecordSet.from_pages(cls._browse_path(start, finish, status, batch))
+
+
+    @classmethod
+    def browse_new(cls, since, status=None, batch=None, into=None):
+        '''Browse mailings created since this search was last browsed
+
+        The first time a search (with a particular status and/or batch) is
+        browsed, mailings are found from since until now; after that, only
+        those created since the previous browse are found, a little early to
+        allow for the clocks being out (see stampr.watermark.WatermarkStore),
+        which is much quicker than browsing the whole period again. How far
+        each search has got is kept by the client (see its watermarks option).
+
+        Example::
+
+            reconciled = {}
+            since = datetime.datetime(2013, 5, 1)
+
+            # Every hour:
+            stampr.mailing.Mailing.browse_new(since, status="error", into=reconciled)
+
+        Args:
+            since (datetime.datetime):
+                Start of the period to browse the first time.
+            status:
+                ["received", "render", "error", "queued", "assigned", "processing", "printed", "shipped"] Status of mailings to find.
+            batch (stampr.batch.Batch):
+                Batch to retrieve mailings from.
+            into (dict):
+                Mailings found are also added to this, by id, replacing any with the same id [None].
+
+        Returns:
+            list of stampr.mailing.Mailing, those not found (with the same status) by the previous browse
+        '''
+
+        search = cls._browse_path(since, since, status, batch)[:-2]
+        client = Client.current
+
+        mailings = [cls._from_record(m) for m in client.watermarks.browse(client, search, since)]
+
+        if into is not None:
+            for mailing in mailings:
+                into[mailing.id] = mailing
+
+        return mailings
+
+
+    @classmethod
+    def _browse_path(cls, start, finish, status=None, batch=None):
+        '''Path to browse mailings, without the page number.'''
+
         if not isinstance(start, datetime.datetime):
             raise TypeError("start should be a datetime.datetime")
 
@@ -144,28 +252,21 @@ class Mailing(MailingMeta(str('MailingParent'), (object, ), {})):
 
         search += (start.isoformat(), finish.isoformat())
 
-        all_mailings = []
-        i = 0
-
-        while True:
-            mailings = Client.current.get(search + (i, ))
-
-            if not mailings:
-                break
+        return search
 
-            all_mailings.extend(mailings)
 
-            i += 1
+    @classmethod
+    def _from_record(cls, mailing):
+        '''Create a Mailing from a record returned by the server.'''
 
         # Correct the naming.
-        for mailing in all_mailings:
-            mailing["return_address"] = mailing["returnaddress"]
-            del mailing["returnaddress"]
+        mailing["return_address"] = mailing["returnaddress"]
+        del mailing["returnaddress"]
 
-            if "pdf" in mailing:
-                del mailing["pdf"]
+        if "pdf" in mailing:
+            del mailing["pdf"]
 
-        return [Mailing(**m) for m in all_mailings]
+        return Mailing(**mailing)
 
     
     def is_created(self):
@@ -212,7 +313,7 @@ class Mailing(MailingMeta(str('MailingParent'), (object, ), {})):
             else:
                 data = bytes(data, "ascii")
 
-            self._data = base64.decodestring(data)
+            self._data = _decode_base64(data)
         else:
             self._data = data
 
@@ -306,25 +407,28 @@ class Mailing(MailingMeta(str('MailingParent'), (object, ), {})):
     def format(self):
         '''Format of the data [str]'''
 
-        data = self.data
-        if isinstance(data, dict):
-            format = "json"
-        elif isinstance(data, bytes) and self.PDF_HEADER_RE.match(data):
-            format = "pdf"
-        elif isinstance(data, string):
-            format = "html"
-        elif data is None:
-            format = "none"
-        else:
-            raise TypeError("bad format for data")
-
-        return format
+        return payload_format(self.data)
 
 
     
     def mail(self):
         '''Mail the mailing on the server.'''
 
+        params = self._mail_params()
+
+        result = Client.current.post(("mailings", ), **params)
+
+        self._mailed(result)
+
+
+    def _mail_params(self, payload=None):
+        '''Parameters to POST to create the mailing on the server.
+
+        Args:
+            payload (tuple):
+                (data, md5, format), if the data has already been encoded (see stampr.encoder) [None].
+        '''
+
         if self.is_created():
             raise APIError("Already mailed")
         if self.address is None:
@@ -332,36 +436,25 @@ class Mailing(MailingMeta(str('MailingParent'), (object, ), {})):
         if self.return_address is None:
             raise APIError("return_address required before mailing")
 
+        data, md5, format = payload if payload is not None else encode_payload(self.data)
+
         params = {
                 "batch_id": self.batch_id,
                 "address": self.address,
                 "returnaddress": self.return_address,
-                "format": self.format,
+                "format": format,
         }
 
-        if self.format == "json":
-            data = json.dumps(self.data)
-        elif self.format in ["html", "pdf"]:
-            data = self.data
-        else:
-            data = None
-
         if data is not None:
-            if not isinstance(data, bytes):
-                if sys.version_info[0] < 3:
-                    data = bytes(data)
-                else:
-                    data = bytes(data, "ascii")
-
-            data = base64.encodestring(data)
             params["data"] = data
+            params["md5"] = md5
 
-            md5 = hashlib.md5()
-            md5.update(params["data"])
-            params["md5"] = md5.hexdigest()
+        return params
+
+
+    def _mailed(self, result):
+        '''Record the result of mailing on the server.'''
 
-        result = Client.current.post(("mailings", ), **params)
-                                                                
         self._id = result["mailing_id"]
 
         self._status = "received"
@@ -385,6 +478,115 @@ class Mailing(MailingMeta(str('MailingParent'), (object, ), {})):
             raise APIError("can't sync() before create()")
 
         mailing = Client.current.get(("mailings", self.id))
+        self._synced(mailing)
+
+
+    @classmethod
+    def sync_many(cls, mailings, concurrency=8, browse_threshold=10):
+        '''Update the status of many mailings from the server.
+
+        Mailings are grouped by batch. Where a batch has at least
+        browse_threshold of the mailings, the batch is browsed a page at a
+        time, until every one of them has been seen; the others are fetched
+        one by one. Browsing stops early once the pages requested, plus the
+        mailings not yet seen, are as many as the mailings wanted from the
+        batch (so a few mailings in a large batch are fetched one by one,
+        after a single page), and the mailings not seen are then fetched one
+        by one. Syncing a batch's mailings thus takes at most one request
+        more than fetching each of them. Requests are made concurrently.
+
+        Example::
+
+            for mailing in stampr.mailing.Mailing.sync_many(mailings):
+                print(mailing.id, mailing.status)
+
+        Args:
+            mailings (list of stampr.mailing.Mailing):
+                Mailings to update (all must have been mailed).
+            concurrency (int):
+                Number of requests to make at once [8].
+            browse_threshold (int):
+                Least mailings in a batch for it to be browsed, rather than getting each mailing [10].
+
+        Returns:
+            list of stampr.mailing.Mailing whose status changed, in the order given.
+        '''
+
+        import concurrent.futures
+
+        mailings = list(mailings)
+
+        if not all(isinstance(m, Mailing) for m in mailings):
+            raise TypeError("mailings must all be stampr.mailing.Mailing")
+        if not all(m.is_created() for m in mailings):
+            raise APIError("can't sync_many() before create()")
+        if not isinstance(concurrency, int) or concurrency <= 0:
+            raise ValueError("concurrency must be a positive int")
+
+        client = Client.current
+        previous = [m.status for m in mailings]
+
+        by_batch = {}
+        for mailing in mailings:
+            by_batch.setdefault(mailing.batch_id, []).append(mailing)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            gets, browses = {}, {}
+
+            for batch_id, group in by_batch.items():
+                if len(group) >= browse_threshold:
+                    ids = set(m.id for m in group)
+                    browses[executor.submit(cls._batch_statuses, client, batch_id, ids)] = group
+                else:
+                    for mailing in group:
+                        gets[executor.submit(client.get, ("mailings", mailing.id))] = mailing
+
+            for future in concurrent.futures.as_completed(list(browses)):
+                statuses = future.result()
+
+                for mailing in browses[future]:
+                    if mailing.id in statuses:
+                        mailing._status = statuses[mailing.id]
+                    else:
+                        # Not found by browsing (it stopped early, or the mailing is in another batch), so get it.
+                        gets[executor.submit(client.get, ("mailings", mailing.id))] = mailing
+
+            for future in concurrent.futures.as_completed(list(gets)):
+                result = future.result()
+                if result:
+                    gets[future]._synced(result)
+
+        return [m for m, status in zip(mailings, previous) if m.status != status]
+
+
+    @classmethod
+    def _batch_statuses(cls, client, batch_id, ids):
+        '''Status of the mailings in a batch with ids, by id, browsing only while that is cheaper than getting them.'''
+
+        start = datetime.datetime(1970, 1, 1)
+        finish = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+        search = ("batches", batch_id, "browse", start.isoformat(), finish.isoformat())
+
+        statuses = {}
+        # One page at a time, since each may be the last needed.
+        for pages, page in enumerate(iter_pages(search, client, window=1), 1):
+            statuses.update((m["mailing_id"], m["status"]) for m in page if m["mailing_id"] in ids)
+
+            missing = len(ids) - len(statuses)
+            if not missing or pages + missing >= len(ids):
+                break # Every one seen, or getting the rest would cost no more than browsing has so far.
+
+        return statuses
+
+
+    def _synced(self, mailing):
+        '''Record the status fetched from the server (a record, or a list holding one).'''
+
+        if isinstance(mailing, list):
+            if not mailing:
+                raise RequestError("No such Mailing: %d" % self.id)
+            mailing = mailing[0]
+
         self._status = mailing["status"]
 
 
@@ -0,0 +1,117 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import collections
+
+from .client import Client
+
+
+def iter_pages(search, client=None, window=None, start=0):
+    '''Get each page of results for a paged search, in order.
+
+    With a window of 1, pages are requested one after another until one is
+    empty. With a larger window, that many pages are kept in flight at once
+    (each in its own thread); no more are requested once a page is empty or
+    is shorter than an earlier one (that is, once the last page is found).
+
+    Example::
+
+        for page in stampr.pagination.iter_pages(("configs", "browse", "all"), window=8):
+            print(len(page))
+
+    Args:
+        search (tuple):
+            Path to search, without the page number.
+        client (stampr.client.Client):
+            Client to use [stampr.client.Client.current].
+        window (int):
+            Number of pages to request concurrently [client.page_window].
+        start (int):
+            First page to get (e.g. to carry on from where an earlier search stopped) [0].
+
+    Returns:
+        generator of lists of records (dict)
+    '''
+
+    if not isinstance(search, tuple):
+        raise TypeError("search must be a tuple")
+    if window is not None and (not isinstance(window, int) or window <= 0):
+        raise ValueError("window must be a positive int")
+    if not isinstance(start, int) or start < 0:
+        raise ValueError("start must be an int, at least 0")
+
+    return _iter_pages(search, client, window, start)
+
+
+def iter_records(search, client=None, window=None):
+    '''Get each record from a paged search, one page at a time (see iter_pages).
+
+    Returns:
+        generator of records (dict)
+    '''
+
+    return (record for page in iter_pages(search, client, window) for record in page)
+
+
+def _iter_pages(search, client, window, start):
+    if client is None:
+        client = Client.current
+    if window is None:
+        window = client.page_window
+
+    if window == 1:
+        pages = _sequential_pages(search, client, start)
+    else:
+        pages = _windowed_pages(search, client, window, start)
+
+    for page in pages:
+        yield page
+
+
+def _sequential_pages(search, client, start):
+    i = start
+
+    while True:
+        page = client.get(search + (i, ))
+
+        if not page:
+            break
+
+        yield page
+
+        i += 1
+
+
+def _windowed_pages(search, client, window, start):
+    import concurrent.futures
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=window)
+    pending = collections.deque()
+    page_size = 0
+
+    try:
+        for i in range(start, start + window):
+            pending.append(executor.submit(client.get, search + (i, )))
+
+        next_page = start + window
+
+        while pending:
+            page = pending.popleft().result()
+
+            if not page:
+                break
+
+            yield page
+
+            # Pages are the same size until the last, so a short page must be the last.
+            if len(page) < page_size:
+                break
+            page_size = len(page)
+
+            pending.append(executor.submit(client.get, search + (next_page, )))
+            next_page += 1
+
+    finally:
+        # Requests already past the last page are abandoned, not waited for.
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
@@ -0,0 +1,151 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import time
+import threading
+
+
+class RateLimiter(object):
+    '''Token bucket rate limiter, used by stampr.client.Client and stampr.aio.AsyncClient.
+
+    Every request (including retries) takes a token from the bucket, which
+    refills at the current rate up to burst tokens. When the bucket is empty,
+    requests wait their turn.
+
+    The current rate adapts to throttling (AIMD): whenever the server responds
+    with one of throttle_statuses, the rate is multiplied by decrease; each
+    successful response then adds it back a little at a time, so that a second
+    of successful requests increases the rate by increase, until it is back to
+    the configured rate.
+
+    A single RateLimiter may be shared by several clients, in any number of
+    threads, to keep them all under the same ceiling.
+
+    Example::
+
+        limiter = stampr.ratelimit.RateLimiter(rate=20, burst=40)
+        stampr.authenticate("user", "pass", rate_limit=limiter)
+
+    Args:
+        rate (float):
+            Maximum requests per second [10].
+        burst (int):
+            Maximum number of requests that can be made at once, after a quiet period [rate].
+        min_rate (float):
+            Rate never drops below this, however much the server throttles [rate / 20].
+        increase (float):
+            Requests per second added back after each second of successful requests [1].
+        decrease (float):
+            Multiply the rate by this when throttled [0.5].
+        throttle_statuses (list):
+            Status codes that mean the server is throttling us [429, 503].
+    '''
+
+    THROTTLE_STATUSES = [429, 503]
+
+    def __init__(self, rate=10, burst=None, min_rate=None, increase=1, decrease=0.5, throttle_statuses=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if burst is None:
+            burst = max(1, int(rate))
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+        if min_rate is None:
+            min_rate = rate / 20
+        if not 0 < min_rate <= rate:
+            raise ValueError("min_rate must be positive and no more than rate")
+        if not 0 < decrease < 1:
+            raise ValueError("decrease must be between 0 and 1")
+        if increase < 0:
+            raise ValueError("increase must not be negative")
+
+        self._max_rate = float(rate)
+        self._rate = float(rate)
+        self._burst = burst
+        self._min_rate = float(min_rate)
+        self._increase = increase
+        self._decrease = decrease
+        self._throttle_statuses = set(throttle_statuses if throttle_statuses is not None else self.THROTTLE_STATUSES)
+
+        self._tokens = float(burst)
+        self._updated = time.time()
+        self._last_decrease = None
+        self._lock = threading.Lock()
+
+
+    @property
+    def rate(self):
+        '''Current rate, in requests per second [float]'''
+        return self._rate
+
+    @property
+    def max_rate(self):
+        '''Configured rate, which the current rate recovers to [float]'''
+        return self._max_rate
+
+    @property
+    def burst(self):
+        '''Maximum number of tokens in the bucket [int]'''
+        return self._burst
+
+
+    def reserve(self):
+        '''Take a token, returning the number of seconds to wait before using it.
+
+        Use this, rather than acquire(), to wait without blocking (e.g. with asyncio.sleep()).
+
+        Returns:
+            [float]
+        '''
+
+        with self._lock:
+            self._refill()
+
+            # Tokens may go negative, which queues up requests in the order they reserved.
+            self._tokens -= 1
+
+            if self._tokens >= 0:
+                return 0.0
+            else:
+                return -self._tokens / self._rate
+
+
+    def acquire(self):
+        '''Take a token, sleeping until it is available.'''
+
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+
+    def on_response(self, status_code):
+        '''Adjust the rate according to a response from the server.
+
+        Args:
+            status_code (int):
+                HTTP status of the response (None if there was no response).
+        '''
+
+        if status_code is None:
+            return
+
+        with self._lock:
+            self._refill()
+
+            if status_code in self._throttle_statuses:
+                now = time.time()
+                # Requests already in flight will be throttled too; only slow down once a second for all of them.
+                if self._last_decrease is None or now - self._last_decrease >= 1:
+                    self._rate = max(self._min_rate, self._rate * self._decrease)
+                    self._tokens = min(self._tokens, 0.0)
+                    self._last_decrease = now
+
+            elif status_code < 400 and self._rate < self._max_rate:
+                self._rate = min(self._max_rate, self._rate + self._increase / self._rate)
+
+
+    def _refill(self):
+        '''Add tokens for the time that has passed (call while holding the lock).'''
+
+        now = time.time()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
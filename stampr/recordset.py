@@ -0,0 +1,332 @@
+'''Browse results stored a column at a time, for large numbers of records.
+
+A list of stampr.mailing.Mailing objects costs several hundred bytes per
+mailing. A record set keeps each field in its own column instead: ids in
+arrays of machine ints, and strings (statuses, addresses) interned, so that
+repeated values are only stored once. Objects are only created for the rows
+that are actually looked at.
+
+Example::
+
+    mailings = stampr.mailing.Mailing.browse_records(start, finish)
+
+    print(len(mailings), mailings.count_by_status())
+
+    for mailing in mailings.filter(status="error"):
+        print(mailing.id, mailing.address)
+'''
+
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import array
+
+from .pagination import iter_pages
+from .utilities import string
+
+
+class RecordSet(object):
+    '''Records from the server, stored a column at a time (see the subclasses).
+
+    Each subclass gives its COLUMNS, and _materialize(row), which creates the
+    object for a row (as returned by row()).
+
+    Int columns are kept in array.array (with None stored as 0, which is never a
+    valid id); all other columns are kept in lists, with each distinct string
+    stored once.
+
+    Args:
+        records (iterable of dict):
+            Records, as returned by the server [None, meaning start empty].
+    '''
+
+    # [(column name, record key, "int" or "object")]
+    COLUMNS = []
+
+    def __init__(self, records=None):
+        self._strings = {} # Interned strings (sys.intern() only takes bytes in Python 2).
+        self._columns = {}
+        for name, _, kind in self.COLUMNS:
+            self._columns[name] = array.array(str("l")) if kind == "int" else []
+
+        if records is not None:
+            self.extend(records)
+
+
+    @classmethod
+    def from_pages(cls, search, client=None, window=None):
+        '''Read every page of a search, only holding one page of records (as dicts) at a time.
+
+        Args:
+            search (tuple):
+                Path to search, without the page number (see stampr.pagination.iter_pages).
+            client (stampr.client.Client):
+                Client to use [stampr.client.Client.current].
+            window (int):
+                Pages to request at once [client.page_window].
+        '''
+
+        records = cls()
+        for page in iter_pages(search, client, window):
+            records.extend(page)
+
+        return records
+
+
+    @property
+    def columns(self):
+        '''Names of the columns [list of str]'''
+        return [name for name, _, _ in self.COLUMNS]
+
+
+    def column(self, name):
+        '''All the values in one column.
+
+        Returns:
+            array.array for int columns (None stored as 0), otherwise list (shared with the record set; don't change it)
+        '''
+
+        if name not in self._columns:
+            raise ValueError("no such column: %s" % name)
+
+        return self._columns[name]
+
+
+    def append(self, record):
+        '''Add a record (dict, as returned by the server).'''
+
+        for name, key, kind in self.COLUMNS:
+            value = record.get(key)
+
+            if kind == "int":
+                value = 0 if value is None else value
+            elif isinstance(value, string):
+                value = self._strings.setdefault(value, value)
+
+            self._columns[name].append(value)
+
+
+    def extend(self, records):
+        '''Add records (dicts, as returned by the server).'''
+
+        for record in records:
+            self.append(record)
+
+
+    def __len__(self):
+        return len(self._columns[self.COLUMNS[0][0]])
+
+
+    def __getitem__(self, index):
+        '''Object for one row or, for a slice, a record set of those rows.'''
+
+        if isinstance(index, slice):
+            return self.take(range(*index.indices(len(self))))
+
+        return self._materialize(self.row(index))
+
+
+    def __iter__(self):
+        '''Object for each row, created as it is reached.'''
+
+        for index in range(len(self)):
+            yield self._materialize(self.row(index))
+
+
+    def __repr__(self):
+        return "<%s rows=%d>" % (type(self).__name__, len(self))
+
+
+    def row(self, index):
+        '''Values in one row, by column name (without creating an object) [dict]'''
+
+        row = {}
+        for name, _, kind in self.COLUMNS:
+            value = self._columns[name][index]
+            row[name] = None if kind == "int" and value == 0 else value
+
+        return row
+
+
+    def take(self, indexes):
+        '''Record set of just some rows.
+
+        Args:
+            indexes (iterable of int):
+                Rows to keep, in the order to keep them.
+        '''
+
+        indexes = array.array(str("l"), indexes)
+        taken = type(self)()
+        taken._strings = self._strings
+
+        for name, column in self._columns.items():
+            selected = [column[i] for i in indexes]
+            if isinstance(column, array.array):
+                taken._columns[name] = array.array(column.typecode, selected)
+            else:
+                taken._columns[name] = selected
+
+        return taken
+
+
+    def filter(self, **conditions):
+        '''Record set of the rows whose columns have the given values.
+
+        Example::
+
+            errors = mailings.filter(status="error")
+            held = mailings.filter(status=["queued", "assigned"], batch_id=1234)
+
+        Args:
+            conditions:
+                Value each column must have (a list, tuple or set for any one of several).
+
+        Returns:
+            Record set of the same type.
+        '''
+
+        indexes = range(len(self))
+
+        for name, wanted in conditions.items():
+            column = self.column(name)
+
+            if isinstance(wanted, (list, tuple, set, frozenset)):
+                wanted = set(wanted)
+                indexes = [i for i in indexes if column[i] in wanted]
+            else:
+                indexes = [i for i in indexes if column[i] == wanted]
+
+        return self.take(indexes)
+
+
+    def count_by(self, name):
+        '''Number of rows with each value of a column [dict]'''
+
+        counts = {}
+        for value in self.column(name):
+            counts[value] = counts.get(value, 0) + 1
+
+        return counts
+
+
+    def to_numpy(self):
+        '''Columns as NumPy arrays (int columns as int64; others as object arrays).
+
+        Requires NumPy.
+
+        Returns:
+            dict of numpy.ndarray, by column name
+        '''
+
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("to_numpy requires numpy. Install it with: pip install numpy")
+
+        columns = {}
+        for name, _, kind in self.COLUMNS:
+            column = self._columns[name]
+            if kind == "int":
+                columns[name] = numpy.array(column, dtype=numpy.int64)
+            else:
+                columns[name] = numpy.array(column, dtype=object)
+
+        return columns
+
+
+    def to_arrow(self):
+        '''Columns as a PyArrow table (None for missing values, including ids stored as 0).
+
+        Requires PyArrow.
+
+        Returns:
+            pyarrow.Table
+        '''
+
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError("to_arrow requires pyarrow. Install it with: pip install pyarrow")
+
+        columns = {}
+        for name, _, kind in self.COLUMNS:
+            column = self._columns[name]
+            if kind == "int":
+                columns[name] = pyarrow.array([None if value == 0 else value for value in column],
+                                              type=pyarrow.int64())
+            else:
+                columns[name] = pyarrow.array(column)
+
+        return pyarrow.table(columns)
+
+
+class MailingRecordSet(RecordSet):
+    '''Mailings, stored a column at a time (see stampr.mailing.Mailing.browse_records).
+
+    The mailings' data isn't kept; get a mailing with stampr.mailing.Mailing[id] for that.
+    '''
+
+    COLUMNS = [
+        ("mailing_id", "mailing_id", "int"),
+        ("batch_id", "batch_id", "int"),
+        ("user_id", "user_id", "int"),
+        ("version", "version", "int"),
+        ("status", "status", "object"),
+        ("format", "format", "object"),
+        ("address", "address", "object"),
+        ("return_address", "returnaddress", "object"),
+        ("md5", "md5", "object"),
+    ]
+
+    def count_by_status(self):
+        '''Number of mailings with each status [dict]'''
+        return self.count_by("status")
+
+
+    def _materialize(self, row):
+        from .mailing import Mailing
+
+        return Mailing(**row)
+
+
+class BatchRecordSet(RecordSet):
+    '''Batches, stored a column at a time (see stampr.batch.Batch.browse_records).'''
+
+    COLUMNS = [
+        ("batch_id", "batch_id", "int"),
+        ("config_id", "config_id", "int"),
+        ("user_id", "user_id", "int"),
+        ("version", "version", "int"),
+        ("status", "status", "object"),
+        ("template", "template", "object"),
+    ]
+
+    def count_by_status(self):
+        '''Number of batches with each status [dict]'''
+        return self.count_by("status")
+
+
+    def _materialize(self, row):
+        from .batch import Batch
+
+        return Batch(**row)
+
+
+class ConfigRecordSet(RecordSet):
+    '''Configs, stored a column at a time (see stampr.config.Config.all_records).'''
+
+    COLUMNS = [
+        ("config_id", "config_id", "int"),
+        ("user_id", "user_id", "int"),
+        ("version", "version", "int"),
+        ("size", "size", "object"),
+        ("turnaround", "turnaround", "object"),
+        ("style", "style", "object"),
+        ("output", "output", "object"),
+        ("return_envelope", "returnenvelope", "object"),
+    ]
+
+    def _materialize(self, row):
+        from .config import Config
+
+        return Config(**row)
@@ -0,0 +1,163 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import json
+import os
+import threading
+
+from .pagination import iter_records
+
+
+class ConfigRegistry(object):
+    '''Ids of the configs in an account, by their settings, so each distinct config is only created once.
+
+    Configs are identified by (size, turnaround, style, output, return_envelope).
+    The first time a config is needed that isn't known, every config in the
+    account is fetched (Config.all) to look for it; after that, the only
+    requests made are to create configs that don't exist yet. Configs can't be
+    deleted, so known ids never go stale.
+
+    A registry can be shared by several clients (even for different accounts)
+    and threads.
+
+    Example::
+
+        registry = stampr.registry.ConfigRegistry(path="~/.stampr/configs.json")
+        stampr.authenticate("user", "pass", config_registry=registry)
+
+    Args:
+        path (str):
+            File to keep the ids in between runs [None, meaning only keep them in memory].
+        seed (bool):
+            Fetch all the configs in the account the first time one isn't known [True].
+    '''
+
+    def __init__(self, path=None, seed=True):
+        self._path = os.path.expanduser(path) if path is not None else None
+        self._seed = seed
+        self._ids = {} # {account: {settings: config_id}}
+        self._seeded = set()
+        self._lock = threading.RLock()
+
+        if self._path is not None and os.path.exists(self._path):
+            self._load()
+
+
+    @property
+    def path(self):
+        '''File the ids are kept in [str, None]'''
+        return self._path
+
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(ids) for ids in self._ids.values())
+
+
+    def get_id(self, config, client, create):
+        '''Get the id of a config with the same settings, creating one if there is none.
+
+        Args:
+            config (stampr.config.Config):
+                Config to find.
+            client (stampr.client.Client):
+                Client for the account to look in.
+            create (callable):
+                Called with no arguments to create the config on the server, returning its id.
+
+        Returns:
+            int
+        '''
+
+        key = _settings(config.size, config.turnaround, config.style, config.output, config.return_envelope)
+
+        # Held while creating, so that threads needing the same config don't each create one.
+        with self._lock:
+            ids = self._ids.setdefault(_account(client), {})
+
+            if key not in ids and self._seed and _account(client) not in self._seeded:
+                self._seed_from(client)
+
+            if key not in ids:
+                ids[key] = create()
+                self._save()
+
+            return ids[key]
+
+
+    def add(self, client, record):
+        '''Record a config returned by the server, unless one with the same settings is already known.'''
+
+        key = _settings(record["size"], record["turnaround"], record["style"], record["output"],
+                        record["returnenvelope"])
+
+        with self._lock:
+            self._ids.setdefault(_account(client), {}).setdefault(key, record["config_id"])
+
+
+    def clear(self):
+        '''Forget all known ids (including those on disk).'''
+
+        with self._lock:
+            self._ids.clear()
+            self._seeded.clear()
+            self._save()
+
+
+    def _seed_from(self, client):
+        for record in iter_records(("configs", "browse", "all"), client):
+            self.add(client, record)
+
+        self._seeded.add(_account(client))
+        self._save()
+
+
+    def _load(self):
+        with open(self._path) as f:
+            data = json.load(f)
+
+        for entry in data:
+            account = (entry["base_uri"], entry["username"])
+            key = _settings(*entry["settings"])
+            self._ids.setdefault(account, {})[key] = entry["config_id"]
+
+
+    def _save(self):
+        if self._path is None:
+            return
+
+        data = [{ "base_uri": account[0], "username": account[1], "settings": list(key), "config_id": config_id }
+                for account, ids in sorted(self._ids.items())
+                for key, config_id in sorted(ids.items())]
+
+        directory = os.path.dirname(self._path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # Written to a temporary file and renamed, so the file is never left half-written.
+        temporary = self._path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(data, f, indent=2)
+        _replace(temporary, self._path)
+
+
+def _account(client):
+    return (client.base_uri, client.username)
+
+
+def _settings(size, turnaround, style, output, return_envelope):
+    '''Key for a config's settings (return_envelope may be a bool, or a string from a form).'''
+
+    if not isinstance(return_envelope, bool):
+        return_envelope = str(return_envelope).lower() in ("true", "1")
+
+    return (size, turnaround, style, output, return_envelope)
+
+
+def _replace(source, destination):
+    if hasattr(os, "replace"):
+        os.replace(source, destination)
+    else:
+        # Python 2 can't rename over an existing file on Windows.
+        if os.path.exists(destination):
+            os.remove(destination)
+        os.rename(source, destination)
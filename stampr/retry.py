@@ -0,0 +1,129 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import random
+import time
+
+
+class RetryPolicy(object):
+    '''Policy for retrying failed requests, used by stampr.client.Client.
+
+    Delays grow exponentially (backoff * 2 ** attempt), capped at max_backoff,
+    with "full jitter" (a random delay between 0 and that value) so that many
+    clients don't retry in lock-step. A Retry-After header sent by the server
+    always takes priority over the calculated delay.
+
+    Only requests that are safe to repeat are retried: those using the given
+    methods, and POSTs that carry an idempotency key.
+
+    Example::
+
+        policy = stampr.retry.RetryPolicy(total=5, statuses=[429, "5xx"])
+        stampr.authenticate("user", "pass", retry=policy)
+
+    Args:
+        total (int):
+            Maximum number of retries for each request (0 disables retrying) [3].
+        backoff (float):
+            Delay before the first retry, in seconds [0.5].
+        max_backoff (float):
+            Maximum delay between retries, in seconds [30].
+        jitter (bool):
+            Randomize delays [True].
+        statuses (list):
+            Status codes (e.g. 503) or classes (e.g. "5xx") to retry [408, 429, 500, 502, 503, 504].
+        methods (list):
+            HTTP methods that are always safe to retry ["get", "delete"].
+        respect_retry_after (bool):
+            Wait as long as the server asks in Retry-After headers [True].
+    '''
+
+    STATUSES = [408, 429, 500, 502, 503, 504]
+    METHODS = ["get", "delete"]
+
+    def __init__(self, total=3, backoff=0.5, max_backoff=30, jitter=True, statuses=None, methods=None,
+                 respect_retry_after=True):
+        if not isinstance(total, int) or total < 0:
+            raise ValueError("total must be a non-negative int")
+        if backoff < 0:
+            raise ValueError("backoff must not be negative")
+        if max_backoff < backoff:
+            raise ValueError("max_backoff must be at least backoff")
+
+        self._total = total
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._jitter = jitter
+        self._respect_retry_after = respect_retry_after
+        self._methods = [m.lower() for m in (methods if methods is not None else self.METHODS)]
+
+        self._statuses, self._status_classes = set(), set()
+        for status in (statuses if statuses is not None else self.STATUSES):
+            if isinstance(status, int):
+                self._statuses.add(status)
+            elif len(status) == 3 and status[0].isdigit() and status[1:].lower() == "xx":
+                self._status_classes.add(int(status[0]))
+            else:
+                raise ValueError("statuses must be status codes (503) or classes (\"5xx\")")
+
+
+    @property
+    def total(self):
+        '''Maximum number of retries for each request [int]'''
+        return self._total
+
+
+    def can_retry(self, action, idempotent=False):
+        '''Is a request with this HTTP method safe to retry? [bool]'''
+
+        return self._total > 0 and (idempotent or action.lower() in self._methods)
+
+
+    def is_retryable_status(self, status_code):
+        '''Should a response with this status code be retried? [bool]'''
+
+        return status_code in self._statuses or status_code // 100 in self._status_classes
+
+
+    def delay(self, attempt, retry_after=None):
+        '''Seconds to wait before making a retry.
+
+        Args:
+            attempt (int):
+                Number of retries already made for the request.
+            retry_after (str):
+                Value of the Retry-After header, if any.
+
+        Returns:
+            [float]
+        '''
+
+        if self._respect_retry_after and retry_after is not None:
+            seconds = parse_retry_after(retry_after)
+            if seconds is not None:
+                return seconds
+
+        delay = min(self._max_backoff, self._backoff * 2 ** attempt)
+
+        if self._jitter:
+            delay = random.uniform(0, delay)
+
+        return delay
+
+
+def parse_retry_after(value):
+    '''Seconds to wait from a Retry-After header (either seconds or a HTTP date), or None if it can't be parsed.'''
+
+    value = value.strip()
+
+    if value.isdigit():
+        return float(value)
+
+    # Only needed for HTTP dates, which are rare, and email.utils is slow to import.
+    import calendar
+    import email.utils
+
+    date = email.utils.parsedate_tz(value)
+    if date is None:
+        return None
+
+    return max(0.0, calendar.timegm(date[:9]) - (date[9] or 0) - time.time())
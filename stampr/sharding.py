@@ -0,0 +1,296 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import datetime
+import threading
+
+from .client import Client
+
+
+def iter_sharded_records(search, start, finish, id_key, client=None, concurrency=8, shards=None, ordered=True,
+                         min_span=60):
+    '''Get each record from a search over a period, by browsing parts of the period in parallel.
+
+    The period is split into shards windows, which are browsed at once (each
+    in its own thread, a page at a time). If a window turns out to have more
+    than one page of records while there are threads with nothing to do, it
+    is split in half and each half browsed instead (the two pages already
+    read are requested again), so busy parts of the period end up in smaller
+    windows than quiet ones.
+
+    Each page is returned as soon as it can be. A window that is browsed
+    before its records can be returned (with ordered, one whose earlier
+    windows aren't yet returned) only reads a few pages ahead, then waits,
+    so at most about 3 * concurrency pages of records are held at once.
+    Records on the boundary between two windows are only returned once; to
+    check, the ids (not the records) in a window are kept until the windows
+    either side of it have been returned (with ordered, that is the ids of
+    two windows; otherwise, up to those of every window).
+
+    Example::
+
+        search = ("mailings", "with", "error")
+        for record in stampr.sharding.iter_sharded_records(search, start, finish, "mailing_id", concurrency=16):
+            print(record["mailing_id"])
+
+    Args:
+        search (tuple):
+            Path to search, without the times or page number.
+        start (datetime.datetime):
+            Start of the period.
+        finish (datetime.datetime):
+            End of the period.
+        id_key (str):
+            Key of the id in each record (e.g. "mailing_id"), used to leave out duplicates.
+        client (stampr.client.Client):
+            Client to use [stampr.client.Client.current].
+        concurrency (int):
+            Number of windows to browse at once [8].
+        shards (int):
+            Number of windows to split the period into to begin with [concurrency].
+        ordered (bool):
+            Return records window by window, earliest first (later windows waiting, a few pages ahead), rather
+            than as soon as each page arrives [True].
+        min_span (float):
+            Seconds below which windows are not split [60].
+
+    Returns:
+        generator of records (dict)
+    '''
+
+    if not isinstance(search, tuple):
+        raise TypeError("search must be a tuple")
+    if not isinstance(start, datetime.datetime):
+        raise TypeError("start should be a datetime.datetime")
+    if not isinstance(finish, datetime.datetime):
+        raise TypeError("finish should be a datetime.datetime")
+    if not isinstance(concurrency, int) or concurrency <= 0:
+        raise ValueError("concurrency must be a positive int")
+    if shards is not None and (not isinstance(shards, int) or shards <= 0):
+        raise ValueError("shards must be a positive int")
+    if not isinstance(min_span, (int, float)) or min_span <= 0:
+        raise ValueError("min_span must be a positive number")
+
+    browse = _ShardedBrowse(search, id_key, client if client is not None else Client.current, concurrency,
+                            datetime.timedelta(seconds=min_span))
+
+    return browse.run(start, finish, shards if shards is not None else concurrency, ordered)
+
+
+class _ShardedBrowse(object):
+    '''Browses windows of a period for iter_sharded_records().'''
+
+    # Pages of a window that can be waiting to be returned, after which its thread waits before reading more.
+    PAGES_AHEAD = 2
+
+    def __init__(self, search, id_key, client, concurrency, min_span):
+        self.search = search
+        self.id_key = id_key
+        self.client = client
+        self.concurrency = concurrency
+        self.min_span = min_span
+        self.outstanding = 0 # Windows being browsed, or waiting to be.
+        self.kept = {} # {(start, finish): _Window} for windows being returned, or returned but not both neighbours.
+        self.period = None
+        self.events = [] # [(kind, window, value)] from the threads browsing.
+        self.changed = threading.Condition()
+        self.stopped = False
+
+
+    def run(self, start, finish, shards, ordered):
+        import concurrent.futures
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency)
+        windows = [_Window(*window) for window in _split(start, finish, shards)] # Not yet returned, in time order.
+        running = 0
+        self.period = (start, finish)
+
+        try:
+            while windows:
+                # Started earliest first, so the next window to return (with ordered) always has a thread.
+                for window in windows:
+                    if running == self.concurrency:
+                        break
+                    if not window.started:
+                        window.started = True
+                        running += 1
+                        executor.submit(self.browse, window)
+
+                self.outstanding = sum(1 for window in windows if not window.browsed)
+
+                with self.changed:
+                    while not self.events:
+                        self.changed.wait()
+                    events, self.events = self.events, []
+
+                for kind, window, value in events:
+                    if kind == "error":
+                        raise value
+                    elif kind == "split":
+                        running -= 1
+                        index = windows.index(window)
+                        windows[index:index + 1] = [_Window(*half) for half in value]
+                    elif kind == "page":
+                        window.pages.append(value)
+                    else:
+                        running -= 1
+                        window.browsed = True
+
+                for window in list(windows):
+                    if ordered and window is not windows[0]:
+                        break # Its pages wait (at most PAGES_AHEAD of them) until the windows before are returned.
+
+                    while window.pages:
+                        for record in self._unseen(window, window.pages[0]):
+                            yield record
+                        window.pages.pop(0)
+                        window.ahead.release()
+
+                    if window.browsed:
+                        self._returned(window)
+                        windows.remove(window)
+
+        finally:
+            # Windows still being browsed are abandoned, not waited for.
+            self.stopped = True
+            for window in windows:
+                for _ in range(self.PAGES_AHEAD):
+                    window.ahead.release()
+            executor.shutdown(wait=False)
+
+
+    def browse(self, window):
+        '''Read each page of a window (in its own thread), passing them back as events.'''
+
+        try:
+            self._browse(window)
+        except Exception as ex:
+            self._event("error", window, ex)
+
+
+    def _browse(self, window):
+        path = self.search + (window.start.isoformat(), window.finish.isoformat())
+        held = [] # Pages read before deciding whether to split the window.
+        i = 0
+
+        while not self.stopped:
+            page = self.client.get(path + (i, ))
+
+            if not page:
+                break
+
+            held.append(page)
+            i += 1
+
+            if i == 1:
+                continue
+
+            # Only split once the window is known to have several pages, and only if another thread could take half.
+            if i == 2 and self.outstanding < self.concurrency and window.finish - window.start >= self.min_span * 2:
+                middle = window.start + (window.finish - window.start) // 2
+                self._event("split", window, [(window.start, middle), (middle, window.finish)])
+                return
+
+            for page in held:
+                window.ahead.acquire()
+                if self.stopped:
+                    return
+                self._event("page", window, page)
+            held = []
+
+        for page in held:
+            self._event("page", window, page) # A single page, so never more than PAGES_AHEAD.
+
+        self._event("done", window, None)
+
+
+    def _event(self, kind, window, value):
+        with self.changed:
+            self.events.append((kind, window, value))
+            self.changed.notify()
+
+
+    def _unseen(self, window, records):
+        '''Records from a page of a window, leaving out any already returned (from it or a neighbouring window).'''
+
+        self.kept[window.span] = window
+
+        others = []
+        for neighbour in [self._neighbour(window, "left"), self._neighbour(window, "right")]:
+            if neighbour is not None:
+                others.append(neighbour.ids)
+
+        for record in records:
+            id = record[self.id_key]
+            if id not in window.ids and not any(id in ids for ids in others):
+                yield record
+            window.ids.add(id)
+
+
+    def _returned(self, window):
+        '''Record that every page of a window has been returned, forgetting ids that are no longer needed.'''
+
+        window.returned = True
+        self.kept[window.span] = window
+
+        # A window's ids are only needed until the windows either side of it have been returned.
+        left = self._neighbour(window, "left")
+        right = self._neighbour(window, "right")
+
+        window.left_open = window.start != self.period[0] and not (left is not None and left.returned)
+        window.right_open = window.finish != self.period[1] and not (right is not None and right.returned)
+
+        if left is not None and left.returned:
+            left.right_open = False
+            self._forget(left)
+        if right is not None and right.returned:
+            right.left_open = False
+            self._forget(right)
+        self._forget(window)
+
+
+    def _neighbour(self, window, side):
+        '''Window (whose ids are kept) next to a window, on its "left" or "right", if there is one.'''
+
+        for other in self.kept.values():
+            if other is window:
+                continue
+            if (other.finish == window.start) if side == "left" else (other.start == window.finish):
+                return other
+
+        return None
+
+
+    def _forget(self, window):
+        if window.returned and not window.left_open and not window.right_open:
+            del self.kept[window.span]
+
+
+class _Window(object):
+    '''Part of the period being browsed.'''
+
+    def __init__(self, start, finish):
+        self.start = start
+        self.finish = finish
+        self.started = False
+        self.browsed = False # Every page has been read.
+        self.returned = False # Every page has been returned.
+        self.pages = [] # Read, but not yet returned.
+        self.ahead = threading.Semaphore(_ShardedBrowse.PAGES_AHEAD)
+        self.ids = set()
+        self.left_open = self.right_open = True
+
+    @property
+    def span(self):
+        return (self.start, self.finish)
+
+
+def _split(start, finish, count):
+    '''count windows covering start to finish, each starting where the last finished.'''
+
+    step = (finish - start) // count
+    if not step:
+        return [(start, finish)]
+
+    times = [start + step * i for i in range(count)] + [finish]
+
+    return list(zip(times[:-1], times[1:]))
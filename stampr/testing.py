@@ -0,0 +1,545 @@
+'''In-process fake of the Stampr API, for integration, load and stress testing.
+
+The server runs on localhost in a background thread and keeps all of its
+state in memory, so the whole client (connection pooling, retries, rate
+limiting, pagination, concurrency) can be exercised without a network.
+
+Example::
+
+    from stampr.testing import FakeServer
+
+    with FakeServer(latency=0.02, error_rate=0.01) as server:
+        client = server.client()
+
+        config = stampr.config.Config()
+        with stampr.batch.Batch(config=config) as batch:
+            ...
+
+        print(server.request_counts, server.connection_count)
+'''
+
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import base64
+import datetime
+import json
+import random
+import socket
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, unquote
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs
+    from urllib import unquote
+
+from .exceptions import APIError
+
+
+class FakeServer(object):
+    '''Fake Stampr API server, listening on localhost.
+
+    Mailings, batches and configs are created, browsed, updated and deleted
+    just as on the real server. Browse routes are paginated: page N holds
+    records N * page_size to (N + 1) * page_size, ordered by id, and the page
+    after the last one is empty.
+
+    Args:
+        username (str):
+            Username accepted by the server ["user"].
+        password (str):
+            Password accepted by the server ["pass"].
+        page_size (int):
+            Number of records in each page of a browse [100].
+        latency (float, tuple):
+            Seconds to wait before each response, or a (min, max) range to pick from [0].
+        error_rate (float):
+            Fraction of requests, chosen at random, to fail with error_status [0].
+        error_status (int):
+            Status of failed requests [503].
+        retry_after (int):
+            Value of Retry-After header sent with failed requests [None].
+        seed:
+            Seed for random latency and errors [None].
+        port (int):
+            Port to listen on [0, meaning any free port].
+    '''
+
+    def __init__(self, username="user", password="pass", page_size=100, latency=0, error_rate=0, error_status=503,
+                 retry_after=None, seed=None, port=0):
+        if not isinstance(page_size, int) or page_size <= 0:
+            raise ValueError("page_size must be a positive int")
+        if not 0 <= error_rate <= 1:
+            raise ValueError("error_rate must be between 0 and 1")
+
+        self.username, self.password = username, password
+        self.page_size = page_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+
+        self._port = port
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._httpd = None
+        self._thread = None
+
+        self.reset()
+
+
+    def reset(self):
+        '''Forget all records and statistics.'''
+
+        with self._lock:
+            self.configs, self.batches, self.mailings = {}, {}, {}
+            self._next_id = { "config": 1, "batch": 1, "mailing": 1 }
+            self._idempotent = {}
+            self._failures = []
+            self._queries = {}
+
+            self.request_counts = {}
+            self.connection_count = 0
+
+
+    @property
+    def base_uri(self):
+        '''URI of the API, to pass to stampr.client.Client [str]'''
+
+        if self._httpd is None:
+            raise APIError("FakeServer not started")
+
+        return "http://127.0.0.1:%d/api/" % self._httpd.server_address[1]
+
+
+    def start(self):
+        '''Start listening, in a background thread.'''
+
+        if self._httpd is not None:
+            return
+
+        self._httpd = _HTTPServer(("127.0.0.1", self._port), _Handler)
+        self._httpd.fake = self
+
+        self._thread = threading.Thread(target=self._httpd.serve_forever, kwargs={ "poll_interval": 0.05 })
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    def stop(self):
+        '''Stop listening.'''
+
+        if self._httpd is not None:
+            httpd, self._httpd = self._httpd, None
+            httpd.shutdown()
+            httpd.server_close()
+            self._thread.join()
+
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+    def client(self, **options):
+        '''Create a stampr.client.Client connected to this server (and make it the current client).
+
+        Args:
+            options:
+                Options passed to stampr.client.Client.
+
+        Returns:
+            [stampr.client.Client]
+        '''
+
+        from .client import Client
+
+        return Client(self.username, self.password, base_uri=self.base_uri, **options)
+
+
+    def fail_next(self, count=1, status=None, retry_after=None):
+        '''Fail the next count requests, whatever the error_rate.
+
+        Args:
+            count (int):
+                Number of requests to fail.
+            status (int):
+                Status to respond with [error_status].
+            retry_after (int):
+                Value of Retry-After header [retry_after].
+        '''
+
+        with self._lock:
+            self._failures.extend([(status or self.error_status, retry_after or self.retry_after)] * count)
+
+
+    def set_status(self, mailing_ids, status):
+        '''Change the status of mailings, as if they had been processed.
+
+        Args:
+            mailing_ids (list of int):
+                Mailings to update.
+            status (str):
+                New status.
+        '''
+
+        with self._lock:
+            for id in mailing_ids:
+                self.mailings[id]["status"] = status
+
+            self._changed()
+
+
+    def _count(self, method, route):
+        with self._lock:
+            key = "%s %s" % (method, route)
+            self.request_counts[key] = self.request_counts.get(key, 0) + 1
+
+
+    def _failure(self):
+        '''(status, retry_after) if this request should fail, else None'''
+
+        with self._lock:
+            if self._failures:
+                return self._failures.pop(0)
+            elif self.error_rate and self._random.random() < self.error_rate:
+                return self.error_status, self.retry_after
+            else:
+                return None
+
+
+    def _delay(self):
+        if isinstance(self.latency, tuple):
+            with self._lock:
+                delay = self._random.uniform(*self.latency)
+        else:
+            delay = self.latency
+
+        if delay > 0:
+            time.sleep(delay)
+
+
+    def _create(self, kind, table, record):
+        with self._lock:
+            id = self._next_id[kind]
+            self._next_id[kind] += 1
+
+            record["%s_id" % kind] = id
+            record["user_id"] = 1
+            record["version"] = 1
+            record["created"] = datetime.datetime.utcnow()
+            table[id] = record
+            self._changed()
+
+            return record
+
+
+    def _page(self, path, page, select):
+        '''Page of the records chosen by select().
+
+        The records chosen are cached (by path) until any record changes, so paging through a large result is cheap.
+        Records are in id order, since they are stored in the order they were created.
+        '''
+
+        query = tuple(path)
+        if query not in self._queries:
+            self._queries[query] = select()
+
+        return self._queries[query][page * self.page_size:(page + 1) * self.page_size]
+
+
+    def _changed(self):
+        self._queries.clear()
+
+
+    def _in_period(self, records, start, finish):
+        start, finish = _parse_time(start), _parse_time(finish)
+        return [r for r in records if start <= r["created"] <= finish]
+
+
+    def handle(self, method, path, params):
+        '''Respond to a request, returning (status, result).
+
+        Args:
+            method (str):
+                "GET", "POST" or "DELETE"
+            path (list of str):
+                Path below the API root, e.g. ["mailings", "12"].
+            params (dict):
+                Form parameters.
+        '''
+
+        with self._lock:
+            try:
+                return self._route(method, path, params)
+            except (KeyError, IndexError, ValueError) as ex:
+                return 400, { "error": "bad request: %s" % ex }
+
+
+    def _route(self, method, path, params):
+        route = path[0] if path else ""
+
+        if method == "GET" and path == ["test", "ping"]:
+            self._count(method, "test/ping")
+            return 200, { "pong": datetime.datetime.utcnow().isoformat() + "+00:00" }
+
+        elif route == "configs":
+            return self._configs(method, path[1:], params)
+
+        elif route == "batches":
+            return self._batches(method, path[1:], params)
+
+        elif route == "mailings":
+            return self._mailings(method, path[1:], params)
+
+        return 404, { "error": "no such route" }
+
+
+    def _configs(self, method, path, params):
+        if method == "POST" and not path:
+            self._count(method, "configs")
+            config = self._create("config", self.configs, {
+                "size": params["size"],
+                "turnaround": params["turnaround"],
+                "style": params["style"],
+                "output": params["output"],
+                "returnenvelope": params.get("returnenvelope") == "True",
+            })
+            return 200, _public(config)
+
+        elif method == "GET" and path[:2] == ["browse", "all"] and len(path) == 3:
+            self._count(method, "configs/browse/all")
+            configs = self._page(("configs", ) + tuple(path[:2]), int(path[2]), lambda: list(self.configs.values()))
+            return 200, [_public(c) for c in configs]
+
+        elif method == "GET" and len(path) == 1:
+            self._count(method, "configs/:id")
+            config = self.configs.get(int(path[0]))
+            return 200, [_public(config)] if config else []
+
+        return 404, { "error": "no such route" }
+
+
+    def _batches(self, method, path, params):
+        if method == "POST" and not path:
+            self._count(method, "batches")
+            config_id = int(params["config_id"])
+            if config_id not in self.configs:
+                return 400, { "error": "no such config" }
+
+            batch = self._create("batch", self.batches, {
+                "config_id": config_id,
+                "status": params.get("status", "processing"),
+                "template": params.get("template"),
+            })
+            return 200, _public(batch)
+
+        elif method == "GET" and len(path) == 4 and path[0] == "browse":
+            # batches/browse/<start>/<finish>/<page>
+            self._count(method, "batches/browse")
+            batches = self._page(("batches", ) + tuple(path[:-1]), int(path[3]),
+                                 lambda: self._in_period(self.batches.values(), path[1], path[2]))
+            return 200, [_public(b) for b in batches]
+
+        elif method == "GET" and len(path) == 5 and path[0] == "with":
+            # batches/with/<status>/<start>/<finish>/<page>
+            self._count(method, "batches/with")
+            batches = self._page(("batches", ) + tuple(path[:-1]), int(path[4]),
+                                 lambda: [b for b in self._in_period(self.batches.values(), path[2], path[3]) if b["status"] == path[1]])
+            return 200, [_public(b) for b in batches]
+
+        elif method == "GET" and len(path) >= 5 and path[1] in ["browse", "with"]:
+            # batches/<id>/browse/<start>/<finish>/<page> or batches/<id>/with/<status>/<start>/<finish>/<page>
+            self._count(method, "batches/:id/%s" % path[1])
+            batch_id = int(path[0])
+            status = path[2] if path[1] == "with" else None
+
+            def select():
+                return [m for m in self._in_period(self.mailings.values(), path[-3], path[-2])
+                        if m["batch_id"] == batch_id and status in (None, m["status"])]
+
+            mailings = self._page(("batches", ) + tuple(path[:-1]), int(path[-1]), select)
+            return 200, [_public(m, data=False) for m in mailings]
+
+        elif len(path) == 1:
+            batch_id = int(path[0])
+            batch = self.batches.get(batch_id)
+
+            if method == "GET":
+                self._count(method, "batches/:id")
+                return 200, [_public(batch)] if batch else []
+
+            elif method == "POST":
+                self._count(method, "batches/:id")
+                if batch is None:
+                    return 404, { "error": "no such batch" }
+                batch["status"] = params["status"]
+                self._changed()
+                return 200, _public(batch)
+
+            elif method == "DELETE":
+                self._count(method, "batches/:id")
+                if batch is None:
+                    return 404, { "error": "no such batch" }
+                if any(m["batch_id"] == batch_id for m in self.mailings.values()):
+                    return 400, { "error": "batch contains mailings" }
+                del self.batches[batch_id]
+                self._changed()
+                return 200, True
+
+        return 404, { "error": "no such route" }
+
+
+    def _mailings(self, method, path, params):
+        if method == "POST" and not path:
+            self._count(method, "mailings")
+            batch_id = int(params["batch_id"])
+            if batch_id not in self.batches:
+                return 400, { "error": "no such batch" }
+
+            mailing = self._create("mailing", self.mailings, {
+                "batch_id": batch_id,
+                "address": params["address"],
+                "returnaddress": params["returnaddress"],
+                "format": params["format"],
+                "data": params.get("data"),
+                "status": "received",
+            })
+            return 200, _public(mailing, data=False)
+
+        elif method == "GET" and len(path) >= 4 and path[0] in ["browse", "with"]:
+            # mailings/browse/<start>/<finish>/<page> or mailings/with/<status>/<start>/<finish>/<page>
+            self._count(method, "mailings/%s" % path[0])
+            status = path[1] if path[0] == "with" else None
+
+            def select():
+                return [m for m in self._in_period(self.mailings.values(), path[-3], path[-2])
+                        if status in (None, m["status"])]
+
+            mailings = self._page(("mailings", ) + tuple(path[:-1]), int(path[-1]), select)
+            return 200, [_public(m, data=False) for m in mailings]
+
+        elif len(path) == 1:
+            mailing_id = int(path[0])
+            mailing = self.mailings.get(mailing_id)
+
+            if method == "GET":
+                self._count(method, "mailings/:id")
+                return 200, [_public(mailing)] if mailing else []
+
+            elif method == "DELETE":
+                self._count(method, "mailings/:id")
+                if mailing is None:
+                    return 404, { "error": "no such mailing" }
+                del self.mailings[mailing_id]
+                self._changed()
+                return 200, True
+
+        return 404, { "error": "no such route" }
+
+
+def _public(record, data=True):
+    '''Copy of a record, as the server would send it.'''
+
+    record = dict(record)
+    del record["created"]
+
+    if not data:
+        record.pop("data", None)
+
+    return record
+
+
+def _parse_time(value):
+    '''Parse an isoformat() time, as naive UTC.'''
+
+    import dateutil.parser
+    import dateutil.tz
+
+    time = dateutil.parser.parse(value)
+    if time.tzinfo is not None:
+        time = time.astimezone(dateutil.tz.tzutc()).replace(tzinfo=None)
+
+    return time
+
+
+class _HTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Allows keep-alive.
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+
+        # Headers and body are written separately; don't let Nagle's algorithm hold back the body.
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        fake = self.server.fake
+        with fake._lock:
+            fake.connection_count += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._respond("GET")
+
+    def do_POST(self):
+        self._respond("POST")
+
+    def do_DELETE(self):
+        self._respond("DELETE")
+
+    def _respond(self, method):
+        fake = self.server.fake
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8") if length else ""
+        params = dict((k, v[0]) for k, v in parse_qs(body, keep_blank_values=True).items())
+
+        fake._delay()
+
+        auth = self.headers.get("Authorization") or ""
+        expected = "Basic " + base64.b64encode(("%s:%s" % (fake.username, fake.password)).encode("utf-8")).decode("ascii")
+        failure = fake._failure()
+
+        if auth != expected:
+            status, result, headers = 401, { "error": "not authorized" }, {}
+        elif failure is not None:
+            status, result = failure[0], { "error": "fake failure" }
+            headers = { "Retry-After": str(failure[1]) } if failure[1] is not None else {}
+        elif not self.path.startswith("/api/"):
+            status, result, headers = 404, { "error": "no such route" }, {}
+        else:
+            path = [unquote(dir) for dir in self.path[len("/api/"):].split("/")]
+            key = self.headers.get("Idempotency-Key")
+
+            with fake._lock:
+                if key is not None and key in fake._idempotent:
+                    status, result = fake._idempotent[key]
+                else:
+                    status, result = fake.handle(method, path, params)
+                    if key is not None and status == 200:
+                        fake._idempotent[key] = status, result
+            headers = {}
+
+        content = json.dumps(result).encode("utf-8")
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
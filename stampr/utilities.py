@@ -1,12 +1,18 @@
 from __future__ import absolute_import, unicode_literals, print_function, division
 
 import sys
+import base64
 
 if sys.version_info[0] >= 3:
     string = (str, bytes)
 else:
     string = basestring
 
+if hasattr(base64, "encodebytes"):
+    _encode_base64, _decode_base64 = base64.encodebytes, base64.decodebytes
+else:
+    _encode_base64, _decode_base64 = base64.encodestring, base64.decodestring
+
 
 def _bad_attribute(attribute, values):
     '''Error message when trying to set a attribute incorrectly'''
@@ -0,0 +1,359 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import datetime
+import threading
+import time
+
+from .client import Client
+from .pagination import iter_records
+
+
+class Transition(object):
+    '''A change in the status of a mailing, found by stampr.watcher.MailingWatcher.
+
+    Attributes:
+        mailing_id (int):
+            Mailing that changed.
+        batch_id (int):
+            Batch the mailing is in.
+        old_status (str):
+            Status before (None if it wasn't known).
+        new_status (str):
+            Status now.
+        time (float):
+            When the change was seen (as time.time()).
+    '''
+
+    __slots__ = ["mailing_id", "batch_id", "old_status", "new_status", "time"]
+
+    def __init__(self, mailing_id, batch_id, old_status, new_status, time):
+        self.mailing_id = mailing_id
+        self.batch_id = batch_id
+        self.old_status = old_status
+        self.new_status = new_status
+        self.time = time
+
+    def __repr__(self):
+        return "<Transition mailing=%d %s => %s>" % (self.mailing_id, self.old_status, self.new_status)
+
+
+class MailingWatcher(object):
+    '''Watches many mailings (or whole batches) for changes of status.
+
+    Rather than getting each mailing, the watcher browses the mailings with
+    each status that a watched mailing could still be in, short of finishing
+    (e.g. only "printed" once they have all been printed). Watched mailings
+    that have left those statuses, having been "shipped" or gone into
+    "error", are then got one by one and forgotten. The "shipped" and
+    "error" lists, which grow with the account's history, are never browsed,
+    so each poll costs a request per page of the account's mailings that
+    are still in progress, plus one for each watched mailing that finished
+    since the last poll. That doesn't grow with the number of mailings
+    finished in the period. Watched batches are browsed as a whole.
+
+    After a poll that finds changes, the interval before the next is halved
+    (down to min_interval); after one that doesn't, it grows by half (up to
+    max_interval).
+
+    Transitions are passed to callbacks (see add_callback), or can be
+    iterated over::
+
+        watcher = stampr.watcher.MailingWatcher(since=datetime.datetime(2013, 5, 1))
+        watcher.watch(mailings)
+
+        for transition in watcher:
+            print(transition.mailing_id, transition.new_status)
+
+    Args:
+        since (datetime.datetime):
+            Time before which none of the watched mailings were created.
+        client (stampr.client.Client):
+            Client to use [stampr.client.Client.current].
+        min_interval (float):
+            Fewest seconds between polls [5].
+        max_interval (float):
+            Most seconds between polls [300].
+        concurrency (int):
+            Number of finished mailings to get at once [8].
+    '''
+
+    # Order in which mailings are processed; "error" can follow any of these.
+    PROGRESS = ["received", "render", "queued", "assigned", "processing", "printed", "shipped"]
+    FINISHED = ["shipped", "error"]
+
+    def __init__(self, since, client=None, min_interval=5, max_interval=300, concurrency=8):
+        if not isinstance(since, datetime.datetime):
+            raise TypeError("since should be a datetime.datetime")
+        if not isinstance(min_interval, (int, float)) or min_interval <= 0:
+            raise ValueError("min_interval must be a positive number")
+        if not isinstance(max_interval, (int, float)) or max_interval < min_interval:
+            raise ValueError("max_interval must be a number no less than min_interval")
+        if not isinstance(concurrency, int) or concurrency <= 0:
+            raise ValueError("concurrency must be a positive int")
+
+        self._since = since
+        self._client = client
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._interval = min_interval
+        self._concurrency = concurrency
+
+        self._mailings = {} # {mailing_id: status}
+        self._counts = {} # {status: number of watched mailings with it}
+        self._batches = {} # {batch_id: {mailing_id: status}}
+        self._callbacks = []
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+
+    @property
+    def interval(self):
+        '''Seconds until the next poll [float]'''
+        return self._interval
+
+
+    def __len__(self):
+        '''Number of mailings being watched individually.'''
+        return len(self._mailings)
+
+
+    def watch(self, mailings):
+        '''Watch mailings for changes of status.
+
+        Args:
+            mailings (list of stampr.mailing.Mailing or int):
+                Mailings (which must have been mailed), or their ids (whose status is then not known).
+        '''
+
+        from .mailing import Mailing
+
+        watched = []
+        for mailing in mailings:
+            if isinstance(mailing, Mailing):
+                # Getting the id of a mailing that hasn't been mailed would mail it.
+                if not mailing.is_created():
+                    raise ValueError("can't watch() a mailing before it is mailed")
+                watched.append((mailing.id, mailing.status))
+            elif isinstance(mailing, int):
+                watched.append((mailing, None))
+            else:
+                raise TypeError("mailings must be stampr.mailing.Mailing or int")
+
+        with self._lock:
+            for mailing_id, status in watched:
+                if status in self.FINISHED:
+                    continue
+
+                self._forget(mailing_id)
+                self._mailings[mailing_id] = status
+                self._counts[status] = self._counts.get(status, 0) + 1
+
+
+    def watch_batch(self, batch):
+        '''Watch every mailing in a batch, including those added later.
+
+        Args:
+            batch (stampr.batch.Batch, int):
+                Batch, or its id.
+        '''
+
+        from .batch import Batch
+
+        if isinstance(batch, Batch):
+            batch = batch.id
+        elif not isinstance(batch, int):
+            raise TypeError("batch must be a stampr.batch.Batch or int")
+
+        with self._lock:
+            self._batches.setdefault(batch, {})
+
+
+    def add_callback(self, callback):
+        '''Call callback with each stampr.watcher.Transition found.'''
+
+        if not callable(callback):
+            raise TypeError("callback must be callable")
+
+        self._callbacks = self._callbacks + [callback]
+
+
+    def remove_callback(self, callback):
+        '''Remove a callback added with add_callback().'''
+
+        self._callbacks = [c for c in self._callbacks if c != callback]
+
+
+    def poll(self):
+        '''Check for changes of status once, calling the callbacks with each one.
+
+        Returns:
+            list of stampr.watcher.Transition
+        '''
+
+        client = self._client if self._client is not None else Client.current
+        period = (self._since.isoformat(), (datetime.datetime.utcnow() + datetime.timedelta(days=1)).isoformat())
+        transitions = []
+
+        seen = set()
+        for status in self._statuses_to_poll():
+            for record in iter_records(("mailings", "with", status) + period, client):
+                seen.add(record["mailing_id"])
+                transition = self._update(record)
+                if transition is not None:
+                    transitions.append(transition)
+
+        # Finished (or moved on between browsing one status and the next), so get each one.
+        with self._lock:
+            moved = [mailing_id for mailing_id in self._mailings if mailing_id not in seen]
+
+        transitions.extend(self._get_each(client, moved))
+
+        for batch_id in list(self._batches):
+            for record in iter_records(("batches", batch_id, "browse") + period, client):
+                transition = self._update_batch(batch_id, record)
+                if transition is not None:
+                    transitions.append(transition)
+
+        if transitions:
+            self._interval = max(self._min_interval, self._interval / 2)
+        else:
+            self._interval = min(self._max_interval, self._interval * 1.5)
+
+        for transition in transitions:
+            for callback in self._callbacks:
+                callback(transition)
+
+        return transitions
+
+
+    def __iter__(self):
+        '''Poll until stopped (or nothing is being watched), yielding each stampr.watcher.Transition.'''
+
+        self._stopped.clear()
+
+        while self._watching():
+            for transition in self.poll():
+                yield transition
+
+            if self._stopped.wait(self._interval):
+                break
+
+
+    def run(self):
+        '''Poll until stopped (or nothing is being watched), passing transitions to the callbacks.'''
+
+        for _ in self:
+            pass
+
+
+    def start(self):
+        '''Run in a background thread.'''
+
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    def stop(self):
+        '''Stop polling (waiting for the background thread, if any, to finish).'''
+
+        self._stopped.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+    def _watching(self):
+        return not self._stopped.is_set() and (self._mailings or self._batches)
+
+
+    def _statuses_to_poll(self):
+        '''Statuses, short of finishing, that any watched mailing could be in.'''
+
+        with self._lock:
+            current = [s for s, count in self._counts.items() if count]
+
+        in_progress = [s for s in self.PROGRESS if s not in self.FINISHED]
+
+        if not current:
+            return []
+        if None in current:
+            return in_progress
+
+        earliest = min(in_progress.index(s) for s in current)
+        return in_progress[earliest:]
+
+
+    def _get_each(self, client, mailing_ids):
+        '''Transitions of mailings got one by one.'''
+
+        import concurrent.futures
+
+        if not mailing_ids:
+            return []
+
+        transitions = []
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+            futures = dict((executor.submit(client.get, ("mailings", mailing_id)), mailing_id)
+                           for mailing_id in mailing_ids)
+
+            for future in concurrent.futures.as_completed(futures):
+                result = future.result()
+
+                if not result:
+                    # Deleted, so there is nothing more to watch.
+                    with self._lock:
+                        self._forget(futures[future])
+                    continue
+
+                transition = self._update(result[0])
+                if transition is not None:
+                    transitions.append(transition)
+
+        return transitions
+
+
+    def _update(self, record):
+        mailing_id, status = record["mailing_id"], record["status"]
+
+        with self._lock:
+            if mailing_id not in self._mailings:
+                return None
+
+            old_status = self._mailings[mailing_id]
+            if old_status == status:
+                return None
+
+            self._forget(mailing_id)
+            if status not in self.FINISHED:
+                self._mailings[mailing_id] = status
+                self._counts[status] = self._counts.get(status, 0) + 1
+
+        return Transition(mailing_id, record["batch_id"], old_status, status, time.time())
+
+
+    def _update_batch(self, batch_id, record):
+        mailing_id, status = record["mailing_id"], record["status"]
+
+        with self._lock:
+            mailings = self._batches.get(batch_id)
+            if mailings is None:
+                return None
+
+            old_status = mailings.get(mailing_id)
+            if old_status == status:
+                return None
+
+            mailings[mailing_id] = status
+
+        return Transition(mailing_id, batch_id, old_status, status, time.time())
+
+
+    def _forget(self, mailing_id):
+        if mailing_id in self._mailings:
+            status = self._mailings.pop(mailing_id)
+            self._counts[status] -= 1
@@ -0,0 +1,185 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import datetime
+import json
+import os
+import threading
+
+from .pagination import iter_records
+from .registry import _account, _replace
+
+
+class WatermarkStore(object):
+    '''How far each browse has got, so that repeating it only fetches what is new (see Mailing.browse_new).
+
+    For each search (mailings with a status, in a batch, etc.), the store
+    keeps the time up to which it was last browsed (the high-water mark), and
+    the mailings found in the overlap seconds before it. The next browse
+    starts overlap seconds before the mark, in case the server's clock is
+    behind this one, and mailings found again in the overlap are left out
+    unless their status has changed. A first browse (or one long after the
+    last) takes one more search, to browse the overlap separately. A mark is only moved once every page of a browse has arrived, so
+    a browse that fails is simply repeated.
+
+    A store can be shared by several clients (even for different accounts)
+    and threads.
+
+    Example::
+
+        watermarks = stampr.watermark.WatermarkStore(path="~/.stampr/watermarks.json")
+        stampr.authenticate("user", "pass", watermarks=watermarks)
+
+        new = stampr.mailing.Mailing.browse_new(since=datetime.datetime(2013, 5, 1), status="error")
+
+    Args:
+        path (str):
+            File to keep the marks in between runs [None, meaning only keep them in memory].
+        overlap (float):
+            Seconds before the mark to start each browse [300].
+    '''
+
+    def __init__(self, path=None, overlap=300):
+        if not isinstance(overlap, (int, float)) or overlap < 0:
+            raise ValueError("overlap must be a number, at least 0")
+
+        self._path = os.path.expanduser(path) if path is not None else None
+        self._overlap = datetime.timedelta(seconds=overlap)
+        self._marks = {} # {(account, query): (mark, {mailing_id: status})}
+        self._lock = threading.Lock()
+
+        if self._path is not None and os.path.exists(self._path):
+            self._load()
+
+
+    @property
+    def path(self):
+        '''File the marks are kept in [str, None]'''
+        return self._path
+
+
+    def __len__(self):
+        with self._lock:
+            return len(self._marks)
+
+
+    def mark(self, client, search):
+        '''Time up to which a search was last browsed.
+
+        Args:
+            client (stampr.client.Client):
+                Client for the account browsed.
+            search (tuple):
+                Path to search, without the times or page number, e.g. ("mailings", "with", "error").
+
+        Returns:
+            datetime.datetime, or None if it hasn't been browsed
+        '''
+
+        with self._lock:
+            entry = self._marks.get(_key(client, search))
+
+        return entry[0] if entry is not None else None
+
+
+    def browse(self, client, search, since):
+        '''Records found by a search since it was last browsed (or since a time, if it hasn't been).
+
+        Args:
+            client (stampr.client.Client):
+                Client to use.
+            search (tuple):
+                Path to search, without the times or page number, e.g. ("mailings", "with", "error").
+            since (datetime.datetime):
+                Earliest time to browse from.
+
+        Returns:
+            list of dict, records new or changed since the last browse, each mailing at most once
+        '''
+
+        key = _key(client, search)
+
+        with self._lock:
+            mark, previous = self._marks.get(key, (None, {}))
+
+        start = since if mark is None else max(since, mark - self._overlap)
+        finish = datetime.datetime.utcnow()
+
+        # Only the mailings in the overlap can be found again by the next browse, so
+        # only they are kept; the rest of the window is browsed separately.
+        overlap = max(start, finish - self._overlap)
+        windows = [(start, overlap), (overlap, finish)] if start < overlap < finish else [(start, finish)]
+
+        seen = {} # {mailing_id: status}, for the whole browse.
+        found = {} # Just those in the overlap.
+        records = []
+        for window_start, window_finish in windows:
+            for record in iter_records(tuple(search) + (window_start.isoformat(), window_finish.isoformat()), client):
+                mailing_id, status = record["mailing_id"], record["status"]
+                if window_start == overlap:
+                    found[mailing_id] = seen.get(mailing_id, status)
+                if mailing_id in seen:
+                    continue # Moved onto a later page while browsing, or on the edge of the overlap.
+
+                seen[mailing_id] = status
+                if previous.get(mailing_id) != status:
+                    records.append(record)
+
+        with self._lock:
+            # Another thread may have browsed the same search further meanwhile.
+            current = self._marks.get(key)
+            if current is None or current[0] <= finish:
+                self._marks[key] = (finish, found)
+                self._save()
+
+        return records
+
+
+    def reset(self, client, search):
+        '''Forget how far a search has been browsed, so the next browse starts from the beginning.'''
+
+        with self._lock:
+            self._marks.pop(_key(client, search), None)
+            self._save()
+
+
+    def clear(self):
+        '''Forget all the marks (including those on disk).'''
+
+        with self._lock:
+            self._marks.clear()
+            self._save()
+
+
+    def _load(self):
+        import dateutil.parser
+
+        with open(self._path) as f:
+            data = json.load(f)
+
+        for entry in data:
+            key = ((entry["base_uri"], entry["username"]), entry["query"])
+            found = dict((mailing_id, status) for mailing_id, status in entry["found"])
+            self._marks[key] = (dateutil.parser.parse(entry["mark"]), found)
+
+
+    def _save(self):
+        if self._path is None:
+            return
+
+        data = [{ "base_uri": account[0], "username": account[1], "query": query, "mark": mark.isoformat(),
+                  "found": sorted(found.items()) }
+                for (account, query), (mark, found) in sorted(self._marks.items())]
+
+        directory = os.path.dirname(self._path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # Written to a temporary file and renamed, so the file is never left half-written.
+        temporary = self._path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(data, f, indent=2)
+        _replace(temporary, self._path)
+
+
+def _key(client, search):
+    return (_account(client), "/".join(str(part) for part in search))
@@ -0,0 +1,196 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import sys
+import os
+import asyncio
+import datetime
+
+from pytest import raises
+from flexmock import flexmock
+
+from .helper import json_data
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import stampr
+import stampr.aio
+import stampr.retry
+
+
+def run(coroutine):
+    return asyncio.new_event_loop().run_until_complete(coroutine)
+
+
+class Test(object):
+    def setup(self):
+        self.client = stampr.aio.AsyncClient("user", "pass")
+        self.start = datetime.datetime(1900, 1, 1, 0, 0, 0)
+        self.finish = datetime.datetime(2000, 1, 1, 0, 0, 0)
+
+    def respond(self, responses):
+        '''Replace the transport with one that answers from a dict of {(action, url): (status, result[, retry_after])}
+
+        A list of responses for a url is answered in order.
+        '''
+
+        self.requests = []
+
+        async def send(action, url, params, headers):
+            self.requests.append((action, url, params, headers))
+            response = responses[(action, url.replace(self.client.BASE_URI, ""))]
+            if isinstance(response, list):
+                response = response.pop(0)
+            if isinstance(response, Exception):
+                raise response
+
+            return (response + (None, 0))[:4]
+
+        flexmock(self.client).should_receive("_send").replace_with(send)
+
+
+class TestAsyncClientInit(Test):
+    def test_creation(self):
+        assert self.client.username == "user"
+        assert self.client.password == "pass"
+        assert self.client.concurrency == 100
+
+    def test_bad_concurrency(self):
+        with raises(ValueError):
+            stampr.aio.AsyncClient("user", "pass", concurrency=0)
+
+    def test_no_network_on_creation(self):
+        assert self.client._session is None
+
+
+class TestAsyncClientApi(Test):
+    def test_get(self):
+        self.respond({ ("get", "test/ping"): (200, { "pong": "now" }) })
+
+        assert run(self.client.get(("test", "ping"))) == { "pong": "now" }
+
+    def test_http_error(self):
+        self.respond({ ("get", "test/ping"): (502, None) })
+
+        with raises(stampr.exceptions.HTTPError) as ex:
+            run(self.client.get(("test", "ping")))
+
+        assert ex.value.status_code == 502
+
+    def test_bad_path(self):
+        with raises(TypeError):
+            run(self.client.get("test/ping"))
+
+
+class TestAsyncClientMail(Test):
+    def test_mail(self):
+        self.respond({ ("post", "mailings"): (200, json_data("mailing_create")) })
+
+        mailing = stampr.mailing.Mailing(batch_id=2, address="bleh1", return_address="bleh2")
+        assert run(self.client.mail(mailing)) is mailing
+
+        assert mailing.id == 1
+        assert mailing.status == "received"
+        assert self.requests[0][2] == { "batch_id": 2, "address": "bleh1", "returnaddress": "bleh2", "format": "none" }
+
+    def test_mail_many_concurrently(self):
+        self.respond({ ("post", "mailings"): (200, json_data("mailing_create")) })
+
+        mailings = [stampr.mailing.Mailing(batch_id=2, address="bleh1", return_address="bleh2") for _ in range(50)]
+
+        async def mail_all():
+            return await asyncio.gather(*[self.client.mail(m) for m in mailings])
+
+        assert run(mail_all()) == mailings
+        assert len(self.requests) == 50
+
+    def test_sync(self):
+        data = json_data("mailing_create")
+        data["status"] = "render"
+        self.respond({ ("get", "mailings/2"): (200, data) })
+
+        mailing = stampr.mailing.Mailing(mailing_id=2, batch_id=1)
+        run(self.client.sync(mailing))
+        assert mailing.status == "render"
+
+    def test_sync_not_created(self):
+        with raises(stampr.exceptions.APIError):
+            run(self.client.sync(stampr.mailing.Mailing(batch_id=1)))
+
+
+class TestAsyncClientCreate(Test):
+    def test_create_config(self):
+        self.respond({ ("post", "configs"): (200, json_data("config_create")) })
+
+        config = run(self.client.create_config(stampr.config.Config()))
+        assert config.id == 4677
+
+    def test_create_batch(self):
+        self.respond({ ("post", "batches"): (200, json_data("batch_create")) })
+
+        batch = run(self.client.create_batch(stampr.batch.Batch(config_id=1)))
+        assert batch.id == 2
+        assert self.requests[0][2] == { "config_id": 1, "status": "processing" }
+
+
+class TestAsyncClientBrowse(Test):
+    def collect(self, iterator):
+        async def collect():
+            return [item async for item in iterator]
+
+        return run(collect())
+
+    def test_browse_mailings(self):
+        self.respond(dict((("get", "mailings/browse/1900-01-01T00:00:00/2000-01-01T00:00:00/%d" % i), (200, json_data("mailings_%d" % i)))
+                          for i in [0, 1, 2]))
+
+        mailings = self.collect(self.client.browse_mailings(self.start, self.finish))
+        assert [m.id for m in mailings] == [1, 2, 3]
+
+    def test_browse_batches(self):
+        self.respond(dict((("get", "batches/with/processing/1900-01-01T00:00:00/2000-01-01T00:00:00/%d" % i), (200, json_data("batches_%d" % i)))
+                          for i in [0, 1, 2]))
+
+        batches = self.collect(self.client.browse_batches(self.start, self.finish, status="processing"))
+        assert [b.id for b in batches] == [2, 3, 4]
+
+    def test_all_configs(self):
+        self.respond(dict((("get", "configs/browse/all/%d" % i), (200, json_data("configs_%d" % i)))
+                          for i in [0, 1, 2]))
+
+        configs = self.collect(self.client.all_configs())
+        assert [c.id for c in configs] == [4677, 4678, 4679]
+
+
+class TestAsyncClientRetry(Test):
+    def setup(self):
+        super(TestAsyncClientRetry, self).setup()
+        self.client = stampr.aio.AsyncClient("user", "pass", retry=stampr.retry.RetryPolicy(total=2, backoff=0))
+
+    def test_retry_then_succeed(self):
+        self.respond({ ("get", "test/ping"): [(503, None, "0"), (200, { "pong": "now" })] })
+
+        assert run(self.client.get(("test", "ping"))) == { "pong": "now" }
+        assert self.client.retry_counts == { "GET test/ping": 1 }
+
+    def test_retry_connection_error(self):
+        import aiohttp
+        self.respond({ ("get", "test/ping"): [aiohttp.ClientConnectionError("reset"), (200, { "pong": "now" })] })
+
+        assert run(self.client.get(("test", "ping"))) == { "pong": "now" }
+
+    def test_give_up(self):
+        self.respond({ ("get", "test/ping"): [(502, None), (502, None), (502, None)] })
+
+        with raises(stampr.exceptions.HTTPError):
+            run(self.client.get(("test", "ping")))
+
+        assert len(self.requests) == 3
+
+    def test_mailing_has_stable_idempotency_key(self):
+        self.respond({ ("post", "mailings"): [(503, None), (200, json_data("mailing_create"))] })
+
+        mailing = stampr.mailing.Mailing(batch_id=2, address="bleh1", return_address="bleh2")
+        run(self.client.mail(mailing))
+
+        keys = [headers["Idempotency-Key"] for _, _, _, headers in self.requests]
+        assert len(keys) == 2
+        assert keys[0] == keys[1]
@@ -0,0 +1,120 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import sys
+import os
+import threading
+
+from pytest import raises
+from flexmock import flexmock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import stampr
+import stampr.testing
+import stampr.autobatch
+
+
+class Test(object):
+    def setup(self):
+        self.server = stampr.testing.FakeServer()
+        self.server.start()
+
+    def teardown(self):
+        self.server.stop()
+
+    def mail(self, count, **options):
+        return [stampr.mail("from", "to %d" % i, "<html>%d</html>" % i, **options) for i in range(count)]
+
+
+class TestAutoBatcher(Test):
+    def test_bad_size(self):
+        with raises(ValueError):
+            stampr.autobatch.AutoBatcher(size=0)
+
+    def test_bad_window(self):
+        with raises(ValueError):
+            stampr.autobatch.AutoBatcher(window=-1)
+
+    def test_bad_option(self):
+        with raises(TypeError):
+            self.server.client(auto_batch=100)
+
+    def test_shared_batch(self):
+        self.server.client()
+        mailings = self.mail(5)
+
+        assert all(isinstance(m, stampr.mailing.Mailing) for m in mailings)
+        assert len(set(m.batch_id for m in mailings)) == 1
+        assert len(self.server.batches) == 1
+
+    def test_one_post_per_mailing(self):
+        self.server.client()
+        self.mail(1)
+        self.server.request_counts.clear()
+
+        self.mail(10)
+
+        assert self.server.request_counts == { "POST mailings": 10 }
+
+    def test_size(self):
+        self.server.client(auto_batch=stampr.autobatch.AutoBatcher(size=2))
+        mailings = self.mail(5)
+
+        assert [m.batch_id for m in mailings] == [1, 1, 2, 2, 3]
+
+    def test_window(self):
+        self.server.client(auto_batch=stampr.autobatch.AutoBatcher(window=60))
+        now = [1000.0]
+        flexmock(stampr.autobatch.time).should_receive("time").replace_with(lambda: now[0])
+
+        first = self.mail(2)
+        now[0] += 61
+        second = self.mail(1)
+
+        assert [m.batch_id for m in first + second] == [1, 1, 2]
+
+    def test_grouped_by_config(self):
+        self.server.client()
+        plain = stampr.config.Config()
+        envelope = stampr.config.Config(return_envelope=True)
+
+        mailings = self.mail(2, config=plain) + self.mail(2, config=envelope) + self.mail(1)
+
+        assert [m.batch_id for m in mailings] == [1, 1, 2, 2, 1]
+
+    def test_given_batch_used(self):
+        self.server.client()
+        batch = stampr.batch.Batch()
+
+        assert all(m.batch_id == batch.id for m in self.mail(2, batch=batch))
+        assert len(self.server.batches) == 1
+
+    def test_close(self):
+        client = self.server.client()
+        first = self.mail(1)
+        client.auto_batch.close()
+        second = self.mail(1)
+
+        assert first[0].batch_id != second[0].batch_id
+
+    def test_disabled(self):
+        self.server.client(auto_batch=False)
+        mailings = self.mail(3)
+
+        assert len(set(m.batch_id for m in mailings)) == 3
+
+    def test_batch_created_once_between_threads(self):
+        self.server.client(pool_maxsize=8)
+        mailings = []
+
+        def mail():
+            mailings.extend(self.mail(5))
+
+        threads = [threading.Thread(target=mail) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(mailings) == 40
+        assert len(self.server.batches) == 1
+        assert self.server.request_counts["POST batches"] == 1
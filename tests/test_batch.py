@@ -27,6 +27,11 @@ class Test(object):
 
 class TestBatchInit(Test):
     def test_generate_a_config(self):
+        (flexmock(stampr.client.Client.current)
+                .should_receive("_api")
+                .with_args("get", ("configs", "browse", "all", 0))
+                .and_return([])) # No existing configs to reuse.
+
         (flexmock(stampr.client.Client.current)
                 .should_receive("_api")
                 .with_args("post", ("configs", ),
@@ -286,6 +291,11 @@ class TestBatchBrowseWithStatus(Test):
 
 class TestBatchMailing(Test):
     def test_create_a_mailing(self):
+        (flexmock(stampr.client.Client.current)
+                .should_receive("_api")
+                .with_args("get", ("configs", "browse", "all", 0))
+                .and_return([])) # No existing configs to reuse.
+
         (flexmock(stampr.client.Client.current)
                 .should_receive("_api")
                 .with_args("post", ("configs", ),
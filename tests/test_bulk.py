@@ -0,0 +1,124 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import sys
+import os
+import threading
+
+from pytest import raises
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import stampr
+import stampr.testing
+import stampr.bulk
+
+
+class Test(object):
+    def setup(self):
+        self.server = stampr.testing.FakeServer()
+        self.server.start()
+        self.client = self.server.client()
+
+        self.batch = stampr.batch.Batch()
+        self.batch.create()
+
+    def teardown(self):
+        self.client.close()
+        self.server.stop()
+
+
+def recipients(count):
+    for i in range(count):
+        yield ("to %d" % i, "from", "<html>%d</html>" % i)
+
+
+class TestMailMany(Test):
+    def test_tuples(self):
+        result = self.batch.mail_many(recipients(50))
+
+        assert isinstance(result, stampr.bulk.BulkResult)
+        assert result.count == result.succeeded == 50
+        assert result.errors == {}
+        assert not result.cancelled
+        assert sorted(result.ids) == list(range(1, 51))
+        assert set(m["batch_id"] for m in self.server.mailings.values()) == set([self.batch.id])
+
+    def test_ids_in_input_order(self):
+        result = self.batch.mail_many(recipients(20), concurrency=4)
+
+        addresses = [self.server.mailings[id]["address"] for id in result.ids]
+        assert addresses == ["to %d" % i for i in range(20)]
+
+    def test_dicts(self):
+        result = self.batch.mail_many([{ "address": "to", "return_address": "from", "data": { "name": "Fred" } }])
+
+        assert result.succeeded == 1
+        assert self.server.mailings[result.ids[0]]["format"] == "json"
+
+    def test_bad_items(self):
+        items = [("to", "from", "<html></html>"), "to", { "address": "to", "returnaddress": "from" },
+                 (None, "from", "<html></html>"), ("to", "from", "<html></html>")]
+        result = self.batch.mail_many(items)
+
+        assert result.count == 5
+        assert result.succeeded == 2
+        assert sorted(result.errors) == [1, 2, 3]
+        assert isinstance(result.errors[1], TypeError)
+        assert isinstance(result.errors[2], ValueError)
+        assert result.ids[0] != 0 and result.ids[4] != 0
+        assert list(result.ids[1:4]) == [0, 0, 0]
+
+    def test_error_items(self):
+        error = ValueError("couldn't read row")
+        result = self.batch.mail_many([("to", "from", "<html></html>"), error])
+
+        assert result.count == 2
+        assert result.errors == { 1: error }
+        assert len(self.server.mailings) == 1
+
+    def test_server_errors(self):
+        self.server.fail_next(2, 400)
+        result = self.batch.mail_many(recipients(10), concurrency=1)
+
+        assert result.failed == 2
+        assert all(isinstance(e, stampr.exceptions.HTTPError) for e in result.errors.values())
+        assert result.succeeded == 8
+
+    def test_lazy(self):
+        read = []
+
+        def items():
+            for i in range(100):
+                read.append(i)
+                # Never more than a couple of windows ahead of what has been sent.
+                assert len(read) - len(self.server.mailings) <= 2 * 2 + 2
+                yield ("to %d" % i, "from", "<html></html>")
+
+        result = self.batch.mail_many(items(), concurrency=2)
+
+        assert result.succeeded == 100
+
+    def test_cancel(self):
+        cancel = threading.Event()
+
+        def items():
+            for i in range(100):
+                if i == 10:
+                    cancel.set()
+                yield ("to %d" % i, "from", "<html></html>")
+
+        result = self.batch.mail_many(items(), cancel=cancel)
+
+        assert result.cancelled
+        assert result.count == 10
+        assert len(self.server.mailings) == 10
+
+    def test_timing(self):
+        result = self.batch.mail_many(recipients(5))
+
+        assert result.duration > 0
+        assert 0 < result.latency <= result.duration
+        assert result.rate > 0
+
+    def test_bad_concurrency(self):
+        with raises(ValueError):
+            self.batch.mail_many(recipients(1), concurrency=0)
@@ -0,0 +1,304 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import sys
+import os
+import datetime
+import shutil
+import tempfile
+
+from flexmock import flexmock
+from pytest import raises
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import stampr
+import stampr.testing
+import stampr.cache
+from stampr.cache import ResponseCache
+from stampr.exceptions import HTTPError
+
+
+class Test(object):
+    def setup(self):
+        self.server = stampr.testing.FakeServer()
+        self.server.start()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "cache.sqlite")
+
+        self.setup_client = self.server.client()
+        self.batch = stampr.batch.Batch()
+        self.batch.create()
+
+        self.cache = ResponseCache()
+        self.client = self.server.client(cache=self.cache)
+        self.server.request_counts.clear()
+
+        self.now = 1000
+        self.clock = flexmock(self.cache).should_receive("_now").replace_with(lambda: self.now)
+
+    def teardown(self):
+        self.client.close()
+        self.setup_client.close()
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def requests(self, route):
+        return self.server.request_counts.get(route, 0)
+
+    def mail(self):
+        with self.batch.mailing() as m:
+            m.address = "to"
+            m.return_address = "from"
+            m.data = "<html>Hi</html>"
+        return m
+
+
+class TestResponseCache(Test):
+    def test_no_cache(self):
+        client = self.server.client()
+
+        assert client.cache is None
+
+        stampr.batch.Batch[self.batch.id]
+        stampr.batch.Batch[self.batch.id]
+
+        assert self.requests("GET batches/:id") == 2
+
+    def test_bad_cache(self):
+        with raises(TypeError):
+            self.server.client(cache={})
+
+    def test_bad_options(self):
+        with raises(ValueError):
+            ResponseCache(max_entries=0)
+        with raises(ValueError):
+            ResponseCache(max_bytes=0)
+        with raises(TypeError):
+            ResponseCache(ttls=[])
+        with raises(ValueError):
+            ResponseCache(ttls={ "batches/*": -1 })
+
+    def test_cached(self):
+        assert stampr.batch.Batch[self.batch.id].id == self.batch.id
+        assert stampr.batch.Batch[self.batch.id].id == self.batch.id
+
+        assert self.requests("GET batches/:id") == 1
+        assert (self.cache.hits, self.cache.misses) == (1, 1)
+        assert len(self.cache) == 1
+
+    def test_config_all(self):
+        stampr.config.Config.all()
+        stampr.config.Config.all()
+
+        assert self.requests("GET configs/browse/all") == 2 # The first time, a page of configs and an empty page.
+
+    def test_copy_returned(self):
+        self.client.get(("batches", self.batch.id))[0]["status"] = "changed"
+
+        assert self.client.get(("batches", self.batch.id))[0]["status"] != "changed"
+
+    def test_not_cached(self):
+        self.client.ping()
+        self.client.ping()
+
+        assert self.requests("GET test/ping") == 2
+        assert len(self.cache) == 0
+
+    def test_expires(self):
+        stampr.batch.Batch[self.batch.id]
+
+        self.now = 1059
+        stampr.batch.Batch[self.batch.id]
+        assert self.requests("GET batches/:id") == 1
+
+        self.now = 1061
+        stampr.batch.Batch[self.batch.id]
+        assert self.requests("GET batches/:id") == 2
+
+    def test_ttls(self):
+        cache = ResponseCache(ttls={ "batches/*": 5, "mailings": None })
+
+        assert cache.ttl(("configs", 1)) is None
+        assert cache.ttl(("batches", 1)) == 5
+        assert cache.ttl(("batches", 1, "browse", "2013-05-01T00:00:00", "2013-06-01T00:00:00", 0)) == 10
+        assert cache.ttl(("batches", 1, "with", "received", "2013-05-01T00:00:00", "2013-06-01T00:00:00", 0)) == 10
+        assert cache.ttl(("mailings", 1)) == 10 # "mailings/*" is a longer match than "mailings".
+        assert cache.ttl(("mailings", "with", "error", "2013-05-01T00:00:00", "2013-06-01T00:00:00", 0)) == 10
+        assert cache.ttl(("mailings", "other")) is None
+        assert cache.ttl(("test", "ping")) == 0
+        assert cache.ttl(("unknown", )) == 0
+        assert ResponseCache(default_ttl=30).ttl(("unknown", )) == 30
+
+    def test_failure_not_cached(self):
+        self.server.fail_next(1, status=404)
+
+        with raises(HTTPError):
+            stampr.batch.Batch[self.batch.id]
+        stampr.batch.Batch[self.batch.id]
+
+        assert len(self.cache) == 1
+
+    def test_accounts_separate(self):
+        stampr.batch.Batch[self.batch.id]
+
+        flexmock(stampr.cache).should_receive("_account").and_return(("other", "user"))
+
+        assert self.cache.fetch(self.client, ("batches", self.batch.id), lambda: []) == []
+
+
+class TestEviction(object):
+    def fill(self, cache, count, size=10):
+        for i in range(count):
+            cache.fetch(Client(), ("configs", i + 1), lambda: "x" * (size - 2))
+
+    def test_max_entries(self):
+        cache = ResponseCache(max_entries=3)
+        self.fill(cache, 4)
+
+        assert len(cache) == 3
+        cache.fetch(Client(), ("configs", 1), lambda: "sent")
+        assert cache.misses == 5
+
+    def test_least_recently_used(self):
+        cache = ResponseCache(max_entries=3)
+        self.fill(cache, 3)
+        cache.fetch(Client(), ("configs", 1), lambda: "sent")
+        cache.fetch(Client(), ("configs", 4), lambda: "new")
+
+        assert cache.hits == 1
+        cache.fetch(Client(), ("configs", 1), lambda: "sent")
+        assert cache.hits == 2 # 2 was evicted instead.
+        cache.fetch(Client(), ("configs", 2), lambda: "sent")
+        assert cache.hits == 2
+
+    def test_max_bytes(self):
+        cache = ResponseCache(max_bytes=25)
+        self.fill(cache, 3)
+
+        assert len(cache) == 2
+        assert cache.size == 20
+
+    def test_too_big(self):
+        cache = ResponseCache(max_bytes=5)
+        self.fill(cache, 1)
+
+        assert len(cache) == 0
+
+
+class Client(object):
+    base_uri = "http://localhost/"
+    username = "user"
+
+
+class TestInvalidation(Test):
+    def test_update(self):
+        stampr.batch.Batch[self.batch.id]
+        self.batch.status = "archive"
+        stampr.batch.Batch[self.batch.id]
+
+        assert stampr.batch.Batch[self.batch.id].status == "archive"
+        assert self.requests("GET batches/:id") == 2
+
+    def test_delete(self):
+        mailing = self.mail()
+        mailing_id = mailing.id
+        mailing.sync()
+        mailing.delete()
+
+        assert self.client.get(("mailings", mailing_id)) == []
+
+    def test_listing(self):
+        stampr.config.Config.all()
+        stampr.config.Config(size="legal").create()
+
+        assert len(stampr.config.Config.all()) == 2
+
+    def test_batch_listing(self):
+        start, finish = datetime.datetime(2000, 1, 1), datetime.datetime(2100, 1, 1)
+
+        self.mail()
+        assert len(stampr.mailing.Mailing.browse(start, finish, batch=self.batch)) == 1
+        self.mail()
+
+        assert len(stampr.mailing.Mailing.browse(start, finish, batch=self.batch)) == 2
+
+    def test_batch_listing_with_status(self):
+        start, finish = datetime.datetime(2000, 1, 1), datetime.datetime(2100, 1, 1)
+
+        assert stampr.mailing.Mailing.browse(start, finish, status="received", batch=self.batch) == []
+        self.mail()
+
+        assert len(stampr.mailing.Mailing.browse(start, finish, status="received", batch=self.batch)) == 1
+
+    def test_other_resources_kept(self):
+        other = stampr.batch.Batch()
+        other.create()
+        stampr.batch.Batch[self.batch.id]
+        stampr.config.Config.all()
+
+        other.status = "archive"
+        stampr.batch.Batch[self.batch.id]
+        stampr.config.Config.all()
+
+        assert self.requests("GET batches/:id") == 1
+        assert self.requests("GET configs/browse/all") == 2
+
+    def test_failed_post(self):
+        stampr.batch.Batch[self.batch.id]
+        self.server.fail_next(1, status=400)
+
+        with raises(HTTPError):
+            self.batch.status = "archive"
+        stampr.batch.Batch[self.batch.id]
+
+        assert self.requests("GET batches/:id") == 2
+
+    def test_request_in_flight(self):
+        # The batch changes while its old state is being fetched, so that can't be cached.
+        def send():
+            response = self.client._api("get", ("batches", self.batch.id))
+            self.cache.invalidate(self.client, ("batches", self.batch.id))
+            return response
+
+        self.cache.fetch(self.client, ("batches", self.batch.id), send)
+
+        assert len(self.cache) == 0
+
+
+class TestDisk(Test):
+    def test_shared(self):
+        cache = ResponseCache(path=self.path)
+        cache.fetch(self.client, ("configs", 1), lambda: [{ "config_id": 1 }])
+        cache.close()
+
+        cache = ResponseCache(path=self.path)
+        assert cache.path == self.path
+        assert cache.fetch(self.client, ("configs", 1), lambda: []) == [{ "config_id": 1 }]
+        assert cache.hits == 1
+
+    def test_expired(self):
+        cache = ResponseCache(path=self.path)
+        flexmock(cache).should_receive("_now").and_return(1000) # Long ago.
+        cache.fetch(self.client, ("batches", 1), lambda: [{ "batch_id": 1 }])
+        cache.close()
+
+        cache = ResponseCache(path=self.path)
+        assert cache.fetch(self.client, ("batches", 1), lambda: []) == []
+
+    def test_invalidated(self):
+        cache = ResponseCache(path=self.path)
+        cache.fetch(self.client, ("batches", 1), lambda: [{ "batch_id": 1 }])
+        cache.fetch(self.client, ("batches", 2), lambda: [{ "batch_id": 2 }])
+        cache.invalidate(self.client, ("batches", 1))
+        cache.close()
+
+        cache = ResponseCache(path=self.path)
+        assert cache.fetch(self.client, ("batches", 1), lambda: []) == []
+        assert cache.fetch(self.client, ("batches", 2), lambda: []) == [{ "batch_id": 2 }]
+
+    def test_clear(self):
+        cache = ResponseCache(path=self.path)
+        cache.fetch(self.client, ("configs", 1), lambda: [{ "config_id": 1 }])
+        cache.clear()
+
+        assert len(cache) == 0
+        assert cache.fetch(self.client, ("configs", 1), lambda: []) == []
@@ -0,0 +1,208 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import sys
+import os
+import io
+import json
+import base64
+import shutil
+import tempfile
+
+from pytest import raises
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import stampr
+import stampr.testing
+import stampr.cli
+
+
+PDF = b"%PDF-1.4 letter"
+
+
+class Test(object):
+    def setup(self):
+        self.server = stampr.testing.FakeServer()
+        self.server.start()
+        self.directory = tempfile.mkdtemp()
+
+    def teardown(self):
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def write(self, name, content):
+        mode = "wb" if isinstance(content, bytes) else "w"
+        with io.open(self.path(name), mode) as f:
+            f.write(content)
+        return self.path(name)
+
+    def run(self, *args):
+        return stampr.cli.main(["--base-uri", self.server.base_uri, "--username", self.server.username,
+                                "--password", self.server.password] + list(args))
+
+    def sent(self):
+        return sorted(self.server.mailings.values(), key=lambda m: m["address"]) # Sent in no particular order.
+
+
+class TestSend(Test):
+    def setup(self):
+        super(TestSend, self).setup()
+        self.body = self.write("letter.pdf", PDF)
+        self.csv = self.write("recipients.csv", "address,name\n\"1 Main St\nTown\",Bob\n2 High St,Alice\n")
+
+    def test_body(self, capsys):
+        assert self.run("send", self.csv, "--body", self.body, "--return-address", "From", "--quiet") == 0
+
+        mailings = self.sent()
+        assert [m["address"] for m in mailings] == ["1 Main St\nTown", "2 High St"]
+        assert all(m["format"] == "pdf" and m["returnaddress"] == "From" for m in mailings)
+        assert base64.b64decode(mailings[0]["data"]) == PDF
+        assert "Sent 2 of 2 mailings" in capsys.readouterr().out
+
+    def test_progress(self, capsys):
+        self.run("send", self.csv, "--body", self.body, "--return-address", "From")
+
+        progress = capsys.readouterr().err
+        assert "2/2 sent" in progress
+        assert "latency p50" in progress
+        assert "ETA" in progress
+
+    def test_body_column(self):
+        other = self.write("other.html", "<html>Hi</html>")
+        path = self.write("recipients.jsonl",
+                          json.dumps({ "address": "A", "return_address": "R", "letter": self.body }) + "\n\n" +
+                          json.dumps({ "address": "B", "return_address": "R", "letter": other }) + "\n")
+
+        assert self.run("send", path, "--body-column", "letter", "--quiet") == 0
+
+        assert [m["format"] for m in self.sent()] == ["pdf", "html"]
+
+    def test_template(self):
+        template = self.write("letter.mustache", "<html>Dear {{name}}</html>")
+
+        assert self.run("send", self.csv, "--template", template, "--return-address", "From", "--quiet") == 0
+
+        mailings = self.sent()
+        assert self.server.batches[mailings[0]["batch_id"]]["template"] == "<html>Dear {{name}}</html>"
+        assert json.loads(base64.b64decode(mailings[1]["data"]).decode("ascii")) == { "name": "Alice" }
+
+    def test_existing_batch(self):
+        self.server.client()
+        batch = stampr.batch.Batch()
+        batch.create()
+
+        assert self.run("send", self.csv, "--body", self.body, "--return-address", "From", "--batch", str(batch.id),
+                        "--quiet") == 0
+
+        assert set(m["batch_id"] for m in self.sent()) == set([batch.id])
+
+    def test_failures(self, capsys):
+        assert self.run("send", self.csv, "--body", self.body, "--quiet") == 1
+
+        err = capsys.readouterr().err
+        assert "row 1: return_address must be a non-empty string" in err
+        assert "row 2:" in err
+
+    def test_journal_resumes(self):
+        journal = self.path("send.journal")
+
+        self.run("send", self.csv, "--body", self.body, "--return-address", "From", "--journal", journal, "--quiet")
+        self.run("send", self.csv, "--body", self.body, "--return-address", "From", "--journal", journal, "--quiet")
+
+        assert len(self.sent()) == 2
+
+    def test_missing_body_file(self, capsys):
+        path = self.write("recipients.jsonl", json.dumps({ "address": "A", "return_address": "R",
+                                                           "letter": self.path("missing.pdf") }) + "\n")
+
+        assert self.run("send", path, "--body-column", "letter", "--quiet") == 1
+        err = capsys.readouterr().err
+        assert "row 1:" in err and "missing.pdf" in err
+
+    def test_bad_rows_dont_stop_the_rest(self, capsys):
+        rows = ["address,letter", "A,%s" % self.body, "B,", "C,%s" % self.body, "D,%s" % self.path("missing.pdf"),
+                "E,%s" % self.body]
+        path = self.write("rows.csv", "\n".join(rows) + "\n")
+
+        assert self.run("send", path, "--body-column", "letter", "--return-address", "From", "--quiet") == 1
+
+        assert [m["address"] for m in self.sent()] == ["A", "C", "E"]
+        out, err = capsys.readouterr()
+        assert "Sent 3 of 5 mailings" in out
+        assert "row 2: row has no letter: 'B'" in err.replace("u'", "'")
+        assert "row 4:" in err and "missing.pdf" in err
+
+    def test_bad_json_doesnt_stop_the_rest(self, capsys):
+        lines = [json.dumps({ "address": "A", "return_address": "R" }), "{ \"address\": \"B\",",
+                 json.dumps({ "address": "C", "return_address": "R" })]
+        path = self.write("recipients.jsonl", "\n".join(lines) + "\n")
+
+        assert self.run("send", path, "--body", self.body, "--quiet") == 1
+
+        assert [m["address"] for m in self.sent()] == ["A", "C"]
+        out, err = capsys.readouterr()
+        assert "Sent 2 of 3 mailings" in out
+        assert "row 2: not valid JSON" in err
+
+    def test_letter_required(self):
+        with raises(SystemExit):
+            self.run("send", self.csv)
+
+    def test_credentials_required(self, monkeypatch):
+        monkeypatch.delenv("STAMPR_USERNAME", raising=False)
+
+        with raises(SystemExit):
+            stampr.cli.main(["send", self.csv, "--body", self.body])
+
+    def test_bad_concurrency(self):
+        with raises(SystemExit):
+            self.run("send", self.csv, "--body", self.body, "--concurrency", "0")
+
+    def test_no_command(self, capsys):
+        assert stampr.cli.main([]) == 2
+
+
+class TestExport(Test):
+    def setup(self):
+        super(TestExport, self).setup()
+        self.server.client()
+        self.batch = stampr.batch.Batch()
+        for i in range(3):
+            with self.batch.mailing() as m:
+                m.address = "to %d" % i
+                m.return_address = "from"
+                m.data = "<html>%d</html>" % i
+
+    def test_mailings(self, capsys):
+        output = self.path("mailings.jsonl")
+
+        assert self.run("export", "mailings", output, "--start", "2000-01-01", "--finish", "2100-01-01") == 0
+
+        with io.open(output) as f:
+            assert len(f.readlines()) == 3
+        assert "Exported 3 mailings" in capsys.readouterr().out
+
+    def test_batch_and_status(self):
+        output = self.path("mailings.csv")
+
+        assert self.run("export", "mailings", output, "--start", "2000-01-01", "--finish", "2100-01-01",
+                        "--batch", str(self.batch.id), "--status", "received") == 0
+
+        with io.open(output) as f:
+            assert len(f.readlines()) == 4
+
+    def test_batches(self):
+        output = self.path("batches.jsonl.gz")
+
+        assert self.run("export", "batches", output, "--start", "2000-01-01", "--finish", "2100-01-01") == 0
+
+    def test_bad_status(self, capsys):
+        assert self.run("export", "batches", self.path("b.jsonl"), "--start", "2000-01-01", "--finish", "2100-01-01",
+                        "--status", "lost") == 2
+        assert "must be one of" in capsys.readouterr().err
+
+    def test_bad_time(self):
+        with raises(SystemExit):
+            self.run("export", "mailings", self.path("m.jsonl"), "--start", "yesterday-ish", "--finish", "2100-01-01")
@@ -3,14 +3,19 @@ from __future__ import absolute_import, unicode_literals, print_function, divisi
 import sys
 import os
 import datetime
+import threading
+import json
+import time
 
 import dateutil
+import requests
 
 from pytest import raises
 from flexmock import flexmock
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import stampr
+import stampr.testing
 
 class Test(object):
     def setup(self):
@@ -50,4 +55,199 @@ class TestClientServerTime(Test):
 
         server_time = self.client.server_time()
         assert isinstance(server_time, datetime.datetime)
-        assert server_time == time
\ No newline at end of file
+        assert server_time == time
+
+class TestClientPool(Test):
+    def test_default_pool(self):
+        adapter = self.client.session.get_adapter(self.client.BASE_URI)
+        assert adapter._pool_maxsize == 10
+        assert adapter._pool_connections == 10
+        assert adapter._pool_block == False
+
+    def test_configured_pool(self):
+        (flexmock(stampr.client.Client).should_receive("ping").once())
+        client = stampr.client.Client("user", "pass", pool_connections=2, pool_maxsize=50, pool_block=True)
+
+        adapter = client.session.get_adapter(client.BASE_URI)
+        assert adapter._pool_maxsize == 50
+        assert adapter._pool_connections == 2
+        assert adapter._pool_block == True
+
+    def test_bad_pool_size(self):
+        with raises(ValueError):
+            stampr.client.Client("user", "pass", pool_maxsize=0)
+
+    def test_session_has_auth(self):
+        assert self.client.session.auth == ("user", "pass")
+
+    def test_keep_alive_disabled(self):
+        (flexmock(stampr.client.Client).should_receive("ping").once())
+        client = stampr.client.Client("user", "pass", keep_alive=False)
+
+        assert client.session.headers["Connection"] == "close"
+
+    def test_session_per_thread_sharing_a_pool(self):
+        sessions = []
+        thread = threading.Thread(target=lambda: sessions.append(self.client.session))
+        thread.start()
+        thread.join()
+
+        assert sessions[0] is not self.client.session
+        assert self.client.session is self.client.session
+        assert sessions[0].get_adapter(self.client.BASE_URI) is self.client.session.get_adapter(self.client.BASE_URI)
+
+
+class Response(object):
+    def __init__(self, status_code, result=None, headers=None):
+        self.status_code = status_code
+        self.result = result
+        self.headers = headers or {}
+        self.url = "http://example.com"
+        self.content = json.dumps(result).encode("ascii")
+
+    def json(self):
+        return self.result
+
+    def raise_for_status(self):
+        raise requests.HTTPError("%d Error" % self.status_code)
+
+
+class TestClientRetry(Test):
+    def setup(self):
+        (flexmock(stampr.client.Client).should_receive("ping").once())
+        self.client = stampr.client.Client("user", "pass", retry=stampr.retry.RetryPolicy(total=2, backoff=0))
+        flexmock(stampr.client.time).should_receive("sleep")
+
+    def test_success_without_retry(self):
+        (flexmock(self.client.session)
+                .should_receive("send")
+                .and_return(Response(200, { "pong": "now" }))
+                .once())
+
+        assert self.client.get(("test", "ping")) == { "pong": "now" }
+        assert self.client.retry_counts == {}
+
+    def test_retry_status(self):
+        (flexmock(self.client.session)
+                .should_receive("send")
+                .and_return(Response(503, headers={ "Retry-After": "3" }))
+                .and_return(Response(200, { "pong": "now" }))
+                .twice())
+        flexmock(stampr.client.time).should_receive("sleep").with_args(3.0).once()
+
+        assert self.client.get(("test", "ping")) == { "pong": "now" }
+        assert self.client.retry_counts == { "GET test/ping": 1 }
+
+    def test_retry_connection_error(self):
+        (flexmock(self.client.session)
+                .should_receive("send")
+                .and_raise(requests.ConnectionError("reset"))
+                .and_return(Response(200, []))
+                .twice())
+
+        assert self.client.get(("mailings", "browse", "1900-01-01T00:00:00", "2000-01-01T00:00:00", 0)) == []
+        assert self.client.retry_counts == { "GET mailings/browse": 1 }
+
+    def test_give_up(self):
+        (flexmock(self.client.session)
+                .should_receive("send")
+                .and_return(Response(502))
+                .times(3))
+
+        with raises(stampr.exceptions.HTTPError) as ex:
+            self.client.get(("test", "ping"))
+
+        assert ex.value.status_code == 502
+
+    def test_connection_error_wrapped(self):
+        (flexmock(self.client.session)
+                .should_receive("send")
+                .and_raise(requests.Timeout("slow"))
+                .times(3))
+
+        with raises(stampr.exceptions.HTTPError) as ex:
+            self.client.get(("test", "ping"))
+
+        assert ex.value.status_code is None
+
+    def test_no_retry_on_client_error(self):
+        (flexmock(self.client.session)
+                .should_receive("send")
+                .and_return(Response(404))
+                .once())
+
+        with raises(stampr.exceptions.HTTPError):
+            self.client.get(("mailings", 12))
+
+    def test_no_retry_on_unsafe_post(self):
+        (flexmock(self.client.session)
+                .should_receive("send")
+                .and_return(Response(503))
+                .once())
+
+        with raises(stampr.exceptions.HTTPError):
+            self.client.post(("batches", ), config_id=1)
+
+    def test_mailings_post_retried_with_the_same_idempotency_key(self):
+        keys = []
+
+        def send(request, **settings):
+            keys.append(request.headers["Idempotency-Key"])
+            return Response(200, { "mailing_id": 1 }) if len(keys) == 2 else Response(503)
+
+        flexmock(self.client.session).should_receive("send").replace_with(send)
+
+        assert self.client.post(("mailings", ), batch_id=1) == { "mailing_id": 1 }
+        assert len(keys) == 2
+        assert keys[0] == keys[1]
+        assert self.client.retry_counts == { "POST mailings": 1 }
+
+
+class TestClientCheckCredentials(object):
+    def test_lazy_does_not_ping(self):
+        (flexmock(stampr.client.Client).should_receive("ping").never())
+        client = stampr.client.Client("user", "pass", check_credentials="lazy")
+
+        assert stampr.client.Client.current is client
+
+    def test_bad_option(self):
+        with raises(ValueError):
+            stampr.client.Client("user", "pass", check_credentials="sometimes")
+
+    def test_background_failure_raised_on_next_request(self):
+        with stampr.testing.FakeServer() as server:
+            client = stampr.client.Client("user", "wrong", base_uri=server.base_uri, check_credentials="background")
+
+            for _ in range(100):
+                if client._credentials_error is not None:
+                    break
+                time.sleep(0.01)
+
+            server.password = "wrong" # The request itself would succeed.
+
+            with raises(stampr.exceptions.HTTPError) as ex:
+                client.get(("test", "ping"))
+
+            assert ex.value.status_code == 401
+            assert client.get(("test", "ping"))["pong"]
+
+    def test_background_other_failure_not_raised(self):
+        with stampr.testing.FakeServer() as server:
+            server.fail_next(1, status=503)
+            client = stampr.client.Client("user", "pass", base_uri=server.base_uri, check_credentials="background",
+                                          retry=stampr.retry.RetryPolicy(total=0))
+
+            for _ in range(100):
+                if not server._failures:
+                    break
+                time.sleep(0.01)
+            time.sleep(0.05) # For the ping to finish failing.
+
+            assert client._credentials_error is None
+            assert client.get(("test", "ping"))["pong"]
+
+    def test_background_success(self):
+        with stampr.testing.FakeServer() as server:
+            client = stampr.client.Client("user", "pass", base_uri=server.base_uri, check_credentials="background")
+
+            assert client.get(("test", "ping"))["pong"]
@@ -135,6 +135,11 @@ class TestConfigCreate(Test):
             self.uncreated.create()
 
     def test_creation(self):
+        (flexmock(stampr.client.Client.current)
+                .should_receive("_api")
+                .with_args("get", ("configs", "browse", "all", 0))
+                .and_return([])) # No existing configs to reuse.
+
         (flexmock(stampr.client.Client.current)
             .should_receive("_api")
             .with_args("post", ("configs",), output="single", returnenvelope=False, size="standard", style="color", turnaround="threeday")
@@ -0,0 +1,151 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import sys
+import os
+import shutil
+import tempfile
+
+from pytest import raises
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import stampr
+import stampr.testing
+import stampr.dedup
+
+
+class TestNormalizeAddress(object):
+    def test_normalized(self):
+        assert stampr.dedup.normalize_address(" 1 Main St.,\n\n  springfield  ") == "1 MAIN ST\nSPRINGFIELD"
+
+    def test_bytes(self):
+        assert stampr.dedup.normalize_address(b"1 main st") == "1 MAIN ST"
+
+
+class TestDuplicateIndex(object):
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "sent.dedup")
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def key(self, address="1 Main St", md5="abc", batch_id=1):
+        return stampr.dedup.DuplicateIndex.key(batch_id, address, md5)
+
+    def test_add(self):
+        index = stampr.dedup.DuplicateIndex()
+
+        assert index.add(self.key()) == False
+        assert index.add(self.key("1 main st.")) == True
+        assert self.key() in index
+        assert self.key(md5="def") not in index
+        assert self.key(batch_id=2) not in index
+        assert len(index) == 1
+
+    def test_persisted(self):
+        with stampr.dedup.DuplicateIndex(path=self.path) as index:
+            index.add(self.key())
+            index.add(self.key(md5="def"))
+
+        with open(self.path, "ab") as f:
+            f.write(b"half") # As if the process died while writing.
+
+        with stampr.dedup.DuplicateIndex(path=self.path) as index:
+            assert len(index) == 2
+            assert self.key() in index
+            assert index.add(self.key(md5="ghi")) == False
+
+        assert len(stampr.dedup.DuplicateIndex(path=self.path)) == 3
+
+    def test_bloom_filter(self):
+        index = stampr.dedup.DuplicateIndex(capacity=10000, error_rate=0.01)
+
+        for i in range(10000):
+            index.add(self.key(md5=str(i)))
+
+        assert all(self.key(md5=str(i)) in index for i in range(10000))
+        false_positives = sum(1 for i in range(10000, 20000) if self.key(md5=str(i)) in index)
+        assert false_positives < 300
+
+    def test_bloom_filter_persisted(self):
+        with stampr.dedup.DuplicateIndex(path=self.path, capacity=100) as index:
+            index.add(self.key())
+
+        assert self.key() in stampr.dedup.DuplicateIndex(path=self.path, capacity=100)
+
+    def test_bad_options(self):
+        with raises(ValueError):
+            stampr.dedup.DuplicateIndex(capacity=0)
+        with raises(ValueError):
+            stampr.dedup.DuplicateIndex(error_rate=2.0)
+
+
+class TestMailManyDuplicates(object):
+    def setup(self):
+        self.server = stampr.testing.FakeServer()
+        self.server.start()
+        self.client = self.server.client()
+
+        self.batch = stampr.batch.Batch()
+        self.batch.create()
+
+    def teardown(self):
+        self.client.close()
+        self.server.stop()
+
+    def items(self):
+        return [("1 Main St", "from", "<html>a</html>"), ("2 Main St", "from", "<html>a</html>"),
+                ("1 main st.", "from", "<html>a</html>"), ("1 Main St", "from", "<html>b</html>")]
+
+    def test_skip(self):
+        index = stampr.dedup.DuplicateIndex()
+        result = self.batch.mail_many(self.items(), dedup=index)
+
+        assert list(result.duplicates) == [2]
+        assert result.succeeded == 3
+        assert result.ids[2] == 0
+        assert len(self.server.mailings) == 3
+        assert len(index) == 3
+
+    def test_skip_between_runs(self):
+        index = stampr.dedup.DuplicateIndex()
+        self.batch.mail_many(self.items()[:2], dedup=index)
+
+        result = self.batch.mail_many(self.items(), dedup=index)
+
+        assert list(result.duplicates) == [0, 1, 2]
+        assert len(self.server.mailings) == 3
+
+    def test_flushed(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "sent.dedup")
+
+        try:
+            index = stampr.dedup.DuplicateIndex(path=path)
+            self.batch.mail_many(self.items()[:2], dedup=index)
+
+            # Without closing the index, as if the process died.
+            assert len(stampr.dedup.DuplicateIndex(path=path)) == 2
+            index.close()
+        finally:
+            shutil.rmtree(directory)
+
+    def test_flag(self):
+        result = self.batch.mail_many(self.items(), dedup=stampr.dedup.DuplicateIndex(), duplicates="flag")
+
+        assert list(result.duplicates) == [2]
+        assert result.succeeded == 4
+        assert len(self.server.mailings) == 4
+
+    def test_failed_not_recorded(self):
+        index = stampr.dedup.DuplicateIndex()
+        self.server.fail_next(1, 400)
+
+        result = self.batch.mail_many(self.items()[:1], dedup=index)
+
+        assert result.failed == 1
+        assert len(index) == 0
+
+    def test_bad_duplicates(self):
+        with raises(ValueError):
+            self.batch.mail_many([], dedup=stampr.dedup.DuplicateIndex(), duplicates="ignore")
@@ -0,0 +1,164 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import sys
+import os
+import json
+import base64
+import hashlib
+import threading
+
+from pytest import raises
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import stampr
+import stampr.testing
+import stampr.encoder
+import concurrent.futures
+from stampr.encoder import encode_payload, payload_format
+
+
+PDF = b"%PDF-1.4\n" + bytes(bytearray(range(256))) * 40
+
+
+class TestEncodePayload(object):
+    def check(self, payload, raw, format):
+        data, md5, payload_format = payload
+
+        assert payload_format == format
+        assert base64.b64decode(data) == raw
+        assert md5 == hashlib.md5(data).hexdigest()
+
+    def test_html(self):
+        self.check(encode_payload("<html>Hello</html>"), b"<html>Hello</html>", "html")
+
+    def test_pdf(self):
+        self.check(encode_payload(PDF), PDF, "pdf")
+
+    def test_json(self):
+        data = { "name": "Bob" }
+        self.check(encode_payload(data), json.dumps(data).encode("ascii"), "json")
+
+    def test_none(self):
+        assert encode_payload(None) == (None, None, "none")
+
+    def test_bad_data(self):
+        with raises(TypeError):
+            encode_payload(12)
+
+    def test_chunked_same(self):
+        for chunk_size in [1, 57, 100, 1000, 1000000]:
+            assert encode_payload(PDF, chunk_size) == encode_payload(PDF)
+
+    def test_payload_format(self):
+        assert payload_format(PDF) == "pdf"
+        assert payload_format(b"<html/>") == "html"
+
+    def test_same_as_mailing(self):
+        mailing = stampr.mailing.Mailing(batch_id=1, address="to", return_address="from", data=PDF)
+        params = mailing._mail_params()
+
+        assert (params["data"], params["md5"], params["format"]) == encode_payload(PDF)
+
+
+class TestEncoders(object):
+    def test_inline(self):
+        with stampr.encoder.Encoder() as encoder:
+            assert encoder.submit(PDF).result() == encode_payload(PDF)
+
+    def test_inline_error(self):
+        with raises(TypeError):
+            stampr.encoder.Encoder().submit(12).result()
+
+    def test_process_pool(self):
+        with stampr.encoder.ProcessPoolEncoder(workers=2) as encoder:
+            futures = [encoder.submit(PDF), encoder.submit("<html/>")]
+
+            assert [f.result() for f in futures] == [encode_payload(PDF), encode_payload("<html/>")]
+
+    def test_chunked(self):
+        with stampr.encoder.ChunkedEncoder(chunk_size=100) as encoder:
+            assert encoder.submit(PDF).result() == encode_payload(PDF)
+
+    def test_bad_workers(self):
+        with raises(ValueError):
+            stampr.encoder.ProcessPoolEncoder(workers=0)
+        with raises(ValueError):
+            stampr.encoder.ChunkedEncoder(workers=0)
+        with raises(ValueError):
+            stampr.encoder.ChunkedEncoder(chunk_size=0)
+
+
+class SlowEncoder(stampr.encoder.Encoder):
+    '''Encodes "slow" only once released (or after a while, in case nothing else is sent).'''
+
+    def __init__(self):
+        self.slow = concurrent.futures.Future()
+        self.timer = threading.Timer(5, self.release)
+        self.timer.start()
+
+    def submit(self, data):
+        if data == "slow":
+            return self.slow
+        return super(SlowEncoder, self).submit(data)
+
+    def release(self, *args):
+        if not self.slow.done():
+            self.slow.set_result(encode_payload("slow"))
+
+
+class TestMailManyWithEncoder(object):
+    def setup(self):
+        self.server = stampr.testing.FakeServer()
+        self.server.start()
+        self.client = self.server.client()
+        self.batch = stampr.batch.Batch()
+
+    def teardown(self):
+        self.client.close()
+        self.server.stop()
+
+    def items(self, count):
+        return [("to %d" % i, "from", PDF + str(i).encode("ascii")) for i in range(count)]
+
+    def test_sent(self):
+        with stampr.encoder.ChunkedEncoder() as encoder:
+            result = self.batch.mail_many(self.items(10), concurrency=4, encoder=encoder)
+
+        assert result.succeeded == 10
+        for i, mailing_id in enumerate(result.ids):
+            assert self.server.mailings[mailing_id]["data"] == encode_payload(PDF + str(i).encode("ascii"))[0] \
+                .decode("ascii")
+
+    def test_with_dedup(self):
+        items = self.items(3) + self.items(1)
+
+        with stampr.encoder.ProcessPoolEncoder(workers=2) as encoder:
+            result = self.batch.mail_many(items, encoder=encoder, dedup=stampr.dedup.DuplicateIndex())
+
+        assert result.succeeded == 3
+        assert list(result.duplicates) == [3]
+
+    def test_bad_data(self):
+        result = self.batch.mail_many([("to", "from", 12)], encoder=stampr.encoder.Encoder())
+
+        assert isinstance(result.errors[0], TypeError)
+
+    def test_encoded_not_held_up(self):
+        encoder = SlowEncoder()
+        sent = []
+
+        def response(event):
+            if event.method == "POST" and event.path == ("mailings", ):
+                sent.append(event)
+                if len(sent) == 3:
+                    encoder.release()
+
+        self.client.add_hook("after_response", response)
+        try:
+            result = self.batch.mail_many([("to 0", "from", "slow")] + self.items(3), concurrency=1, encoder=encoder)
+        finally:
+            encoder.timer.cancel()
+
+        # The only sending thread didn't wait for the slow item, so the others were sent first.
+        assert result.succeeded == 4
+        assert max(result.ids) == result.ids[0]
@@ -0,0 +1,171 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import sys
+import os
+import io
+import csv
+import gzip
+import json
+import datetime
+import shutil
+import tempfile
+
+from pytest import raises
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import stampr
+import stampr.testing
+import stampr.export
+from stampr.exceptions import HTTPError
+
+
+class Test(object):
+    def setup(self):
+        self.server = stampr.testing.FakeServer()
+        self.server.page_size = 2
+        self.server.start()
+        self.client = self.server.client()
+        self.directory = tempfile.mkdtemp()
+
+        self.batch = stampr.batch.Batch()
+        self.mailings = [self.mail(i) for i in range(5)]
+        self.server.request_counts.clear()
+
+        self.start = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+        self.finish = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+
+    def teardown(self):
+        self.client.close()
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def mail(self, i):
+        with self.batch.mailing() as m:
+            m.address = "to %d" % i
+            m.return_address = "from"
+            m.data = "<html>%d</html>" % i
+        return m
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def export(self, name, **options):
+        return stampr.export.export_mailings(self.path(name), self.start, self.finish, **options)
+
+    def lines(self, name):
+        opener = gzip.open if name.endswith(".gz") else io.open
+        with opener(self.path(name), "rb") as f:
+            return f.read().decode("utf-8").splitlines()
+
+    def pages(self):
+        return self.server.request_counts.get("GET mailings/browse", 0)
+
+
+class TestExport(Test):
+    def test_jsonl(self):
+        assert self.export("mailings.jsonl") == 5
+
+        records = [json.loads(line) for line in self.lines("mailings.jsonl")]
+        assert [r["mailing_id"] for r in records] == [m.id for m in self.mailings]
+        assert records[0]["returnaddress"] == "from"
+        assert "data" not in records[0]
+
+    def test_csv(self):
+        self.export("mailings.csv")
+
+        rows = list(csv.DictReader(self.lines("mailings.csv")))
+        assert [int(r["mailing_id"]) for r in rows] == [m.id for m in self.mailings]
+        assert rows[0]["address"] == "to 0"
+
+    def test_gzip(self):
+        self.export("mailings.csv.gz")
+
+        assert len(self.lines("mailings.csv.gz")) == 6
+
+    def test_empty_csv(self):
+        assert stampr.export.export_mailings(self.path("none.csv"), self.finish, self.finish) == 0
+
+        assert self.lines("none.csv") == [",".join(stampr.export.MAILING_COLUMNS)]
+
+    def test_batches(self):
+        assert stampr.export.export_batches(self.path("batches.jsonl"), self.start, self.finish) == 1
+
+        assert json.loads(self.lines("batches.jsonl")[0])["batch_id"] == self.batch.id
+
+    def test_bad_format(self):
+        with raises(ValueError):
+            self.export("mailings.xml", format="xml")
+
+    def test_finished_not_repeated(self):
+        self.export("mailings.jsonl")
+        self.server.request_counts.clear()
+
+        assert self.export("mailings.jsonl") == 5
+        assert self.pages() == 0
+
+    def test_restart(self):
+        self.export("mailings.jsonl")
+
+        assert self.export("mailings.jsonl", resume=False) == 5
+        assert len(self.lines("mailings.jsonl")) == 5
+
+    def test_different_export(self):
+        self.export("mailings.jsonl")
+
+        with raises(ValueError):
+            self.export("mailings.jsonl", status="error")
+
+
+class Failing(object):
+    '''Client that fails to get one page.'''
+
+    page_window = 1
+
+    def __init__(self, client, page):
+        self.client = client
+        self.page = page
+        self.pages = []
+
+    def get(self, path):
+        self.pages.append(path[-1])
+        if path[-1] == self.page:
+            raise HTTPError(503, "Service unavailable")
+        return self.client.get(path)
+
+
+class TestExportResume(Test):
+    def test_resumed(self):
+        failing = Failing(self.client, 1)
+
+        with raises(HTTPError):
+            self.export("mailings.csv.gz", client=failing)
+
+        assert len(self.lines("mailings.csv.gz")) == 3 # Header and first page.
+
+        resumed = Failing(self.client, None)
+        assert self.export("mailings.csv.gz", client=resumed) == 5
+
+        assert resumed.pages == [1, 2, 3]
+        assert [int(r["mailing_id"]) for r in csv.DictReader(self.lines("mailings.csv.gz"))] == \
+            [m.id for m in self.mailings]
+
+    def test_partial_page_discarded(self):
+        path = self.path("mailings.jsonl")
+        self.export("mailings.jsonl")
+
+        with open(path + ".checkpoint") as f:
+            checkpoint = json.load(f)
+
+        # As if the process died while writing the third page, after recording the second.
+        with io.open(path, "ab") as f:
+            f.write(b'{"mailing_id": 99, "hal')
+        checkpoint.update(page=2, count=4, complete=False)
+        checkpoint["offset"] = len("\n".join(self.lines("mailings.jsonl")[:4]) + "\n")
+        with open(path + ".checkpoint", "w") as f:
+            json.dump(checkpoint, f)
+        self.server.request_counts.clear()
+
+        assert self.export("mailings.jsonl") == 5
+        assert [json.loads(line)["mailing_id"] for line in self.lines("mailings.jsonl")] == \
+            [m.id for m in self.mailings]
+        assert self.pages() == 2 # The third page, and the empty one after it.
@@ -0,0 +1,107 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import sys
+import os
+import asyncio
+
+from pytest import raises
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import stampr
+import stampr.hooks
+import stampr.testing
+
+
+class Test(object):
+    def setup(self):
+        self.server = stampr.testing.FakeServer()
+        self.server.start()
+        self.client = self.server.client(retry=stampr.retry.RetryPolicy(backoff=0, total=1))
+
+        self.events = []
+        for event in stampr.hooks.Hooks.EVENTS:
+            self.client.add_hook(event, lambda details, event=event: self.events.append((event, details)))
+
+    def teardown(self):
+        self.client.close()
+        self.server.stop()
+
+
+class TestHooksRegistration(Test):
+    def test_bad_event(self):
+        with raises(ValueError):
+            self.client.add_hook("after_lunch", lambda event: None)
+
+    def test_bad_callback(self):
+        with raises(TypeError):
+            self.client.add_hook("on_error", 12)
+
+    def test_remove(self):
+        callback = lambda event: None
+        self.client.add_hook("on_error", callback)
+        self.client.remove_hook("on_error", callback)
+
+        assert callback not in self.client._hooks["on_error"]
+
+    def test_not_shared_between_clients(self):
+        other = self.server.client()
+        assert other._hooks == {}
+
+
+class TestHooksEvents(Test):
+    def test_success(self):
+        self.client.post(("configs", ), size="standard", turnaround="threeday", style="color", output="single",
+                         returnenvelope=False)
+
+        assert [name for name, _ in self.events] == ["before_request", "after_response"]
+
+        event = self.events[1][1]
+        assert event.method == "POST"
+        assert event.path == ("configs", )
+        assert event.status_code == 200
+        assert event.request_bytes > 50
+        assert event.response_bytes > 50
+        assert event.duration > 0
+        assert event.retries == 0
+        assert event.error is None
+
+    def test_retries(self):
+        self.server.fail_next(1)
+        self.client.get(("test", "ping"))
+
+        assert [(name, e.retries, e.status_code) for name, e in self.events] == [
+                ("before_request", 0, 503),
+                ("after_response", 0, 503),
+                ("before_request", 1, 200),
+                ("after_response", 1, 200),
+        ]
+
+    def test_error(self):
+        self.server.fail_next(2)
+
+        with raises(stampr.exceptions.HTTPError):
+            self.client.get(("test", "ping"))
+
+        name, event = self.events[-1]
+        assert name == "on_error"
+        assert event.status_code == 503
+        assert event.retries == 1
+        assert isinstance(event.error, stampr.exceptions.HTTPError)
+
+
+class TestHooksAsync(Test):
+    def test_events(self):
+        import stampr.aio
+
+        async def run():
+            async with stampr.aio.AsyncClient("user", "pass", base_uri=self.server.base_uri) as client:
+                client.add_hook("after_response", lambda event: self.events.append(("after_response", event)))
+                await client.get(("test", "ping"))
+
+        self.events = []
+        asyncio.new_event_loop().run_until_complete(run())
+
+        event = self.events[0][1]
+        assert event.path == ("test", "ping")
+        assert event.status_code == 200
+        assert event.response_bytes > 0
@@ -0,0 +1,150 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import sys
+import os
+import shutil
+import signal
+import tempfile
+
+from pytest import raises
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import stampr
+import stampr.testing
+import stampr.journal
+
+
+class Test(object):
+    def setup(self):
+        self.server = stampr.testing.FakeServer()
+        self.server.start()
+        self.client = self.server.client()
+
+        self.batch = stampr.batch.Batch()
+        self.batch.create()
+
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "send.journal")
+
+    def teardown(self):
+        self.client.close()
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+
+def recipients(count, fail_at=None, on_item=None):
+    for i in range(count):
+        if i == fail_at:
+            raise RuntimeError("worker died")
+        if on_item is not None:
+            on_item(i)
+        yield ("to %d" % i, "from", "<html>%d</html>" % i)
+
+
+class TestJournal(Test):
+    def test_records_submissions(self):
+        with stampr.journal.Journal(self.path) as journal:
+            result = self.batch.mail_many(recipients(10), journal=journal)
+
+            assert journal.batch_id == self.batch.id
+            assert journal.confirmed == 10
+
+            key, mailing_id, md5 = journal.entry(3)
+            assert mailing_id == result.ids[3]
+            assert len(md5) == 32
+            assert journal.entry(10) is None
+
+    def test_resume_after_crash(self):
+        with stampr.journal.Journal(self.path) as journal:
+            with raises(RuntimeError):
+                self.batch.mail_many(recipients(20, fail_at=12), concurrency=4, journal=journal)
+
+        with stampr.journal.Journal(self.path) as journal:
+            result = self.batch.mail_many(recipients(20), concurrency=4, journal=journal)
+
+            assert journal.confirmed == 20
+
+        assert result.succeeded == 20
+        assert result.skipped > 0
+        assert len(self.server.mailings) == 20
+        assert sorted(m["address"] for m in self.server.mailings.values()) == sorted("to %d" % i for i in range(20))
+
+    def test_unconfirmed_resent_with_same_key(self):
+        # As if the process died after the mailing was sent, but before it was recorded as accepted.
+        with stampr.journal.Journal(self.path) as journal:
+            journal.begin(self.batch.id)
+            key = journal.intend(0)
+
+        with self.client.idempotency_key(key):
+            mailing = self.batch.mailing()
+            mailing.address, mailing.return_address, mailing.data = next(recipients(1))
+            mailing.mail()
+
+        with stampr.journal.Journal(self.path) as journal:
+            result = self.batch.mail_many(recipients(3), journal=journal)
+
+        assert result.skipped == 0
+        assert len(self.server.mailings) == 3
+
+    def test_different_batch(self):
+        with stampr.journal.Journal(self.path) as journal:
+            self.batch.mail_many(recipients(1), journal=journal)
+
+            other = stampr.batch.Batch()
+            with raises(ValueError):
+                other.mail_many(recipients(1), journal=journal)
+
+    def test_sigterm_drains(self):
+        def terminate(i):
+            if i == 5:
+                os.kill(os.getpid(), signal.SIGTERM)
+
+        previous = signal.getsignal(signal.SIGTERM)
+
+        with stampr.journal.Journal(self.path) as journal:
+            result = self.batch.mail_many(recipients(100, on_item=terminate), concurrency=2, journal=journal)
+
+            assert result.cancelled
+            assert result.succeeded == journal.confirmed == len(self.server.mailings)
+            assert result.count < 100
+
+        assert signal.getsignal(signal.SIGTERM) == previous
+
+    def test_batched_syncs(self):
+        with stampr.journal.Journal(self.path, sync_every=3, sync_interval=1000) as journal:
+            journal.begin(self.batch.id)
+            for i in range(4):
+                journal.intend(i)
+            journal.sync()
+
+            for i in range(4):
+                journal.confirm(i, i + 1, "md5")
+
+            # Another connection only sees what has been written.
+            with stampr.journal.Journal(self.path) as other:
+                assert other.confirmed == 3
+
+        with stampr.journal.Journal(self.path) as journal:
+            assert journal.confirmed == 4
+
+    def test_bad_options(self):
+        with raises(ValueError):
+            stampr.journal.Journal(self.path, sync_every=0)
+
+
+class TestIdempotencyKey(Test):
+    def mail(self):
+        with self.batch.mailing() as mailing:
+            mailing.address, mailing.return_address, mailing.data = "to", "from", "<html></html>"
+        return mailing.id
+
+    def test_key_sent(self):
+        with self.client.idempotency_key("abc"):
+            first = self.mail()
+            second = self.mail()
+
+        third = self.mail()
+
+        assert first == second
+        assert third != first
+        assert len(self.server.mailings) == 2
@@ -16,6 +16,7 @@ from .helper import json_data, json_str, to_bytes
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import stampr
+import stampr.testing
 
 class Test(object):
     def setup(self):
@@ -278,6 +279,104 @@ class TestMailingSync(Test):
         with raises(stampr.exceptions.APIError):
             self.uncreated.sync()
 
+    def test_list_response(self):
+        data = json_data("mailing_create")
+        data['status'] = 'render'
+
+        (flexmock(stampr.client.Client.current)
+                .should_receive("_api")
+                .with_args("get", ("mailings", 2))
+                .and_return([data]))
+
+        self.created.sync()
+        assert self.created.status == "render"
+
+    def test_no_such_mailing(self):
+        (flexmock(stampr.client.Client.current)
+                .should_receive("_api")
+                .with_args("get", ("mailings", 2))
+                .and_return([]))
+
+        with raises(stampr.exceptions.RequestError):
+            self.created.sync()
+
+
+class TestMailingSyncMany(object):
+    def setup(self):
+        self.server = stampr.testing.FakeServer(page_size=5)
+        self.server.start()
+        self.client = self.server.client()
+
+    def teardown(self):
+        self.client.close()
+        self.server.stop()
+
+    def mail(self, count):
+        batch = stampr.batch.Batch(config=stampr.config.Config())
+        return list(batch.mail_many(("to %d" % i, "from", "<html></html>") for i in range(count)).ids)
+
+    def mailings(self, ids):
+        return [stampr.mailing.Mailing(mailing_id=id, batch_id=self.server.mailings[id]["batch_id"], status="received")
+                for id in ids]
+
+    def test_browses_large_batches(self):
+        ids = self.mail(12)
+        mailings = self.mailings(ids)
+        self.server.set_status(ids[:3], "printed")
+
+        changed = stampr.mailing.Mailing.sync_many(mailings)
+
+        assert changed == mailings[:3]
+        assert [m.status for m in mailings] == ["printed"] * 3 + ["received"] * 9
+        assert self.server.request_counts["GET batches/:id/browse"] == 3 # Every mailing is seen by the third page.
+        assert "GET mailings/:id" not in self.server.request_counts
+
+    def test_stops_browsing_when_all_seen(self):
+        ids = sorted(self.mail(30)) # Sent concurrently, so in no particular order.
+        self.server.set_status(ids[:10], "printed")
+
+        assert len(stampr.mailing.Mailing.sync_many(self.mailings(ids[:10]))) == 10
+        assert self.server.request_counts["GET batches/:id/browse"] == 2
+        assert "GET mailings/:id" not in self.server.request_counts
+
+    def test_gets_few_in_large_batch(self):
+        ids = sorted(self.mail(30))
+        mailings = self.mailings(ids[-10:])
+        self.server.set_status(ids[-1:], "printed")
+
+        assert stampr.mailing.Mailing.sync_many(mailings) == mailings[-1:]
+        # The first page holds none of them, so the rest of the batch isn't browsed.
+        assert self.server.request_counts["GET batches/:id/browse"] == 1
+        assert self.server.request_counts["GET mailings/:id"] == 10
+
+    def test_gets_small_batches(self):
+        ids = self.mail(12) + self.mail(2)
+        mailings = self.mailings(ids[-2:] + ids[:1])
+        self.server.set_status(ids[-1:], "shipped")
+
+        changed = stampr.mailing.Mailing.sync_many(mailings, browse_threshold=5)
+
+        assert changed == mailings[1:2]
+        assert mailings[1].status == "shipped"
+        assert self.server.request_counts["GET mailings/:id"] == 3
+        assert "GET batches/:id/browse" not in self.server.request_counts
+
+    def test_missing_from_browse(self):
+        ids = self.mail(3)
+        mailings = self.mailings(ids)
+        mailings[0]._id = 999 # Not in the batch, so must be got by id (and is then not found).
+
+        assert stampr.mailing.Mailing.sync_many(mailings, browse_threshold=1) == []
+        assert self.server.request_counts["GET mailings/:id"] == 1
+
+    def test_not_created(self):
+        with raises(stampr.exceptions.APIError):
+            stampr.mailing.Mailing.sync_many([stampr.mailing.Mailing(batch_id=1)])
+
+    def test_bad_mailings(self):
+        with raises(TypeError):
+            stampr.mailing.Mailing.sync_many([1, 2])
+
 class TestMailingIndexing(Test):
     def test_no_authentication(self):
         stampr.client.Client._current = stampr.client.NullClient()
@@ -3,6 +3,7 @@ from __future__ import absolute_import, unicode_literals, print_function, divisi
 import sys
 import os
 import datetime
+import subprocess
 
 from pytest import raises
 from flexmock import flexmock
@@ -40,4 +41,26 @@ class TestMail(object):
             .and_return(new_mailing))
 
         mailing = stampr.mail("from", "to", "body")
-        assert mailing == new_mailing
\ No newline at end of file
+        assert mailing == new_mailing
+
+class TestImport(object):
+    def test_lazy(self):
+        code = "import sys, stampr; print(' '.join(m for m in ['requests', 'dateutil', 'stampr.client', 'stampr.mailing'] if m in sys.modules))"
+        output = subprocess.check_output([sys.executable, "-c", code], cwd=os.path.join(os.path.dirname(__file__), '..'))
+
+        assert output.strip() == b""
+
+    def test_submodules_loaded_on_use(self):
+        assert stampr.batch.Batch.STATUSES == ["processing", "hold", "archive"]
+
+    def test_no_environment_changes(self):
+        code = "import os, stampr; stampr.client.Client('u', 'p', check_credentials='lazy').session; print(os.environ.get('REQUESTS_CA_BUNDLE', ''))"
+        env = dict(os.environ)
+        env.pop("REQUESTS_CA_BUNDLE", None)
+        output = subprocess.check_output([sys.executable, "-c", code], cwd=os.path.join(os.path.dirname(__file__), '..'), env=env)
+
+        assert output.strip() == b""
+
+    def test_bad_attribute(self):
+        with raises(AttributeError):
+            stampr.fish
@@ -0,0 +1,189 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import sys
+import os
+import datetime
+import time
+
+from pytest import raises
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import stampr
+import stampr.testing
+import stampr.pagination
+
+
+class Test(object):
+    def setup(self):
+        self.server = stampr.testing.FakeServer(page_size=2)
+        self.server.start()
+        self.client = self.server.client()
+
+        self.start = datetime.datetime(2000, 1, 1, 0, 0, 0)
+        self.finish = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+
+        self.batch = stampr.batch.Batch(config=stampr.config.Config())
+        self.batch.create()
+
+        for i in range(5):
+            with self.batch.mailing() as m:
+                m.address = "address %d" % i
+                m.return_address = "return address"
+                m.data = "<html>%d</html>" % i
+
+    def teardown(self):
+        self.client.close()
+        self.server.stop()
+
+
+class TestIterPages(Test):
+    def test_pages(self):
+        search = ("mailings", "browse", self.start.isoformat(), self.finish.isoformat())
+        pages = list(stampr.pagination.iter_pages(search))
+
+        assert [len(page) for page in pages] == [2, 2, 1]
+        assert self.server.request_counts["GET mailings/browse"] == 4
+
+    def test_records(self):
+        search = ("mailings", "browse", self.start.isoformat(), self.finish.isoformat())
+        records = list(stampr.pagination.iter_records(search, client=self.client))
+
+        assert [r["mailing_id"] for r in records] == [1, 2, 3, 4, 5]
+
+    def test_start(self):
+        search = ("mailings", "browse", self.start.isoformat(), self.finish.isoformat())
+
+        for window in [1, 4]:
+            pages = list(stampr.pagination.iter_pages(search, window=window, start=1))
+            assert [[r["mailing_id"] for r in page] for page in pages] == [[3, 4], [5]]
+
+    def test_bad_search(self):
+        with raises(TypeError):
+            stampr.pagination.iter_pages("mailings/browse")
+
+    def test_bad_start(self):
+        with raises(ValueError):
+            stampr.pagination.iter_pages(("configs", "browse", "all"), start=-1)
+
+    def test_bad_window(self):
+        with raises(ValueError):
+            stampr.pagination.iter_pages(("configs", "browse", "all"), window=0)
+
+
+class Recorder(object):
+    '''Client that records the page numbers requested.'''
+
+    page_window = 1
+
+    def __init__(self, client):
+        self.client = client
+        self.pages = []
+
+    def get(self, path):
+        self.pages.append(path[-1])
+        return self.client.get(path)
+
+
+class TestWindow(Test):
+    def search(self):
+        return ("mailings", "browse", self.start.isoformat(), self.finish.isoformat())
+
+    def pages(self, window):
+        recorder = Recorder(self.client)
+        pages = list(stampr.pagination.iter_pages(self.search(), recorder, window))
+        return [len(page) for page in pages], sorted(recorder.pages)
+
+    def test_in_order(self):
+        records = list(stampr.pagination.iter_records(self.search(), window=4))
+
+        assert [r["mailing_id"] for r in records] == [1, 2, 3, 4, 5]
+
+    def test_stops_at_short_page(self):
+        lengths, requested = self.pages(2)
+
+        # Pages 0 and 1, then 2 and 3 as each arrived; page 2 is short, so page 4 is never requested (and page 3 may
+        # have been cancelled before it was sent).
+        assert lengths == [2, 2, 1]
+        assert requested[:3] == [0, 1, 2]
+        assert max(requested) <= 3
+
+    def test_stops_at_empty_page(self):
+        with self.batch.mailing() as m:
+            m.address = "address 5"
+            m.return_address = "return address"
+            m.data = "<html>5</html>"
+
+        lengths, requested = self.pages(2)
+
+        # Page 4 was requested along with page 3, but may have been cancelled before it was sent.
+        assert lengths == [2, 2, 2]
+        assert requested[:4] == [0, 1, 2, 3]
+        assert max(requested) <= 4
+
+    def test_window_larger_than_results(self):
+        lengths, requested = self.pages(10)
+
+        assert lengths == [2, 2, 1]
+        assert requested[:3] == [0, 1, 2]
+        # Pages 10 and 11 may have been requested as full pages 0 and 1 arrived.
+        assert max(requested) <= 11
+
+    def test_client_default(self):
+        with self.server.client(page_window=3) as client:
+            assert client.page_window == 3
+
+            mailings = stampr.mailing.Mailing.browse(self.start, self.finish)
+
+            assert [m.id for m in mailings] == [1, 2, 3, 4, 5]
+
+    def test_errors_raised(self):
+        self.server.fail_next(10, 404)
+
+        with raises(stampr.exceptions.HTTPError):
+            list(stampr.pagination.iter_pages(self.search(), window=2))
+
+    def test_concurrent(self):
+        self.server.latency = 0.1
+        started = time.time()
+
+        pages = list(stampr.pagination.iter_pages(self.search(), window=8))
+
+        assert len(pages) == 3
+        assert time.time() - started < 0.3
+
+
+class TestIterBrowse(Test):
+    def test_first_result_after_one_page(self):
+        mailings = stampr.mailing.Mailing.iter_browse(self.start, self.finish)
+        assert self.server.request_counts.get("GET mailings/browse", 0) == 0
+
+        mailing = next(mailings)
+        assert isinstance(mailing, stampr.mailing.Mailing)
+        assert mailing.id == 1
+        assert self.server.request_counts["GET mailings/browse"] == 1
+
+        assert [m.id for m in mailings] == [2, 3, 4, 5]
+
+    def test_same_as_browse(self):
+        browsed = stampr.mailing.Mailing.browse(self.start, self.finish, batch=self.batch)
+        iterated = stampr.mailing.Mailing.iter_browse(self.start, self.finish, batch=self.batch)
+
+        assert [m.id for m in browsed] == [m.id for m in iterated]
+
+    def test_arguments_checked_immediately(self):
+        with raises(TypeError):
+            stampr.mailing.Mailing.iter_browse(1, self.finish)
+
+        with raises(ValueError):
+            stampr.batch.Batch.iter_browse(self.start, self.finish, status="fish")
+
+    def test_batches(self):
+        batches = list(stampr.batch.Batch.iter_browse(self.start, self.finish))
+
+        assert [b.id for b in batches] == [self.batch.id]
+
+    def test_configs(self):
+        configs = list(stampr.config.Config.iter_all())
+
+        assert len(configs) == 1
+        assert all(isinstance(c, stampr.config.Config) for c in configs)
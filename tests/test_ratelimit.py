@@ -0,0 +1,141 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import sys
+import os
+import threading
+
+from pytest import raises
+from flexmock import flexmock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import stampr
+import stampr.ratelimit
+
+
+class Clock(object):
+    '''Stand-in for time.time(), which only moves when told to.'''
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Test(object):
+    def setup(self):
+        self.clock = Clock()
+        flexmock(stampr.ratelimit.time).should_receive("time").replace_with(self.clock)
+        self.limiter = stampr.ratelimit.RateLimiter(rate=10, burst=5)
+
+
+class TestRateLimiterInit(Test):
+    def test_defaults(self):
+        limiter = stampr.ratelimit.RateLimiter()
+        assert limiter.rate == 10
+        assert limiter.burst == 10
+
+    def test_bad_rate(self):
+        with raises(ValueError):
+            stampr.ratelimit.RateLimiter(rate=0)
+
+    def test_bad_decrease(self):
+        with raises(ValueError):
+            stampr.ratelimit.RateLimiter(decrease=1)
+
+    def test_bad_min_rate(self):
+        with raises(ValueError):
+            stampr.ratelimit.RateLimiter(rate=10, min_rate=20)
+
+
+class TestRateLimiterReserve(Test):
+    def test_burst_is_free(self):
+        assert [self.limiter.reserve() for _ in range(5)] == [0] * 5
+
+    def test_queue_after_burst(self):
+        for _ in range(5):
+            self.limiter.reserve()
+
+        assert self.limiter.reserve() == 0.1
+        assert self.limiter.reserve() == 0.2
+
+    def test_refill(self):
+        for _ in range(5):
+            self.limiter.reserve()
+
+        self.clock.now += 0.35
+        assert [self.limiter.reserve() for _ in range(3)] == [0] * 3
+        assert self.limiter.reserve() > 0
+
+    def test_acquire_sleeps(self):
+        for _ in range(5):
+            self.limiter.reserve()
+
+        flexmock(stampr.ratelimit.time).should_receive("sleep").with_args(0.1).once()
+        self.limiter.acquire()
+
+    def test_threads_share_the_bucket(self):
+        delays = []
+        threads = [threading.Thread(target=lambda: delays.append(self.limiter.reserve())) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(round(d, 6) for d in delays) == [0] * 5 + [round(0.1 * i, 6) for i in range(1, 16)]
+
+
+class TestRateLimiterAdapt(Test):
+    def test_decrease_on_throttle(self):
+        self.limiter.on_response(429)
+        assert self.limiter.rate == 5
+
+    def test_decrease_once_for_a_burst_of_throttles(self):
+        self.limiter.on_response(429)
+        self.limiter.on_response(503)
+        assert self.limiter.rate == 5
+
+        self.clock.now += 1
+        self.limiter.on_response(503)
+        assert self.limiter.rate == 2.5
+
+    def test_min_rate(self):
+        for _ in range(10):
+            self.limiter.on_response(429)
+            self.clock.now += 1
+
+        assert self.limiter.rate == 0.5
+
+    def test_recover(self):
+        self.limiter.on_response(429)
+
+        for _ in range(100):
+            self.limiter.on_response(200)
+
+        assert self.limiter.rate == self.limiter.max_rate
+
+    def test_ignore_other_errors(self):
+        self.limiter.on_response(404)
+        self.limiter.on_response(None)
+        assert self.limiter.rate == 10
+
+
+class TestClientRateLimit(object):
+    def test_every_request_takes_a_token(self):
+        limiter = stampr.ratelimit.RateLimiter()
+
+        (flexmock(stampr.client.Client).should_receive("ping").once())
+        client = stampr.client.Client("user", "pass", rate_limit=limiter)
+
+        (flexmock(client.session)
+                .should_receive("send")
+                .and_return(flexmock(status_code=200, json=lambda: {}))
+                .once())
+        flexmock(limiter).should_receive("acquire").once()
+        flexmock(limiter).should_receive("on_response").with_args(200).once()
+
+        client.get(("test", "ping"))
+
+    def test_bad_limiter(self):
+        with raises(TypeError):
+            stampr.client.Client("user", "pass", rate_limit=10)
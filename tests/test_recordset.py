@@ -0,0 +1,175 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import sys
+import os
+import array
+import datetime
+
+from pytest import raises, importorskip
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import stampr
+import stampr.testing
+import stampr.recordset
+
+
+class Test(object):
+    def setup(self):
+        self.server = stampr.testing.FakeServer()
+        self.server.page_size = 3
+        self.server.start()
+        self.client = self.server.client()
+
+        self.batch = stampr.batch.Batch()
+        self.mailings = [self.mail(i) for i in range(7)]
+        self.server.set_status([m.id for m in self.mailings[:2]], "error")
+
+        self.start = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+        self.finish = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+
+    def teardown(self):
+        self.client.close()
+        self.server.stop()
+
+    def mail(self, i):
+        with self.batch.mailing() as m:
+            m.address = "to %d" % i
+            m.return_address = "from"
+            m.data = "<html>%d</html>" % i
+        return m
+
+
+class TestMailingRecordSet(Test):
+    def setup(self):
+        super(TestMailingRecordSet, self).setup()
+        self.records = stampr.mailing.Mailing.browse_records(self.start, self.finish)
+
+    def test_columns(self):
+        assert len(self.records) == 7
+        assert isinstance(self.records.column("mailing_id"), array.array)
+        assert sorted(self.records.column("mailing_id")) == sorted(m.id for m in self.mailings)
+        assert set(self.records.column("return_address")) == set(["from"])
+
+    def test_strings_stored_once(self):
+        statuses = self.records.filter(status="received").column("status")
+        assert all(s is statuses[0] for s in statuses)
+
+    def test_bad_column(self):
+        with raises(ValueError):
+            self.records.column("data")
+
+    def test_getitem(self):
+        mailing = self.records[0]
+
+        assert isinstance(mailing, stampr.mailing.Mailing)
+        assert mailing.id == self.records.column("mailing_id")[0]
+        assert mailing.batch_id == self.batch.id
+        assert mailing.return_address == "from"
+        assert mailing.data is None
+
+    def test_slice(self):
+        records = self.records[1:3]
+
+        assert isinstance(records, stampr.recordset.MailingRecordSet)
+        assert list(records.column("mailing_id")) == list(self.records.column("mailing_id")[1:3])
+
+    def test_iter(self):
+        assert sorted(m.id for m in self.records) == sorted(m.id for m in self.mailings)
+
+    def test_row(self):
+        row = self.records.row(0)
+
+        assert row["address"] == self.records[0].address
+        assert "data" not in row
+
+    def test_filter(self):
+        errors = self.records.filter(status="error")
+
+        assert isinstance(errors, stampr.recordset.MailingRecordSet)
+        assert sorted(errors.column("mailing_id")) == sorted(m.id for m in self.mailings[:2])
+
+    def test_filter_several(self):
+        records = self.records.filter(status=["error", "shipped"], address="to 1")
+
+        assert list(records.column("mailing_id")) == [self.mailings[1].id]
+
+    def test_filter_none(self):
+        assert len(self.records.filter(status="shipped")) == 0
+
+    def test_count_by_status(self):
+        assert self.records.count_by_status() == { "error": 2, "received": 5 }
+
+    def test_to_numpy(self):
+        try:
+            import numpy
+        except ImportError:
+            with raises(ImportError):
+                self.records.to_numpy()
+        else:
+            columns = self.records.to_numpy()
+            assert columns["mailing_id"].dtype == numpy.int64
+            assert list(columns["mailing_id"]) == list(self.records.column("mailing_id"))
+
+    def test_to_arrow(self):
+        importorskip("pyarrow")
+
+        table = self.records.to_arrow()
+        assert table.num_rows == 7
+
+    def test_to_arrow_without_pyarrow(self):
+        pyarrow = sys.modules.get("pyarrow")
+        sys.modules["pyarrow"] = None # So importing it fails, whether or not it is installed.
+        try:
+            with raises(ImportError):
+                self.records.to_arrow()
+        finally:
+            if pyarrow is None:
+                del sys.modules["pyarrow"]
+            else:
+                sys.modules["pyarrow"] = pyarrow
+
+
+class TestMailingRecordSetBrowse(Test):
+    def test_status(self):
+        records = stampr.mailing.Mailing.browse_records(self.start, self.finish, status="error")
+
+        assert sorted(records.column("mailing_id")) == sorted(m.id for m in self.mailings[:2])
+
+    def test_bad_start(self):
+        with raises(TypeError):
+            stampr.mailing.Mailing.browse_records(0, self.finish)
+
+
+class TestBatchRecordSet(Test):
+    def test_browse(self):
+        records = stampr.batch.Batch.browse_records(self.start, self.finish)
+
+        assert list(records.column("batch_id")) == [self.batch.id]
+        assert records.count_by_status() == { "processing": 1 }
+        assert records[0].id == self.batch.id
+        assert records.row(0)["template"] is None
+
+
+class TestConfigRecordSet(Test):
+    def test_all(self):
+        records = stampr.config.Config.all_records()
+
+        assert len(records) == 1
+        assert records[0].id == records.row(0)["config_id"]
+        assert records[0].return_envelope is False
+
+
+class TestRecordSet(object):
+    def test_none_ints(self):
+        records = stampr.recordset.BatchRecordSet([{ "batch_id": 3, "status": "hold" }])
+
+        assert records.column("config_id")[0] == 0
+        assert records.row(0)["config_id"] is None
+
+    def test_extend(self):
+        records = stampr.recordset.BatchRecordSet()
+        records.extend([{ "batch_id": 1 }, { "batch_id": 2 }])
+        records.append({ "batch_id": 3 })
+
+        assert list(records.column("batch_id")) == [1, 2, 3]
+        assert repr(records) == "<BatchRecordSet rows=3>"
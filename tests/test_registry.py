@@ -0,0 +1,158 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import sys
+import os
+import json
+import shutil
+import tempfile
+import threading
+
+from pytest import raises
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import stampr
+import stampr.testing
+import stampr.registry
+
+
+class Test(object):
+    def setup(self):
+        self.server = stampr.testing.FakeServer()
+        self.server.start()
+        self.directory = tempfile.mkdtemp()
+
+    def teardown(self):
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def posts(self):
+        return self.server.request_counts.get("POST configs", 0)
+
+    def seeds(self):
+        return self.server.request_counts.get("GET configs/browse/all", 0)
+
+
+class TestConfigRegistry(Test):
+    def test_default_registry(self):
+        client = self.server.client()
+
+        assert isinstance(client.config_registry, stampr.registry.ConfigRegistry)
+        assert client.config_registry.path is None
+
+    def test_disabled(self):
+        self.server.client(config_registry=False)
+
+        assert stampr.config.Config().id != stampr.config.Config().id
+        assert self.posts() == 2
+
+    def test_bad_registry(self):
+        with raises(TypeError):
+            self.server.client(config_registry="configs.json")
+
+    def test_reused(self):
+        self.server.client()
+
+        ids = set(stampr.config.Config().id for _ in range(5))
+
+        assert len(ids) == 1
+        assert self.posts() == 1
+        assert self.seeds() == 1
+
+    def test_different_settings(self):
+        self.server.client()
+
+        assert stampr.config.Config().id != stampr.config.Config(return_envelope=True).id
+        assert self.posts() == 2
+
+    def test_seeded_from_existing(self):
+        self.server.client(config_registry=False)
+        existing = stampr.config.Config(return_envelope=True).id
+
+        self.server.client()
+
+        assert stampr.config.Config(return_envelope=True).id == existing
+        assert self.posts() == 1
+
+    def test_seeded_once(self):
+        self.server.client()
+
+        stampr.config.Config().create()
+        stampr.config.Config(return_envelope=True).create()
+
+        assert self.seeds() == 1
+
+    def test_mail_reuses_config(self):
+        self.server.client()
+
+        for i in range(3):
+            stampr.mail("from", "to %d" % i, "<html>%d</html>" % i)
+
+        assert self.posts() == 1
+        assert self.server.request_counts["POST mailings"] == 3
+
+    def test_shared_between_threads(self):
+        self.server.client()
+        ids = []
+
+        def create():
+            ids.append(stampr.config.Config().id)
+
+        threads = [threading.Thread(target=create) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(set(ids)) == 1
+        assert self.posts() == 1
+
+    def test_accounts_kept_apart(self):
+        registry = stampr.registry.ConfigRegistry()
+
+        self.server.client(config_registry=registry)
+        stampr.config.Config().create()
+
+        other = stampr.testing.FakeServer()
+        other.start()
+        try:
+            other.client(config_registry=registry)
+            stampr.config.Config().create()
+            stampr.config.Config().create()
+
+            assert other.request_counts["POST configs"] == 1
+            assert len(registry) == 2
+        finally:
+            other.stop()
+
+
+class TestConfigRegistryOnDisk(Test):
+    def test_saved_and_loaded(self):
+        path = os.path.join(self.directory, "stampr", "configs.json")
+
+        self.server.client(config_registry=stampr.registry.ConfigRegistry(path=path))
+        id = stampr.config.Config().id
+
+        with open(path) as f:
+            assert json.load(f)[0]["config_id"] == id
+
+        # No need to fetch or create any configs, now they're on disk.
+        self.server.reset()
+        self.server.client(config_registry=stampr.registry.ConfigRegistry(path=path))
+
+        assert stampr.config.Config().id == id
+        assert self.posts() == 0
+        assert self.seeds() == 0
+
+    def test_clear(self):
+        path = os.path.join(self.directory, "configs.json")
+        registry = stampr.registry.ConfigRegistry(path=path, seed=False)
+
+        self.server.client(config_registry=registry)
+        stampr.config.Config().create()
+        assert self.seeds() == 0
+        assert len(registry) == 1
+
+        registry.clear()
+
+        assert len(registry) == 0
+        assert len(stampr.registry.ConfigRegistry(path=path)) == 0
@@ -0,0 +1,88 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import sys
+import os
+import time
+import email.utils
+
+from pytest import raises
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import stampr
+import stampr.retry
+
+
+class TestRetryPolicyInit(object):
+    def test_defaults(self):
+        policy = stampr.retry.RetryPolicy()
+        assert policy.total == 3
+
+    def test_bad_total(self):
+        with raises(ValueError):
+            stampr.retry.RetryPolicy(total=-1)
+
+    def test_bad_max_backoff(self):
+        with raises(ValueError):
+            stampr.retry.RetryPolicy(backoff=10, max_backoff=1)
+
+    def test_bad_status(self):
+        with raises(ValueError):
+            stampr.retry.RetryPolicy(statuses=["fish"])
+
+
+class TestRetryPolicyCanRetry(object):
+    def test_safe_methods(self):
+        policy = stampr.retry.RetryPolicy()
+        assert policy.can_retry("get")
+        assert policy.can_retry("delete")
+
+    def test_post(self):
+        policy = stampr.retry.RetryPolicy()
+        assert not policy.can_retry("post")
+        assert policy.can_retry("post", idempotent=True)
+
+    def test_disabled(self):
+        assert not stampr.retry.RetryPolicy(total=0).can_retry("get")
+
+
+class TestRetryPolicyStatuses(object):
+    def test_default_statuses(self):
+        policy = stampr.retry.RetryPolicy()
+        assert policy.is_retryable_status(503)
+        assert policy.is_retryable_status(429)
+        assert not policy.is_retryable_status(501)
+        assert not policy.is_retryable_status(404)
+
+    def test_status_classes(self):
+        policy = stampr.retry.RetryPolicy(statuses=["5xx", 429])
+        assert policy.is_retryable_status(501)
+        assert policy.is_retryable_status(429)
+        assert not policy.is_retryable_status(408)
+
+
+class TestRetryPolicyDelay(object):
+    def test_exponential(self):
+        policy = stampr.retry.RetryPolicy(backoff=1, max_backoff=5, jitter=False)
+        assert [policy.delay(i) for i in range(5)] == [1, 2, 4, 5, 5]
+
+    def test_jitter(self):
+        policy = stampr.retry.RetryPolicy(backoff=1, max_backoff=5)
+        for _ in range(100):
+            assert 0 <= policy.delay(2) <= 4
+
+    def test_retry_after_seconds(self):
+        policy = stampr.retry.RetryPolicy()
+        assert policy.delay(0, "7") == 7
+
+    def test_retry_after_date(self):
+        policy = stampr.retry.RetryPolicy()
+        header = email.utils.formatdate(time.time() + 60, usegmt=True)
+        assert 55 < policy.delay(0, header) <= 60
+
+    def test_retry_after_ignored(self):
+        policy = stampr.retry.RetryPolicy(backoff=1, jitter=False, respect_retry_after=False)
+        assert policy.delay(0, "7") == 1
+
+    def test_retry_after_garbage(self):
+        policy = stampr.retry.RetryPolicy(backoff=1, jitter=False)
+        assert policy.delay(0, "soon") == 1
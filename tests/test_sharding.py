@@ -0,0 +1,172 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import sys
+import os
+import datetime
+import time
+
+from pytest import raises
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import stampr
+import stampr.testing
+import stampr.sharding
+
+
+class Test(object):
+    def setup(self):
+        self.server = stampr.testing.FakeServer()
+        self.server.page_size = 2
+        self.server.start()
+        self.client = self.server.client()
+
+        self.batch = stampr.batch.Batch()
+        self.mailings = [self.mail(i) for i in range(12)]
+
+        # One mailing a minute, through the hour from start.
+        self.start = datetime.datetime(2013, 5, 1, 12, 0)
+        self.finish = self.start + datetime.timedelta(hours=1)
+        for i, mailing in enumerate(self.mailings):
+            self.created(mailing, self.start + datetime.timedelta(minutes=i))
+
+        self.searches = []
+        self.client.add_hook("before_request", lambda event: self.searches.append(event.path[:-1]))
+
+    def teardown(self):
+        self.client.close()
+        self.server.stop()
+
+    def mail(self, i):
+        with self.batch.mailing() as m:
+            m.address = "to %d" % i
+            m.return_address = "from"
+            m.data = "<html>%d</html>" % i
+        return m
+
+    def created(self, mailing, time):
+        # Only before browsing, as the server caches what each search finds.
+        self.server.mailings[mailing.id]["created"] = time
+
+    def ids(self, records):
+        return [r["mailing_id"] for r in records]
+
+    def browse(self, **options):
+        return list(stampr.sharding.iter_sharded_records(("mailings", "browse"), self.start, self.finish,
+                                                         "mailing_id", **options))
+
+
+class TestIterShardedRecords(Test):
+    def test_ordered(self):
+        assert self.ids(self.browse(concurrency=4)) == [m.id for m in self.mailings]
+
+    def test_unordered(self):
+        assert sorted(self.ids(self.browse(concurrency=4, ordered=False))) == [m.id for m in self.mailings]
+
+    def test_windows(self):
+        self.browse(concurrency=2, shards=4, min_span=3600)
+
+        assert len(set(self.searches)) == 4
+
+    def test_edges_not_duplicated(self):
+        # Exactly on the boundary between the two windows, so in both.
+        self.created(self.mailings[0], self.start + datetime.timedelta(minutes=30))
+
+        records = self.browse(concurrency=2, min_span=3600)
+
+        assert sorted(self.ids(records)) == [m.id for m in self.mailings]
+
+    def test_edges_not_duplicated_unordered(self):
+        self.created(self.mailings[0], self.start + datetime.timedelta(minutes=30))
+
+        records = self.browse(concurrency=2, min_span=3600, ordered=False)
+
+        assert sorted(self.ids(records)) == [m.id for m in self.mailings]
+
+    def test_ids_not_all_kept(self):
+        browse = stampr.sharding._ShardedBrowse(("mailings", "browse"), "mailing_id", self.client, 4,
+                                                datetime.timedelta(seconds=3600))
+
+        # While returning records in order, only the ids of the window being returned and the one before are kept.
+        kept = [len(browse.kept) for _ in browse.run(self.start, self.finish, 6, True)]
+
+        assert len(kept) == 12
+        assert max(kept) <= 2
+        assert browse.kept == {}
+
+    def test_later_windows_read_ahead_a_little(self):
+        self.server.page_size = 1
+        for i, mailing in enumerate(self.mailings[6:]):
+            self.created(mailing, self.start + datetime.timedelta(minutes=40 + i))
+
+        records = stampr.sharding.iter_sharded_records(("mailings", "browse"), self.start, self.finish, "mailing_id",
+                                                       concurrency=2, min_span=3600)
+
+        try:
+            assert next(records)["mailing_id"] == self.mailings[0].id
+            time.sleep(0.2)
+        finally:
+            records.close()
+
+        # The later window has six pages, but only the pages that can wait to be returned (and one more) are read.
+        later = (self.start + datetime.timedelta(minutes=30)).isoformat()
+        assert sum(1 for search in self.searches if search[2] == later) == 3
+
+    def test_dense_windows_split(self):
+        # All but the last in the first minute; the last half an hour later.
+        for i, mailing in enumerate(self.mailings[:-1]):
+            self.created(mailing, self.start + datetime.timedelta(seconds=i))
+        self.created(self.mailings[-1], self.start + datetime.timedelta(minutes=30))
+
+        records = self.browse(concurrency=4, shards=1, min_span=1)
+
+        assert self.ids(records) == [m.id for m in self.mailings]
+        assert len(set(self.searches)) > 1
+
+    def test_not_split_below_min_span(self):
+        self.browse(concurrency=4, shards=1, min_span=3600)
+
+        assert len(set(self.searches)) == 1
+
+    def test_empty(self):
+        assert stampr.mailing.Mailing.browse(self.finish, self.finish + datetime.timedelta(hours=1),
+                                             concurrency=4) == []
+
+    def test_tiny_period(self):
+        records = list(stampr.sharding.iter_sharded_records(("mailings", "browse"), self.start, self.start,
+                                                            "mailing_id", concurrency=4))
+
+        assert self.ids(records) == [self.mailings[0].id]
+
+    def test_bad_arguments(self):
+        with raises(TypeError):
+            stampr.sharding.iter_sharded_records(["mailings", "browse"], self.start, self.finish, "mailing_id")
+        with raises(TypeError):
+            stampr.sharding.iter_sharded_records(("mailings", "browse"), 0, self.finish, "mailing_id")
+        with raises(ValueError):
+            self.browse(concurrency=0)
+        with raises(ValueError):
+            self.browse(shards=0)
+        with raises(ValueError):
+            self.browse(min_span=0)
+
+
+class TestBrowseConcurrently(Test):
+    def test_mailing_browse(self):
+        mailings = stampr.mailing.Mailing.browse(self.start, self.finish, concurrency=4)
+
+        assert [m.id for m in mailings] == [m.id for m in self.mailings]
+
+    def test_mailing_browse_status(self):
+        self.server.set_status([m.id for m in self.mailings[:3]], "error")
+
+        mailings = stampr.mailing.Mailing.iter_browse(self.start, self.finish, status="error", concurrency=4,
+                                                      ordered=False)
+
+        assert sorted(m.id for m in mailings) == [m.id for m in self.mailings[:3]]
+
+    def test_batch_browse(self):
+        self.server.batches[self.batch.id]["created"] = self.start
+
+        batches = stampr.batch.Batch.browse(self.start, self.finish, concurrency=4)
+
+        assert [b.id for b in batches] == [self.batch.id]
@@ -0,0 +1,160 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import sys
+import os
+import datetime
+import threading
+
+from pytest import raises
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import stampr
+import stampr.testing
+
+
+class Test(object):
+    def setup(self):
+        self.server = stampr.testing.FakeServer(page_size=2)
+        self.server.start()
+        self.client = self.server.client(retry=stampr.retry.RetryPolicy(backoff=0))
+
+        self.start = datetime.datetime(2000, 1, 1, 0, 0, 0)
+        self.finish = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+
+    def teardown(self):
+        self.client.close()
+        self.server.stop()
+
+    def mail(self, count):
+        batch = stampr.batch.Batch(config=stampr.config.Config())
+        batch.create()
+
+        mailings = []
+        for i in range(count):
+            with batch.mailing() as m:
+                m.address = "address %d" % i
+                m.return_address = "return address"
+                m.data = "<html>%d</html>" % i
+            mailings.append(m)
+
+        return batch, mailings
+
+
+class TestFakeServerRoutes(Test):
+    def test_ping(self):
+        assert self.client.server_time().year >= 2013
+
+    def test_bad_credentials(self):
+        with raises(stampr.exceptions.HTTPError) as ex:
+            stampr.client.Client("user", "wrong", base_uri=self.server.base_uri)
+
+        assert ex.value.status_code == 401
+
+    def test_configs(self):
+        config = stampr.config.Config()
+        config.create()
+
+        assert stampr.config.Config[config.id].size == "standard"
+        assert [c.id for c in stampr.config.Config.all()] == [config.id]
+
+    def test_batches(self):
+        batch, _ = self.mail(0)
+
+        batch.status = "hold"
+        assert stampr.batch.Batch[batch.id].status == "hold"
+        assert [b.id for b in stampr.batch.Batch.browse(self.start, self.finish)] == [batch.id]
+        assert [b.id for b in stampr.batch.Batch.browse(self.start, self.finish, status="hold")] == [batch.id]
+        assert stampr.batch.Batch.browse(self.start, self.finish, status="archive") == []
+
+        batch.delete()
+        with raises(stampr.exceptions.RequestError):
+            stampr.batch.Batch[1]
+
+    def test_mailings(self):
+        batch, mailings = self.mail(5)
+
+        assert stampr.mailing.Mailing[3].data == b"<html>2</html>"
+
+        browsed = stampr.mailing.Mailing.browse(self.start, self.finish)
+        assert [m.id for m in browsed] == [1, 2, 3, 4, 5]
+        assert self.server.request_counts["GET mailings/browse"] == 4 # 3 pages, then an empty one.
+
+        self.server.set_status([2, 4], "printed")
+        browsed = stampr.mailing.Mailing.browse(self.start, self.finish, status="printed", batch=batch)
+        assert [m.id for m in browsed] == [2, 4]
+
+        mailings[0].delete()
+        assert [m.id for m in stampr.mailing.Mailing.browse(self.start, self.finish, batch=batch)] == [2, 3, 4, 5]
+
+    def test_period(self):
+        self.mail(2)
+
+        assert stampr.mailing.Mailing.browse(self.start, self.start + datetime.timedelta(days=1)) == []
+
+
+class TestFakeServerBehaviour(Test):
+    def test_connections_are_reused(self):
+        self.mail(10)
+
+        assert self.server.connection_count == 1
+
+    def test_connections_shared_between_threads(self):
+        batch, _ = self.mail(0)
+
+        def mail():
+            for i in range(10):
+                with batch.mailing() as m:
+                    m.address, m.return_address = "to", "from"
+
+        threads = [threading.Thread(target=mail) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(self.server.mailings) == 40
+        assert self.server.connection_count <= 5
+
+    def test_failures_are_retried(self):
+        self.server.fail_next(2, status=502)
+
+        assert stampr.config.Config.all() == []
+        assert self.client.retry_counts == { "GET configs/browse/all": 2 }
+
+    def test_idempotent_mailings(self):
+        batch, _ = self.mail(0)
+
+        for _ in range(2):
+            self.client.session.post(self.server.base_uri + "mailings", headers={ "Idempotency-Key": "abc" },
+                                     data={ "batch_id": batch.id, "address": "to", "returnaddress": "from", "format": "none" })
+
+        assert len(self.server.mailings) == 1
+
+    def test_error_rate(self):
+        self.server.error_rate = 1
+
+        with raises(stampr.exceptions.HTTPError):
+            self.client.get(("test", "ping"))
+
+        assert self.client.retry_counts == { "GET test/ping": 3 }
+
+
+class TestFakeServerAsync(Test):
+    def test_async_client(self):
+        import asyncio
+        import stampr.aio
+
+        batch, _ = self.mail(0)
+
+        async def run():
+            async with stampr.aio.AsyncClient("user", "pass", base_uri=self.server.base_uri, concurrency=10) as client:
+                mailings = [stampr.mailing.Mailing(batch=batch, address="to %d" % i, return_address="from", data={ "i": i })
+                            for i in range(30)]
+                await asyncio.gather(*[client.mail(m) for m in mailings])
+
+                return [m.id async for m in client.browse_mailings(self.start, self.finish)]
+
+        ids = asyncio.new_event_loop().run_until_complete(run())
+
+        assert sorted(ids) == list(range(1, 31))
+        assert self.server.connection_count <= 11
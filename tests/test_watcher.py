@@ -0,0 +1,191 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import sys
+import os
+import datetime
+import threading
+
+from pytest import raises
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import stampr
+import stampr.testing
+import stampr.watcher
+
+
+class Test(object):
+    def setup(self):
+        self.server = stampr.testing.FakeServer()
+        self.server.start()
+        self.client = self.server.client()
+
+        self.batch = stampr.batch.Batch()
+        self.mailings = [self.mail(i) for i in range(4)]
+        self.server.request_counts.clear()
+
+        since = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+        self.watcher = stampr.watcher.MailingWatcher(since, min_interval=0.01, max_interval=0.1)
+
+    def teardown(self):
+        self.client.close()
+        self.server.stop()
+
+    def mail(self, i):
+        with self.batch.mailing() as m:
+            m.address = "to %d" % i
+            m.return_address = "from"
+            m.data = "<html>%d</html>" % i
+        return m
+
+    def changes(self, transitions):
+        return sorted((t.mailing_id, t.old_status, t.new_status) for t in transitions)
+
+
+class TestMailingWatcher(Test):
+    def test_bad_since(self):
+        with raises(TypeError):
+            stampr.watcher.MailingWatcher(since=0)
+
+    def test_bad_intervals(self):
+        with raises(ValueError):
+            stampr.watcher.MailingWatcher(datetime.datetime.utcnow(), min_interval=10, max_interval=1)
+
+    def test_no_changes(self):
+        self.watcher.watch(self.mailings)
+
+        assert self.watcher.poll() == []
+        assert len(self.watcher) == 4
+
+    def test_transitions(self):
+        self.watcher.watch(self.mailings)
+        self.server.set_status([1, 2], "render")
+        self.server.set_status([3], "error")
+
+        transitions = self.watcher.poll()
+
+        assert self.changes(transitions) == [(1, "received", "render"), (2, "received", "render"),
+                                             (3, "received", "error")]
+        assert all(t.batch_id == self.batch.id for t in transitions)
+        assert len(self.watcher) == 3 # Mailings in error aren't watched any more.
+        assert self.watcher.poll() == []
+
+    def test_only_current_statuses_polled(self):
+        self.watcher.watch(self.mailings)
+        self.server.set_status([1, 2, 3, 4], "printed")
+        self.watcher.poll()
+        self.server.request_counts.clear()
+
+        self.watcher.poll()
+
+        # Only "printed" (a page, then an empty one).
+        assert self.server.request_counts["GET mailings/with"] == 2
+        assert "GET mailings/:id" not in self.server.request_counts
+
+    def test_finished_not_browsed(self):
+        self.watcher.watch(self.mailings)
+        self.server.set_status([1, 2, 3, 4], "printed")
+        self.watcher.poll()
+        self.server.set_status([1], "shipped")
+        self.server.request_counts.clear()
+
+        assert self.changes(self.watcher.poll()) == [(1, "printed", "shipped")]
+
+        # However many mailings have been shipped, the only one got is the one that left "printed".
+        assert self.server.request_counts["GET mailings/with"] == 2
+        assert self.server.request_counts["GET mailings/:id"] == 1
+
+    def test_deleted(self):
+        self.watcher.watch(self.mailings)
+        self.mailings[0].delete()
+
+        assert self.watcher.poll() == []
+        assert len(self.watcher) == 3
+
+    def test_not_mailed(self):
+        mailing = stampr.mailing.Mailing(batch=self.batch, address="to", return_address="from", data="<html/>")
+
+        with raises(ValueError):
+            self.watcher.watch([mailing])
+
+        assert not mailing.is_created()
+        assert "POST mailings" not in self.server.request_counts
+
+    def test_bad_concurrency(self):
+        with raises(ValueError):
+            stampr.watcher.MailingWatcher(datetime.datetime.utcnow(), concurrency=0)
+
+    def test_finished(self):
+        self.watcher.watch(self.mailings)
+        self.server.set_status([1, 2, 3, 4], "shipped")
+
+        assert len(self.watcher.poll()) == 4
+        assert len(self.watcher) == 0
+
+    def test_ids(self):
+        self.watcher.watch([1])
+
+        assert self.changes(self.watcher.poll()) == [(1, None, "received")]
+
+    def test_batch(self):
+        self.watcher.watch_batch(self.batch)
+
+        assert len(self.watcher.poll()) == 4
+
+        self.mail(4)
+        self.server.set_status([2], "queued")
+
+        assert self.changes(self.watcher.poll()) == [(2, "received", "queued"), (5, None, "received")]
+        assert self.server.request_counts["GET batches/:id/browse"] == 4
+
+    def test_callbacks(self):
+        seen = []
+        self.watcher.add_callback(seen.append)
+        self.watcher.watch(self.mailings)
+        self.server.set_status([4], "render")
+
+        self.watcher.poll()
+        self.watcher.remove_callback(seen.append)
+        self.server.set_status([4], "queued")
+        self.watcher.poll()
+
+        assert self.changes(seen) == [(4, "received", "render")]
+
+    def test_adaptive_interval(self):
+        self.watcher.watch(self.mailings)
+
+        self.watcher.poll()
+        self.watcher.poll()
+        assert self.watcher.interval == 0.01 * 1.5 * 1.5
+
+        self.server.set_status([1], "render")
+        self.watcher.poll()
+        assert self.watcher.interval == 0.01 * 1.5 * 1.5 / 2
+
+        for _ in range(20):
+            self.watcher.poll()
+        assert self.watcher.interval == 0.1
+
+    def test_iterate_until_finished(self):
+        self.watcher.watch(self.mailings)
+        self.server.set_status([1, 2], "shipped")
+        self.server.set_status([3, 4], "error")
+
+        assert len(list(self.watcher)) == 4
+
+    def test_background(self):
+        seen = []
+        changed = threading.Event()
+
+        def callback(transition):
+            seen.append(transition)
+            changed.set()
+
+        self.watcher.add_callback(callback)
+        self.watcher.watch(self.mailings)
+        self.watcher.start()
+
+        self.server.set_status([1], "render")
+        assert changed.wait(5)
+
+        self.watcher.stop()
+        assert self.changes(seen) == [(1, "received", "render")]
@@ -0,0 +1,166 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import sys
+import os
+import datetime
+import json
+import shutil
+import tempfile
+
+from pytest import raises
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import stampr
+import stampr.testing
+import stampr.watermark
+from stampr.exceptions import HTTPError
+
+
+class Test(object):
+    def setup(self):
+        self.server = stampr.testing.FakeServer()
+        self.server.page_size = 2
+        self.server.start()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "watermarks.json")
+
+        self.client = self.server.client()
+        self.batch = stampr.batch.Batch()
+        self.mailings = [self.mail(i) for i in range(3)]
+        self.server.request_counts.clear()
+
+        self.since = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+
+    def teardown(self):
+        self.client.close()
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def mail(self, i):
+        with self.batch.mailing() as m:
+            m.address = "to %d" % i
+            m.return_address = "from"
+            m.data = "<html>%d</html>" % i
+        return m
+
+    def ids(self, mailings):
+        return sorted(m.id for m in mailings)
+
+
+class TestWatermarkStore(Test):
+    def test_default_store(self):
+        assert isinstance(self.client.watermarks, stampr.watermark.WatermarkStore)
+        assert self.client.watermarks.path is None
+
+    def test_bad_store(self):
+        with raises(TypeError):
+            self.server.client(watermarks="watermarks.json")
+
+    def test_bad_overlap(self):
+        with raises(ValueError):
+            stampr.watermark.WatermarkStore(overlap=-1)
+
+    def test_first_browse(self):
+        mailings = stampr.mailing.Mailing.browse_new(self.since)
+
+        assert self.ids(mailings) == self.ids(self.mailings)
+        assert self.client.watermarks.mark(self.client, ("mailings", "browse")) > self.since
+
+    def test_nothing_new(self):
+        stampr.mailing.Mailing.browse_new(self.since)
+
+        assert stampr.mailing.Mailing.browse_new(self.since) == []
+
+    def test_only_new(self):
+        stampr.mailing.Mailing.browse_new(self.since)
+        new = self.mail(4)
+
+        assert self.ids(stampr.mailing.Mailing.browse_new(self.since)) == [new.id]
+
+    def test_window_starts_at_mark(self):
+        self.server.client(watermarks=stampr.watermark.WatermarkStore(overlap=0))
+        stampr.mailing.Mailing.browse_new(self.since)
+        self.mail(4)
+        self.server.request_counts.clear()
+
+        stampr.mailing.Mailing.browse_new(self.since)
+
+        # Just the new mailing's page and the empty one after it, as the older mailings are outside the window.
+        assert self.server.request_counts == { "GET mailings/browse": 2 }
+
+    def test_only_overlap_kept(self):
+        store = stampr.watermark.WatermarkStore(self.path)
+        self.server.client(watermarks=store)
+        for mailing in self.mailings[:2]:
+            self.server.mailings[mailing.id]["created"] -= datetime.timedelta(minutes=30)
+
+        assert len(stampr.mailing.Mailing.browse_new(self.since)) == 3
+
+        with open(self.path) as f:
+            assert [mailing_id for mailing_id, _ in json.load(f)[0]["found"]] == [self.mailings[2].id]
+        assert stampr.mailing.Mailing.browse_new(self.since) == []
+
+    def test_changed_in_overlap(self):
+        stampr.mailing.Mailing.browse_new(self.since)
+        self.server.set_status([self.mailings[0].id], "render")
+
+        mailings = stampr.mailing.Mailing.browse_new(self.since)
+
+        assert self.ids(mailings) == [self.mailings[0].id]
+        assert mailings[0].status == "render"
+
+    def test_searches_separate(self):
+        stampr.mailing.Mailing.browse_new(self.since)
+
+        assert len(stampr.mailing.Mailing.browse_new(self.since, batch=self.batch)) == 3
+        assert len(stampr.mailing.Mailing.browse_new(self.since, status="received")) == 3
+        assert len(self.client.watermarks) == 3
+
+    def test_into(self):
+        merged = {}
+        stampr.mailing.Mailing.browse_new(self.since, into=merged)
+        self.server.set_status([self.mailings[0].id], "render")
+        stampr.mailing.Mailing.browse_new(self.since, into=merged)
+
+        assert sorted(merged) == self.ids(self.mailings)
+        assert merged[self.mailings[0].id].status == "render"
+
+    def test_failed_browse_not_marked(self):
+        client = self.server.client(retry=stampr.retry.RetryPolicy(total=0))
+        self.server.fail_next(1, 500)
+
+        with raises(HTTPError):
+            stampr.mailing.Mailing.browse_new(self.since)
+
+        assert client.watermarks.mark(client, ("mailings", "browse")) is None
+        assert len(stampr.mailing.Mailing.browse_new(self.since)) == 3
+
+    def test_reset(self):
+        stampr.mailing.Mailing.browse_new(self.since)
+        self.client.watermarks.reset(self.client, ("mailings", "browse"))
+
+        assert len(stampr.mailing.Mailing.browse_new(self.since)) == 3
+
+    def test_bad_since(self):
+        with raises(TypeError):
+            stampr.mailing.Mailing.browse_new(0)
+
+
+class TestWatermarkStoreOnDisk(Test):
+    def test_persisted(self):
+        self.server.client(watermarks=stampr.watermark.WatermarkStore(self.path))
+        stampr.mailing.Mailing.browse_new(self.since, status="received")
+
+        store = stampr.watermark.WatermarkStore(self.path)
+        self.server.client(watermarks=store)
+
+        assert store.mark(self.client, ("mailings", "with", "received")) is not None
+        assert stampr.mailing.Mailing.browse_new(self.since, status="received") == []
+
+    def test_clear(self):
+        store = stampr.watermark.WatermarkStore(self.path)
+        self.server.client(watermarks=store)
+        stampr.mailing.Mailing.browse_new(self.since)
+        store.clear()
+
+        assert len(stampr.watermark.WatermarkStore(self.path)) == 0